@@ -3,9 +3,24 @@ import logging
 import datetime
 
 from src.producer import Producer
+from src.planner import SHARD_BY_OPTIONS
+from src.checkpoint import CheckpointStore, HighWaterMarkStore
+from src.constants import (
+    CHECKPOINT_PATH,
+    HIGH_WATER_MARK_PATH,
+    DEFAULT_POINT_BUDGET,
+    DOWNSAMPLE_METHODS,
+    METRICS_PORT,
+    LOCATION_IDS,
+)
+from src.sync import IncrementalSync
+from src.station_store import get_station_store
+from src.jobs import JobRegistry
+from src.metrics import start_metrics_server
 from src.visualization import (
     fetch_noaa_stations,
-    fetch_data_from_dynamodb,
+    fetch_stations_data,
+    choose_resolution,
     create_plot,
     fetch_stations,
 )
@@ -99,14 +114,55 @@ def visualization(stations):
 
     # Select the station
     selected_stations = st.multiselect("Select Station(s)", station_names)
+
+    # Optionally restrict the date range, applied on the table's date sort key
+    start_date = end_date = None
+    if st.checkbox("Filter by date range"):
+        start_date = st.date_input(
+            "Start date", value=datetime.date(2021, 10, 1)
+        ).strftime("%Y-%m-%d")
+        end_date = st.date_input(
+            "End date", value=datetime.date(2021, 10, 31)
+        ).strftime("%Y-%m-%d")
+
+    # Long ranges are plotted from the monthly rollups
+    resolution = st.radio("Resolution", ["auto", "daily", "monthly"], horizontal=True)
+    resolution = choose_resolution(start_date, end_date, resolution)
+
+    # Large histories are downsampled before they are sent to the browser
+    with st.expander("Plot options"):
+        max_points = st.number_input(
+            "Maximum points per chart",
+            min_value=100,
+            max_value=100000,
+            value=DEFAULT_POINT_BUDGET,
+            step=500,
+        )
+        method = st.selectbox("Downsampling method", DOWNSAMPLE_METHODS)
+        webgl = st.checkbox("Render with WebGL", value=True)
+
     if st.button("Fetch Data"):
+        # Fetch all the selected stations concurrently
+        with st.spinner(f"Fetching data for {len(selected_stations)} station(s)"):
+            logger.info(
+                f"Fetching data for stations: {selected_stations} from DynamoDB"
+            )
+            station_data = fetch_stations_data(
+                table_name,
+                [stations[location] for location in selected_stations],
+                start_date,
+                end_date,
+                resolution=resolution,
+            )
+
         for location in selected_stations:
-            with st.spinner(f"Fetching data for station: {location}"):
-                logger.info(f"Fetching data for station: {location} from DynamoDB")
-                data = fetch_data_from_dynamodb(table_name, stations[location])
+            with st.spinner(f"Plotting data for station: {location}"):
+                data = station_data[stations[location]]
                 if data:
                     st.subheader(f"Data for station: {location}")
-                    st.success(f"Fetched {len(data)} records for station: {location}")
+                    st.success(
+                        f"Fetched {len(data)} {resolution} records for station: {location}"
+                    )
                     # st.write(data) # uncomment to see the data for debugging
 
                     # Create the plot
@@ -115,12 +171,18 @@ def visualization(stations):
                             data,
                             f"Precipitation for {location}",
                             "Precipitation",
+                            max_points,
+                            method,
+                            webgl,
                         )
                     else:
                         plot = create_plot(
                             data,
                             f"Temperature for {location}",
                             "Temperature",
+                            max_points,
+                            method,
+                            webgl,
                         )
                     st.plotly_chart(plot)
                     logger.info(f"Created plot for station: {location}")
@@ -144,12 +206,23 @@ def producer(stations):
         ["TOBS", "PRCP", "SNOW", "TMAX", "TMIN"],
         ["TOBS", "PRCP", "SNOW", "TMAX", "TMIN"],
     )
+    # every location is queued as its own job
+    location_ids = form.multiselect(
+        "Select the NOAA locations to be fetched", LOCATION_IDS, LOCATION_IDS
+    )
     default_start_date = datetime.datetime(2021, 10, 1)
     default_end_date = datetime.datetime(2021, 10, 31)
 
     # Select the start and end date
     start_date = form.date_input("Select the start date", value=default_start_date)
     end_date = form.date_input("Select the end date", value=default_end_date)
+
+    # Large backfills are split into sub-queries that run in parallel
+    shard_by = form.selectbox("Split the backfill by", SHARD_BY_OPTIONS)
+    shard_parallelism = form.number_input(
+        "Parallel sub-queries", min_value=1, max_value=8, value=1
+    )
+    resume = form.checkbox("Resume the previous run for this query", value=True)
     station_name_flag = False
     submit_button = form.form_submit_button(label="Submit")
 
@@ -157,19 +230,105 @@ def producer(stations):
     end_date = end_date.strftime("%Y-%m-%d")
 
     if submit_button:
-        with st.spinner("Fetching data from NOAA API"):
+        # every job of every session shares one store, so they don't overwrite
+        # each other's checkpoints
+        checkpoint = get_checkpoint_store()
+        for location_id in location_ids:
             # Create the producer
             producer = Producer(
-                data_types, start_date, end_date, station_name_flag, stations
+                data_types,
+                start_date,
+                end_date,
+                station_name_flag,
+                stations,
+                shard_by=shard_by,
+                shard_parallelism=shard_parallelism,
+                checkpoint=checkpoint,
+                resume=resume,
+                location_id=location_id,
             )
-            try:
-                # Produce the data
-                producer.produce()
-                st.success("Data successfully produced")
-            except Exception as e:
-                st.error(f"Error while producing data: {e}")
-                logger.error(f"Error while producing data: {e}")
-                return
+
+            # Run it in the background so the page stays responsive
+            job = get_job_registry().submit(
+                f"{location_id} {','.join(data_types)} from {start_date} to {end_date}",
+                producer,
+            )
+            st.success(f"Job {job.id} queued, follow its progress below")
+
+    # Incremental sync only fetches observations newer than the last ones produced
+    st.write("---")
+    st.subheader("Incremental sync")
+    st.write(
+        "Fetch only the observations newer than the latest date already produced for each data type."
+    )
+    if st.button("Sync new observations"):
+        # every selected location is synced as its own job, with its own stations
+        # and high-water marks, in the background like the producer jobs
+        location_stations = get_station_store().get_location_stations(location_ids)
+        for location_id in location_ids:
+            job = get_job_registry().submit(
+                f"Incremental sync of {location_id} {','.join(data_types)}",
+                IncrementalSync(
+                    data_types,
+                    location_stations[location_id],
+                    get_high_water_marks(),
+                    location_id=location_id,
+                ),
+            )
+            st.success(f"Job {job.id} queued, follow its progress below")
+
+    job_status()
+
+
+def job_status():
+    """
+    Status panel listing the background producer jobs
+    """
+    st.write("---")
+    st.subheader("Producer jobs")
+    st.button("Refresh")
+
+    jobs = get_job_registry().list_jobs()
+    if not jobs:
+        st.write("No producer jobs yet.")
+        return
+    st.dataframe(jobs)
+
+
+@st.cache_resource
+def get_job_registry():
+    """
+    Job registry shared by every session of the app
+    """
+    return JobRegistry()
+
+
+@st.cache_resource
+def get_checkpoint_store():
+    """
+    Checkpoint store shared by every job and session of the app. The store
+    rewrites the whole file on each update, so one instance must own it.
+    """
+    return CheckpointStore(CHECKPOINT_PATH)
+
+
+@st.cache_resource
+def get_high_water_marks():
+    """
+    High-water mark store shared by every sync job and session of the app
+    """
+    return HighWaterMarkStore(HIGH_WATER_MARK_PATH)
+
+
+@st.cache_resource
+def get_metrics_server():
+    """
+    Prometheus metrics endpoint shared by every session of the app, only
+    started when METRICS_PORT is set
+    """
+    if METRICS_PORT is None:
+        return None
+    return start_metrics_server(METRICS_PORT)
 
 
 def main():
@@ -177,6 +336,7 @@ def main():
     This is the main function that will be called by streamlit
     """
     setup()
+    get_metrics_server()
 
     # Fetch the stations from the NOAA API
     stations = fetch_noaa_stations()
@@ -0,0 +1,448 @@
+""" 
+    This file contains the asyncio producer engine. NOAA pages and Kinesis
+    publishes are issued from one event loop with separate in-flight limits, so
+    a small container can keep hundreds of requests in flight without a thread
+    per request. aiohttp and aiobotocore are optional: without them the engine
+    falls back to the blocking clients run in worker threads.
+"""
+
+# required imports
+import os
+import json
+import time
+import asyncio
+import logging
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    from aiobotocore.session import get_session
+except ImportError:
+    get_session = None
+
+from src.constants import (
+    AWS_REGION,
+    STREAM_NAME,
+    BACKEND,
+    KINESIS_MAX_PUT_ATTEMPTS,
+    ASYNC_FETCH_CONCURRENCY,
+    ASYNC_PUBLISH_CONCURRENCY,
+)
+from src.noaa_client import NoaaApiError, RETRY_STATUS_CODES
+from src.page_cache import CachedResponse
+from src.planner import plan_queries
+from src.pipeline import batch_entries
+from src.producer import Producer, put_backoff
+from src.metrics import metrics
+
+# configure logging
+logger = logging.getLogger()
+
+
+class PageResponse:
+    """
+    This class holds a fetched NOAA page, with the parts of the requests
+    Response interface the producer uses
+    """
+
+    def __init__(self, status_code, headers, content):
+        """
+        Initialize the response
+        """
+        self.status_code = status_code
+        self.headers = headers
+        self.content = content
+
+    def json(self):
+        """
+        Parse the body
+        """
+        return json.loads(self.content)
+
+
+class AsyncProducer(Producer):
+    """
+    This class produces the same records as Producer, but drives the NOAA
+    requests and Kinesis publishes from an asyncio event loop. fetch_concurrency
+    and publish_concurrency bound the requests in flight on each side, and
+    pages are checkpointed in offset order once all their records are published.
+    """
+
+    def __init__(
+        self,
+        *args,
+        fetch_concurrency=ASYNC_FETCH_CONCURRENCY,
+        publish_concurrency=ASYNC_PUBLISH_CONCURRENCY,
+        **kwargs,
+    ):
+        """
+        Initialize the producer, see Producer for the other arguments
+        """
+        super().__init__(*args, **kwargs)
+        self.fetch_concurrency = fetch_concurrency
+        self.publish_concurrency = publish_concurrency
+
+    def produce(self):
+        """
+        Produce the data on a new event loop. Replays publish from the page
+        cache like Producer.
+        """
+        if self.replay:
+            super().produce()
+            return
+        asyncio.run(self.produce_async())
+
+    async def produce_async(self):
+        """
+        Produce the data of every planned sub-query
+        """
+        logger.info("Producing data asynchronously")
+        start = time.perf_counter()
+        queries = plan_queries(
+            self.params["startdate"],
+            self.params["enddate"],
+            self.data_types,
+            self.shard_by,
+        )
+
+        self.fetch_slots = asyncio.Semaphore(self.fetch_concurrency)
+        self.publish_slots = asyncio.Semaphore(self.publish_concurrency)
+        query_slots = asyncio.Semaphore(self.shard_parallelism)
+
+        async def run(query):
+            async with query_slots:
+                await self.produce_query_async(query, session, kinesis)
+
+        # the clients that aren't installed run in worker threads, and the
+        # default executor would cap them at min(32, cpus + 4) threads
+        asyncio.get_running_loop().set_default_executor(
+            ThreadPoolExecutor(
+                max_workers=self.fetch_concurrency + self.publish_concurrency,
+                thread_name_prefix="async-producer",
+            )
+        )
+        if aiohttp is None:
+            logger.warning(
+                "aiohttp is not installed, NOAA pages are fetched by blocking "
+                "requests in worker threads"
+            )
+        if get_session is None and BACKEND != "local" and not self.dry_run:
+            logger.warning(
+                "aiobotocore is not installed, Kinesis records are published by "
+                "blocking boto3 calls in worker threads"
+            )
+
+        session = None
+        kinesis = None
+        try:
+            if aiohttp is not None:
+                session = aiohttp.ClientSession(
+                    headers=dict(self.client.session.headers),
+                    connector=aiohttp.TCPConnector(limit=self.fetch_concurrency),
+                )
+            if get_session is not None and BACKEND != "local" and not self.dry_run:
+                kinesis = (
+                    await get_session()
+                    .create_client(
+                        "kinesis",
+                        region_name=AWS_REGION,
+                        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+                        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+                    )
+                    .__aenter__()
+                )
+            await asyncio.gather(*(run(query) for query in queries))
+        finally:
+            if session is not None:
+                await session.close()
+            if kinesis is not None:
+                await kinesis.__aexit__(None, None, None)
+
+        self.elapsed = time.perf_counter() - start
+        logger.info(f"Data produced in {len(self.batch_stats)} batches")
+
+    async def acquire_token(self):
+        """
+        Wait for the shared NOAA rate limiter without blocking the loop
+        """
+        waited = 0.0
+        while True:
+            delay = self.client.limiter.try_acquire()
+            if not delay:
+                break
+            await asyncio.sleep(delay)
+            waited += delay
+        if waited:
+            self.client.count("throttle_waits")
+            self.client.count("throttle_wait_seconds", waited)
+
+    async def fetch_async(self, session, limit, offset, query):
+        """
+        Fetch one page, returning the response or None if it could not be
+        fetched. Without aiohttp the blocking fetch runs in a worker thread.
+        """
+        start = time.perf_counter()
+        async with self.fetch_slots:
+            if session is None:
+                response = await asyncio.to_thread(
+                    self.fetch_response, limit, offset, query
+                )
+            else:
+                response = await self.fetch_aiohttp(session, limit, offset, query)
+        self.timer.add("fetch", time.perf_counter() - start)
+        return response
+
+    async def fetch_aiohttp(self, session, limit, offset, query):
+        """
+        Fetch one page with aiohttp, following the NoaaClient rate limit and
+        retry policy
+        """
+        params = dict(self.params, **(query or {}), limit=limit, offset=offset)
+        if self.cache is not None:
+            page = await asyncio.to_thread(self.cache.get, params)
+            if page is not None:
+                return CachedResponse(page)
+
+        for attempt in range(self.client.max_retries + 1):
+            self.client.reserve_daily_quota()
+            await self.acquire_token()
+            self.client.count("requests")
+
+            start = time.perf_counter()
+            try:
+                async with session.get(
+                    self.data_url,
+                    params={k: str(v) for k, v in params.items()},
+                    timeout=aiohttp.ClientTimeout(total=90),
+                ) as raw:
+                    response = PageResponse(raw.status, raw.headers, await raw.read())
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                error = f"{type(e).__name__}: {e}"
+                response = None
+            self.client.observe(start, response)
+
+            if response is not None:
+                if response.status_code == 200:
+                    if self.cache is not None:
+                        page = response.json()
+                        await asyncio.to_thread(self.cache.put, params, page)
+                        return CachedResponse(page)
+                    return response
+                if response.status_code not in RETRY_STATUS_CODES:
+                    logger.error(
+                        f"Data not found with limit {limit} and offset {offset}, "
+                        f"error: {response.status_code}"
+                    )
+                    return None
+                error = f"status {response.status_code}"
+
+            if attempt == self.client.max_retries:
+                break
+            delay = self.client.backoff(attempt, response)
+            logger.warning(
+                f"NOAA request failed with {error}, retrying in {delay:.2f}s"
+            )
+            self.client.count("retries")
+            await asyncio.sleep(delay)
+
+        self.client.count("errors")
+        raise NoaaApiError(
+            f"NOAA request failed with {error} after {attempt + 1} attempts"
+        )
+
+    async def send_batch_async(self, kinesis, entries):
+        """
+        Publish one PutRecords batch. Without aiobotocore, and for local or dry
+        runs, the blocking send_batch runs in a worker thread.
+        """
+        async with self.publish_slots:
+            with self.timer.time("publish", len(entries)):
+                if kinesis is None or self.dry_run:
+                    return await asyncio.to_thread(self.send_batch, entries)
+                return await self.put_records_async(kinesis, entries)
+
+    async def put_records_async(self, kinesis, entries):
+        """
+        Send one PutRecords batch on the aiobotocore client like send_batch,
+        retrying only the entries that failed. Returns the highest sequence
+        number written to each shard.
+        """
+        start = time.perf_counter()
+        total = len(entries)
+        total_bytes = sum(len(entry["Data"]) for entry in entries)
+        sequence_numbers = {}
+
+        for attempt in range(1, KINESIS_MAX_PUT_ATTEMPTS + 1):
+            with metrics.histogram(
+                "kinesis_put_records_seconds", "Latency of Kinesis PutRecords calls"
+            ).time():
+                response = await kinesis.put_records(
+                    StreamName=STREAM_NAME, Records=entries
+                )
+            entries = self.handle_put_response(entries, response, sequence_numbers)
+            if not entries:
+                break
+
+            logger.warning(
+                f"{len(entries)} of {total} records failed on attempt {attempt}, retrying"
+            )
+            if attempt < KINESIS_MAX_PUT_ATTEMPTS:
+                await asyncio.sleep(put_backoff(attempt))
+
+        self.record_batch(total, total_bytes, attempt, entries, start)
+        return sequence_numbers
+
+    def process_page(self, response):
+        """
+        Parse, enrich and serialize a fetched page. Returns its entries, record
+        count and latest date per datatype.
+        """
+        with self.timer.time("parse"):
+            results = response.json().get("results", [])
+        with self.timer.time("enrich", len(results)):
+            records = self.enrich_page(results)
+        with self.timer.time("serialize", len(records)):
+            entries = self.serialize_records(records)
+            latest_dates = records.latest_dates()
+        return entries, len(records), latest_dates
+
+    async def produce_query_async(self, query, session, kinesis):
+        """
+        Produce the data for a single planned sub-query
+        """
+        logger.info(
+            f"Producing {query['datatypeid']} from {query['startdate']} "
+            f"to {query['enddate']}"
+        )
+        limit = self.params["limit"]
+        start = 1
+        params = dict(self.params, **query)
+
+        # continue after the last fully published page of a previous run
+        if self.checkpoint is not None and self.resume:
+            checkpoint = self.checkpoint.get(params)
+            if checkpoint and checkpoint["complete"]:
+                logger.info("Query already produced, skipping")
+                return
+            if checkpoint:
+                start = checkpoint["offset"] + checkpoint["limit"]
+                logger.info(f"Resuming query from offset {start}")
+
+        first = await self.fetch_async(session, limit, start, query)
+        count = 0
+        if first is not None:
+            count = (
+                first.json().get("metadata", {}).get("resultset", {}).get("count", 0)
+            )
+
+        # keep a bounded window of pages in flight, published in offset order
+        # while later pages are still being fetched
+        offsets = iter(range(start + limit, count + 1, limit))
+        fetches = deque(
+            (
+                offset,
+                asyncio.create_task(self.fetch_async(session, limit, offset, query)),
+            )
+            for offset in itertools.islice(offsets, self.fetch_concurrency)
+        )
+
+        publishing = deque()
+        state = {"last_offset": start - limit, "missing": first is None}
+        try:
+            if first is None:
+                logger.error(f"No data found at offset {start}, skipping page")
+                with self.lock:
+                    self.missing_pages += 1
+                self.report_progress(errors=1)
+            else:
+                await self.publish_page(kinesis, start, first, publishing)
+
+            while fetches:
+                offset, task = fetches.popleft()
+                next_offset = next(offsets, None)
+                if next_offset is not None:
+                    fetches.append(
+                        (
+                            next_offset,
+                            asyncio.create_task(
+                                self.fetch_async(session, limit, next_offset, query)
+                            ),
+                        )
+                    )
+
+                response = await task
+                if response is None:
+                    logger.error(f"No data found at offset {offset}, skipping page")
+                    state["missing"] = True
+                    with self.lock:
+                        self.missing_pages += 1
+                    self.report_progress(errors=1)
+                else:
+                    await self.publish_page(kinesis, offset, response, publishing)
+
+                # bound the pages waiting on Kinesis while publishing lags behind
+                while len(publishing) > self.publish_concurrency:
+                    await self.complete_page(publishing, params, limit, state)
+
+            while publishing:
+                await self.complete_page(publishing, params, limit, state)
+        finally:
+            # an error leaves the sibling fetches and publishes of the query
+            # running, cancel them before it propagates
+            pending = [task for _, task in fetches]
+            pending += [task for page in publishing for task in page["tasks"]]
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        if self.checkpoint is not None and not state["missing"]:
+            self.checkpoint.update(params, state["last_offset"], limit, complete=True)
+
+    async def publish_page(self, kinesis, offset, response, publishing):
+        """
+        Start publishing the batches of a fetched page. The page is processed in
+        a worker thread, since station name lookups block on SQLite and NOAA.
+        """
+        entries, records, latest_dates = await asyncio.to_thread(
+            self.process_page, response
+        )
+        tasks = [
+            asyncio.create_task(self.send_batch_async(kinesis, batch["entries"]))
+            for batch in batch_entries([{"entries": entries}])
+            if batch["entries"]
+        ]
+        publishing.append(
+            {
+                "offset": offset,
+                "tasks": tasks,
+                "records": records,
+                "latest_dates": latest_dates,
+            }
+        )
+
+    async def complete_page(self, publishing, params, limit, state):
+        """
+        Wait for the oldest page to be published and advance its checkpoint
+        """
+        # the page stays queued until published, so a failure cancels the rest
+        page = publishing[0]
+        sequence_numbers = {}
+        for result in await asyncio.gather(*page["tasks"]):
+            sequence_numbers.update(result)
+        publishing.popleft()
+
+        self.track_latest_dates(page["latest_dates"])
+        with self.lock:
+            self.observations += page["records"]
+        self.report_progress(pages=1, records=page["records"])
+
+        # the checkpoint only advances while every earlier page is published
+        if self.checkpoint is not None and not state["missing"]:
+            state["last_offset"] = page["offset"]
+            self.checkpoint.update(params, page["offset"], limit, sequence_numbers)
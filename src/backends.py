@@ -0,0 +1,88 @@
+""" 
+    This file contains the factories of the local backends, used instead of
+    Kinesis and DynamoDB when BACKEND is "local"
+"""
+
+# required imports
+import os
+import threading
+import importlib.util
+import logging
+
+from src.constants import (
+    AWS_REGION,
+    LOCAL_STREAM_PATH,
+    LOCAL_SHARD_COUNT,
+    LOCAL_TABLES_PATH,
+)
+from src.local_stream import LocalStream
+from src.local_tables import LocalDynamoDB
+
+# configure logging
+logger = logging.getLogger()
+
+# the consumer lives in src/lambda, which can't be imported by name
+CONSUMER_PATH = os.path.join(os.path.dirname(__file__), "lambda", "lambda_consumer.py")
+
+stream = None
+tables = None
+lock = threading.Lock()
+
+
+def get_local_stream():
+    """
+    Return the process wide local stream, creating it on first use
+    """
+    global stream
+    with lock:
+        if stream is None:
+            stream = LocalStream(LOCAL_SHARD_COUNT, LOCAL_STREAM_PATH)
+        return stream
+
+
+def get_local_tables():
+    """
+    Return the process wide local DynamoDB, creating it on first use
+    """
+    global tables
+    with lock:
+        if tables is None:
+            tables = LocalDynamoDB(LOCAL_TABLES_PATH)
+        return tables
+
+
+def use_local_tables(dynamodb):
+    """
+    Replace the process wide local DynamoDB, e.g. with a throwaway in-memory one
+    """
+    global tables
+    with lock:
+        tables = dynamodb
+
+
+def load_consumer(dynamodb=None):
+    """
+    Load the Lambda consumer writing to the given DynamoDB resource, the local
+    tables by default
+    """
+    # the consumer creates a boto3 resource on import, which needs a region
+    os.environ.setdefault("AWS_DEFAULT_REGION", AWS_REGION)
+    spec = importlib.util.spec_from_file_location("lambda_consumer", CONSUMER_PATH)
+    consumer = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(consumer)
+    consumer.dynamodb = dynamodb if dynamodb is not None else get_local_tables()
+    return consumer
+
+
+def run_consumer(local_stream, consumer, batch_size=100):
+    """
+    Feed every record of the local stream to the consumer in Lambda sized
+    batches, like an event source mapping. Returns the number of records the
+    consumer reported as failed.
+    """
+    failures = 0
+    for event in local_stream.lambda_events(batch_size):
+        response = consumer.lambda_handler(event, None)
+        failures += len(response["batchItemFailures"])
+    logger.info(f"Consumer finished with {failures} failed records")
+    return failures
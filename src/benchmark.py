@@ -0,0 +1,367 @@
+""" 
+    This file contains the end-to-end benchmarks of the producer, the Lambda
+    consumer and the visualizer, run against the local backends. Results are
+    written as JSON so they can be compared between releases:
+
+        BACKEND=local python -m src.benchmark --output results.json
+"""
+
+# required imports
+import sys
+import json
+import time
+import argparse
+import contextlib
+import datetime
+import platform
+import statistics
+import subprocess
+import logging
+
+from src.constants import BACKEND, LOG_LEVEL, DEFAULT_POINT_BUDGET
+from src.backends import load_consumer, use_local_tables
+from src.fake_noaa import FakeNoaaData, FakeNoaaServer
+from src.local_stream import LocalStream
+from src.local_tables import LocalDynamoDB, MAX_BATCH_WRITE_ITEMS
+from src.noaa_client import NoaaClient
+from src.producer import Producer
+from src.visualization import fetch_data_from_dynamodb, create_plot
+
+# configure logging
+logger = logging.getLogger()
+
+BENCHMARKS = ["producer", "consumer", "visualizer"]
+BENCHMARK_STATION = "GHCND:US1MD0000000"
+
+
+def percentile(values, fraction):
+    """
+    The fraction percentile of the values, by linear interpolation
+    """
+    values = sorted(values)
+    if len(values) == 1:
+        return values[0]
+    position = (len(values) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def best_of(repeat, run):
+    """
+    Run the benchmark repeat times and keep the fastest result
+    """
+    return min((run() for _ in range(repeat)), key=lambda result: result["seconds"])
+
+
+def benchmark_producer(
+    page_sizes, worker_counts, days=30, stations=50, latency=0.02, repeat=1
+):
+    """
+    Measure Producer.produce throughput against the fake NOAA API for every
+    page size and worker count
+    """
+    data_types = ["TOBS", "PRCP", "SNOW", "TMAX", "TMIN"]
+    end_date = datetime.date(2021, 10, 1) + datetime.timedelta(days=days - 1)
+    results = []
+
+    with FakeNoaaServer(
+        latency=latency, station_count=stations, data_types=data_types
+    ) as server:
+        names = {name: station for station, name in server.data.station_names().items()}
+        client = NoaaClient(token="benchmark", requests_per_second=1000)
+
+        for page_size in page_sizes:
+            for workers in worker_counts:
+
+                def run():
+                    producer = Producer(
+                        data_types,
+                        "2021-10-01",
+                        end_date.isoformat(),
+                        False,
+                        names,
+                        max_workers=workers,
+                        page_size=page_size,
+                    )
+                    producer.client = client
+                    producer.data_url = f"{server.url}/data"
+                    producer.kinesis_client = LocalStream()
+                    producer.produce()
+                    return producer.stats()
+
+                stats = best_of(repeat, run)
+                results.append({"page_size": page_size, "workers": workers, **stats})
+                logger.info(
+                    f"Producer page_size={page_size} workers={workers}: "
+                    f"{stats['observations_per_second']:.0f} records/s"
+                )
+    return results
+
+
+def count_items(table):
+    """
+    Number of items stored in the table, following the scan pagination
+    """
+    response = table.scan(ProjectionExpression="station")
+    count = len(response["Items"])
+    while "LastEvaluatedKey" in response:
+        response = table.scan(
+            ProjectionExpression="station",
+            ExclusiveStartKey=response["LastEvaluatedKey"],
+        )
+        count += len(response["Items"])
+    return count
+
+
+def benchmark_consumer(batch_sizes, records=10000, stations=50):
+    """
+    Measure lambda_handler time per Kinesis batch for every batch size, on
+    fake NOAA observations, so every station-day carries several datatypes of
+    each table. Throughput counts the items actually stored.
+    """
+    data = FakeNoaaData(station_count=stations)
+    per_day = stations * len(data.data_types)
+    end_date = datetime.date(2021, 10, 1) + datetime.timedelta(
+        days=(records - 1) // per_day
+    )
+    observations = data.data_page(
+        {
+            "startdate": "2021-10-01",
+            "enddate": end_date.isoformat(),
+            "limit": records,
+            "offset": 1,
+        }
+    )["results"]
+    names = data.station_names()
+
+    stream = LocalStream()
+    entries = [
+        {
+            "Data": json.dumps(
+                {**observation, "station_name": names[observation["station"]]}
+            ).encode("utf-8"),
+            "PartitionKey": observation["station"],
+        }
+        for observation in observations
+    ]
+    for start in range(0, len(entries), 500):
+        stream.put_records("benchmark", entries[start : start + 500])
+
+    results = []
+    for batch_size in batch_sizes:
+        dynamodb = LocalDynamoDB()
+        consumer = load_consumer(dynamodb)
+        durations = []
+        failures = 0
+        # the consumer prints its progress, keep stdout for the results
+        with contextlib.redirect_stdout(sys.stderr):
+            for event in stream.lambda_events(batch_size):
+                start = time.perf_counter()
+                response = consumer.lambda_handler(event, None)
+                durations.append(time.perf_counter() - start)
+                failures += len(response["batchItemFailures"])
+
+        items = sum(
+            count_items(dynamodb.Table(table_name))
+            for table_name in set(consumer.TABLES.values())
+        )
+        seconds = sum(durations)
+        results.append(
+            {
+                "batch_size": batch_size,
+                "batches": len(durations),
+                "records": len(entries),
+                "failed_records": failures,
+                "items_written": items,
+                "seconds": seconds,
+                "mean_batch_seconds": statistics.mean(durations),
+                "p50_batch_seconds": percentile(durations, 0.5),
+                "p95_batch_seconds": percentile(durations, 0.95),
+                "items_per_second": items / seconds if seconds else 0.0,
+            }
+        )
+        logger.info(
+            f"Consumer batch_size={batch_size}: "
+            f"{results[-1]['mean_batch_seconds'] * 1000:.1f} ms per batch, "
+            f"{items} items written, {failures} failed records"
+        )
+    return results
+
+
+def fill_station(dynamodb, rows, chunk_size=MAX_BATCH_WRITE_ITEMS):
+    """
+    Write rows hourly observations of the benchmark station to the
+    Temperature table, in BatchWriteItem sized chunks
+    """
+    start = datetime.datetime(1950, 1, 1)
+    for first in range(0, rows, chunk_size):
+        dynamodb.batch_write_item(
+            RequestItems={
+                "Temperature": [
+                    {
+                        "PutRequest": {
+                            "Item": {
+                                "station": BENCHMARK_STATION,
+                                "date": (
+                                    start + datetime.timedelta(hours=i)
+                                ).isoformat(),
+                                "datatype": "TMAX",
+                                "value": i % 400 / 10 - 5,
+                                "station_name": "BENCHMARK",
+                            }
+                        }
+                    }
+                    for i in range(first, min(first + chunk_size, rows))
+                ]
+            }
+        )
+
+
+def benchmark_visualizer(sizes, max_points=DEFAULT_POINT_BUDGET, repeat=1):
+    """
+    Measure fetch_data_from_dynamodb and create_plot latency for stations with
+    each number of rows
+    """
+    results = []
+    for rows in sizes:
+        dynamodb = LocalDynamoDB()
+        fill_station(dynamodb, rows)
+        use_local_tables(dynamodb)
+
+        def run():
+            start = time.perf_counter()
+            items = fetch_data_from_dynamodb("Temperature", BENCHMARK_STATION)
+            fetched = time.perf_counter()
+            figure = create_plot(items, "Benchmark", "Temperature", max_points)
+            plotted = time.perf_counter()
+            payload = figure.to_json()
+            serialized = time.perf_counter()
+            return {
+                "rows": len(items),
+                "seconds": serialized - start,
+                "fetch_seconds": fetched - start,
+                "plot_seconds": plotted - fetched,
+                "plot_json_seconds": serialized - plotted,
+                "plot_json_bytes": len(payload),
+            }
+
+        results.append(best_of(repeat, run))
+        logger.info(
+            f"Visualizer rows={rows}: fetch {results[-1]['fetch_seconds']:.2f}s, "
+            f"plot {results[-1]['plot_seconds']:.2f}s"
+        )
+    return results
+
+
+def git_revision():
+    """
+    The commit being benchmarked, if run from a git checkout
+    """
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def int_list(value):
+    """
+    Parse a comma separated list of integers
+    """
+    return [int(item) for item in value.split(",")]
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments of the benchmark suite
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.benchmark",
+        description="Benchmark the producer, consumer and visualizer on the local backends",
+    )
+    parser.add_argument(
+        "--only",
+        nargs="+",
+        choices=BENCHMARKS,
+        default=BENCHMARKS,
+        help="benchmarks to run",
+    )
+    parser.add_argument(
+        "--page-sizes",
+        type=int_list,
+        default=[100, 500, 1000],
+        help="producer page sizes",
+    )
+    parser.add_argument(
+        "--workers", type=int_list, default=[1, 4, 8], help="producer fetch workers"
+    )
+    parser.add_argument("--days", type=int, default=30, help="days produced per run")
+    parser.add_argument("--stations", type=int, default=50, help="fake NOAA stations")
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="fake NOAA latency in seconds"
+    )
+    parser.add_argument(
+        "--batch-sizes", type=int_list, default=[100, 500], help="consumer batch sizes"
+    )
+    parser.add_argument(
+        "--records", type=int, default=10000, help="records fed to the consumer"
+    )
+    parser.add_argument(
+        "--sizes",
+        type=int_list,
+        default=[1000, 100000, 1000000],
+        help="rows per station for the visualizer",
+    )
+    parser.add_argument("--repeat", type=int, default=1, help="runs per measurement")
+    parser.add_argument("--output", help="write the JSON results to this file")
+    args = parser.parse_args(argv)
+
+    if BACKEND != "local":
+        parser.error("the benchmarks run on the local backends, set BACKEND=local")
+    return args
+
+
+def main(argv=None):
+    """
+    Run the selected benchmarks and write their results as JSON
+    """
+    args = parse_args(argv)
+    logging.basicConfig(level=LOG_LEVEL)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k != "output"},
+        }
+    }
+    if "producer" in args.only:
+        results["producer"] = benchmark_producer(
+            args.page_sizes,
+            args.workers,
+            args.days,
+            args.stations,
+            args.latency,
+            args.repeat,
+        )
+    if "consumer" in args.only:
+        results["consumer"] = benchmark_consumer(
+            args.batch_sizes, args.records, args.stations
+        )
+    if "visualizer" in args.only:
+        results["visualizer"] = benchmark_visualizer(args.sizes, repeat=args.repeat)
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    else:
+        sys.stdout.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
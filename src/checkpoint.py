@@ -0,0 +1,132 @@
+""" 
+    This file contains the checkpoint store used to resume producer runs
+"""
+
+# required imports
+import os
+import json
+import hashlib
+import datetime
+import threading
+import logging
+
+# configure logging
+logger = logging.getLogger()
+
+
+def checkpoint_key(params):
+    """
+    Build a stable key for the query params, ignoring paging params
+    """
+    query = {k: v for k, v in params.items() if k not in ("limit", "offset")}
+    return hashlib.sha256(json.dumps(query, sort_keys=True).encode()).hexdigest()
+
+
+class CheckpointStore:
+    """
+    This class persists producer progress to a local JSON file
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the store, loading any existing checkpoints
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.checkpoints = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.checkpoints = json.load(f)
+            logger.info(f"Loaded {len(self.checkpoints)} checkpoints from {path}")
+
+    def get(self, params):
+        """
+        Get the checkpoint for the query params, or None
+        """
+        with self.lock:
+            return self.checkpoints.get(checkpoint_key(params))
+
+    def update(self, params, offset, limit, sequence_numbers=None, complete=False):
+        """
+        Record that every page up to and including offset has been published
+        """
+        with self.lock:
+            key = checkpoint_key(params)
+            checkpoint = self.checkpoints.setdefault(
+                key,
+                {
+                    "params": {
+                        k: v for k, v in params.items() if k not in ("limit", "offset")
+                    },
+                    "sequence_numbers": {},
+                },
+            )
+            checkpoint["offset"] = offset
+            checkpoint["limit"] = limit
+            checkpoint["complete"] = complete
+            checkpoint["updated"] = datetime.datetime.utcnow().isoformat()
+
+            # keep the highest sequence number seen per shard
+            for shard_id, sequence_number in (sequence_numbers or {}).items():
+                current = checkpoint["sequence_numbers"].get(shard_id)
+                if current is None or int(sequence_number) > int(current):
+                    checkpoint["sequence_numbers"][shard_id] = sequence_number
+
+            self.save()
+
+    def clear(self, params):
+        """
+        Drop the checkpoint for the query params
+        """
+        with self.lock:
+            self.checkpoints.pop(checkpoint_key(params), None)
+            self.save()
+
+    def save(self):
+        """
+        Atomically write the checkpoints to disk. Caller must hold the lock.
+        """
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.checkpoints, f, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+class HighWaterMarkStore:
+    """
+    This class persists the latest observation date seen per location and
+    datatype to a local JSON file
+    """
+
+    def __init__(self, path):
+        """
+        Initialize the store, loading any existing high-water marks
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.marks = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.marks = json.load(f)
+
+    def get(self, location_id, data_type):
+        """
+        Get the latest date seen for the location and datatype, or None
+        """
+        with self.lock:
+            return self.marks.get(f"{location_id}|{data_type}")
+
+    def update(self, location_id, latest_dates):
+        """
+        Advance the marks of the location to the given {datatype: date} values
+        """
+        with self.lock:
+            for data_type, date in latest_dates.items():
+                key = f"{location_id}|{data_type}"
+                if key not in self.marks or date > self.marks[key]:
+                    self.marks[key] = date
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.marks, f, indent=2)
+            os.replace(tmp_path, self.path)
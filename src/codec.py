@@ -0,0 +1,194 @@
+""" 
+    This file contains the record codecs used for Kinesis payloads. It is also
+    packaged next to the Lambda consumer, so it only depends on the standard
+    library (msgpack is optional).
+
+    Payloads are either a legacy JSON object (one observation, no header) or a
+    5 byte header followed by the body:
+
+        magic (2 bytes) | version (1 byte) | codec id (1 byte) | flags (1 byte)
+"""
+
+# required imports
+import json
+import zlib
+import struct
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+MAGIC = b"NC"
+VERSION = 1
+HEADER = struct.Struct(">2sBBB")
+FLAG_ZLIB = 1
+
+# field order of the compact and msgpack row formats
+FIELDS = ["date", "datatype", "station", "value", "station_name"]
+
+CODECS = ["json", "compact", "msgpack", "columnar"]
+CODEC_IDS = {"json": 0, "compact": 1, "msgpack": 2, "columnar": 3}
+CODEC_NAMES = {codec_id: name for name, codec_id in CODEC_IDS.items()}
+
+# observations packed into one columnar payload, well below the 1 MB limit
+COLUMNAR_MAX_RECORDS = 500
+
+
+def check_codec(codec):
+    """
+    Raise if the codec is unknown or its package isn't installed
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unknown codec {codec}, expected one of {CODECS}")
+    if codec == "msgpack" and msgpack is None:
+        raise ImportError("The msgpack codec requires the msgpack package")
+
+
+def encode_body(codec, records):
+    """
+    Encode the records with the codec, without header
+    """
+    if codec == "json":
+        return json.dumps(records[0]).encode("utf-8")
+    if codec == "compact":
+        rows = [[record.get(field) for field in FIELDS] for record in records]
+        return json.dumps(rows, separators=(",", ":")).encode("utf-8")
+    if codec == "msgpack":
+        rows = [[record.get(field) for field in FIELDS] for record in records]
+        return msgpack.packb(rows)
+
+    # columnar: every record shares the station, so it is stored once
+    columns = {
+        "station": records[0]["station"],
+        "station_name": records[0].get("station_name"),
+        "date": [record["date"] for record in records],
+        "datatype": [record["datatype"] for record in records],
+        "value": [record["value"] for record in records],
+    }
+    return json.dumps(columns, separators=(",", ":")).encode("utf-8")
+
+
+def encode_records(
+    records,
+    codec="json",
+    compress=False,
+    partition_key=lambda record: record["station"],
+):
+    """
+    Encode the records into Kinesis payloads. Returns a list of
+    (payload, partition key, observation count), the partition key being
+    partition_key of the first observation in the payload. The columnar codec
+    packs up to COLUMNAR_MAX_RECORDS observations of one station into each
+    payload, the other codecs write one observation per payload. Uncompressed json payloads
+    are written without header so older consumers can still read them.
+    """
+    check_codec(codec)
+
+    # group the records into the observations of each payload
+    if codec == "columnar":
+        by_station = {}
+        for record in records:
+            by_station.setdefault(record["station"], []).append(record)
+        groups = [
+            group[start : start + COLUMNAR_MAX_RECORDS]
+            for group in by_station.values()
+            for start in range(0, len(group), COLUMNAR_MAX_RECORDS)
+        ]
+    else:
+        groups = [[record] for record in records]
+
+    return [
+        (
+            frame(codec, encode_body(codec, group), compress),
+            partition_key(group[0]),
+            len(group),
+        )
+        for group in groups
+    ]
+
+
+def frame(codec, body, compress=False):
+    """
+    Wrap an encoded body into a payload: optionally compressed, behind the
+    header. Uncompressed json bodies are written without header so older
+    consumers can still read them.
+    """
+    if codec == "json" and not compress:
+        return body
+    flags = FLAG_ZLIB if compress else 0
+    if compress:
+        body = zlib.compress(body)
+    return HEADER.pack(MAGIC, VERSION, CODEC_IDS[codec], flags) + body
+
+
+def decode_payload(payload, parse_float=None):
+    """
+    Decode a Kinesis payload written by any codec version into a list of
+    observations. parse_float is applied to every float, e.g. Decimal for
+    DynamoDB. Every decoding failure (truncated header, corrupt zlib body,
+    missing msgpack package, ...) is raised as ValueError, so callers can skip
+    the payload.
+    """
+    try:
+        return decode_observations(payload, parse_float)
+    except ValueError:
+        raise
+    except Exception as e:
+        raise ValueError(f"Malformed payload: {e!r}") from e
+
+
+def decode_observations(payload, parse_float=None):
+    """
+    Decode a payload into its observations, see decode_payload
+    """
+    if payload[:2] != MAGIC:
+        # legacy payload, a single JSON object
+        return [json.loads(payload, parse_float=parse_float)]
+
+    _, version, codec_id, flags = HEADER.unpack_from(payload)
+    if version != VERSION:
+        raise ValueError(f"Unsupported payload version {version}")
+    if codec_id not in CODEC_NAMES:
+        raise ValueError(f"Unknown codec id {codec_id}")
+    codec = CODEC_NAMES[codec_id]
+
+    body = payload[HEADER.size :]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    if codec == "json":
+        return [json.loads(body, parse_float=parse_float)]
+    if codec == "compact":
+        rows = json.loads(body, parse_float=parse_float)
+    elif codec == "msgpack":
+        if msgpack is None:
+            raise ImportError("Decoding msgpack payloads requires the msgpack package")
+        rows = msgpack.unpackb(body)
+        if parse_float is not None:
+            rows = [
+                [
+                    parse_float(str(value)) if isinstance(value, float) else value
+                    for value in row
+                ]
+                for row in rows
+            ]
+    else:
+        columns = json.loads(body, parse_float=parse_float)
+        return [
+            {
+                "date": date,
+                "datatype": datatype,
+                "station": columns["station"],
+                "value": value,
+                "station_name": columns["station_name"],
+            }
+            for date, datatype, value in zip(
+                columns["date"], columns["datatype"], columns["value"]
+            )
+        ]
+
+    return [
+        {field: value for field, value in zip(FIELDS, row) if value is not None}
+        for row in rows
+    ]
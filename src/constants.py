@@ -11,3 +11,94 @@ STATION_URL = os.environ["STATION_URL"]
 AWS_REGION = os.environ["AWS_REGION"]
 LOG_LEVEL = "INFO"
 STREAM_NAME = os.environ["STREAM_NAME"]
+
+# Kinesis PutRecords limits
+KINESIS_MAX_BATCH_RECORDS = 500
+KINESIS_MAX_BATCH_BYTES = 5 * 1024 * 1024
+KINESIS_MAX_PUT_ATTEMPTS = 5
+
+# NOAA page fetching, the API serves at most 1000 results per page
+DEFAULT_FETCH_WORKERS = 4
+NOAA_PAGE_LIMIT = 1000
+
+# NOAA only serves GHCND queries spanning at most one year
+NOAA_MAX_QUERY_DAYS = 365
+DEFAULT_SHARD_PARALLELISM = 1
+
+# NOAA API quota and client settings
+NOAA_REQUESTS_PER_SECOND = 5
+NOAA_REQUESTS_PER_DAY = 10000
+NOAA_MAX_RETRIES = 5
+NOAA_BACKOFF_BASE = 0.5
+NOAA_BACKOFF_MAX = 30
+NOAA_POOL_SIZE = 16
+
+# NOAA locations produced and shown by default, FIPS:24 is Maryland
+LOCATION_IDS = os.environ.get("LOCATION_IDS", "FIPS:24").split(",")
+# Locations produced in parallel by the fan-out producer, one process each
+DEFAULT_LOCATION_PROCESSES = 4
+
+# Local file where producer runs are checkpointed
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "checkpoints.json")
+
+# Local cache of raw NOAA pages, disabled unless a path is set, see src/page_cache.py
+PAGE_CACHE_PATH = os.environ.get("PAGE_CACHE_PATH")
+PAGE_CACHE_MAX_BYTES = int(os.environ.get("PAGE_CACHE_MAX_BYTES", 1024**3))
+
+# Incremental sync state and the window fetched when a datatype has no state yet
+HIGH_WATER_MARK_PATH = os.environ.get("HIGH_WATER_MARK_PATH", "high_water_marks.json")
+INCREMENTAL_INITIAL_DAYS = 30
+
+# Number of stations queried concurrently by the visualizer
+DEFAULT_QUERY_WORKERS = 8
+
+# Station index maintained by the consumer and how long the visualizer caches it
+STATION_INDEX_TABLE = "StationIndex"
+STATION_INDEX_TTL = 300
+
+# Monthly rollups maintained by the consumer
+ROLLUP_TABLE = "Rollups"
+ROLLUP_MIN_SPAN_DAYS = 366
+TABLE_DATATYPES = {
+    "Precipitation": ["PRCP", "SNOW"],
+    "Temperature": ["TOBS", "TMAX", "TMIN"],
+}
+# Datatypes whose monthly value is a total rather than a mean
+TOTAL_DATATYPES = ["PRCP", "SNOW"]
+
+# Plot downsampling
+DEFAULT_POINT_BUDGET = 2000
+DOWNSAMPLE_METHODS = ["lttb", "minmax", "none"]
+
+# Local station metadata store shared by the producer and the visualizer
+STATION_DB_PATH = os.environ.get("STATION_DB_PATH", "stations.db")
+STATION_CACHE_TTL = 7 * 24 * 60 * 60
+STATION_WARMUP_WORKERS = 4
+
+# Producer runs executed in the background for the Streamlit app
+DEFAULT_JOB_WORKERS = 2
+
+# Pages buffered between pipeline stages
+PIPELINE_QUEUE_SIZE = 4
+
+# Requests kept in flight by the asyncio producer engine, see src/async_producer.py
+ASYNC_FETCH_CONCURRENCY = 64
+ASYNC_PUBLISH_CONCURRENCY = 16
+
+# Kinesis payload encoding, see src/codec.py
+DEFAULT_CODEC = os.environ.get("RECORD_CODEC", "json")
+COMPRESS_RECORDS = os.environ.get("COMPRESS_RECORDS", "false").lower() == "true"
+
+# Partitioning of the Kinesis records, see src/partitioning.py
+DEFAULT_PARTITION_STRATEGY = os.environ.get("PARTITION_STRATEGY", "station")
+DEFAULT_SALT_BUCKETS = 8
+
+# Backend of the stream and tables, "aws" or "local" for the in-process
+# stand-ins in src/local_stream.py and src/local_tables.py
+BACKEND = os.environ.get("BACKEND", "aws")
+LOCAL_STREAM_PATH = os.environ.get("LOCAL_STREAM_PATH")
+LOCAL_SHARD_COUNT = int(os.environ.get("LOCAL_SHARD_COUNT", "4"))
+LOCAL_TABLES_PATH = os.environ.get("LOCAL_TABLES_PATH", "local_tables.db")
+
+# Port of the Prometheus metrics endpoint, disabled unless set
+METRICS_PORT = int(os.environ["METRICS_PORT"]) if "METRICS_PORT" in os.environ else None
@@ -0,0 +1,243 @@
+""" 
+    This file contains a fake NOAA API server serving generated GHCND data with
+    the same pagination as the real API, plus configurable latency and rate
+    limits. Point DATA_URL and STATION_URL at it to run the producer offline.
+"""
+
+# required imports
+import json
+import time
+import zlib
+import datetime
+import threading
+import logging
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+
+from src.noaa_client import TokenBucket
+
+# configure logging
+logger = logging.getLogger()
+
+DEFAULT_DATA_TYPES = ["TOBS", "PRCP", "SNOW", "TMAX", "TMIN"]
+
+
+def station_id(index):
+    """
+    Id of the generated station with the index
+    """
+    return f"GHCND:US1MD{index:07d}"
+
+
+def observation_value(station, date, datatype):
+    """
+    Deterministic value of an observation, in metric units
+    """
+    seed = zlib.crc32(f"{station}{date}{datatype}".encode("utf-8"))
+    if datatype in ("PRCP", "SNOW"):
+        # mostly dry days
+        return 0.0 if seed % 3 else round((seed % 500) / 10, 1)
+    return round((seed % 400) / 10 - 5, 1)
+
+
+class FakeNoaaData:
+    """
+    This class generates the observations and stations served by the fake API.
+    Results are ordered by date, station and datatype and computed per page, so
+    large ranges cost nothing until they are requested.
+    """
+
+    def __init__(self, station_count=20, data_types=DEFAULT_DATA_TYPES):
+        """
+        Initialize the generator
+        """
+        self.stations = [station_id(i) for i in range(station_count)]
+        self.data_types = data_types
+
+    def station_names(self):
+        """
+        Map of the generated station ids to their names
+        """
+        return {
+            station: f"FAKE STATION {i}, MD US"
+            for i, station in enumerate(self.stations)
+        }
+
+    def data_page(self, params):
+        """
+        One page of /data results for the query parameters
+        """
+        start = datetime.date.fromisoformat(params["startdate"][:10])
+        end = datetime.date.fromisoformat(params["enddate"][:10])
+        requested = params.get("datatypeid", ",".join(self.data_types)).split(",")
+        data_types = [datatype for datatype in self.data_types if datatype in requested]
+        limit = int(params.get("limit", 25))
+        offset = int(params.get("offset", 1))
+
+        per_day = len(self.stations) * len(data_types)
+        count = ((end - start).days + 1) * per_day
+        results = []
+        for index in range(offset - 1, min(offset - 1 + limit, count)):
+            day, rest = divmod(index, per_day)
+            station, datatype = divmod(rest, len(data_types))
+            date = (start + datetime.timedelta(days=day)).isoformat() + "T00:00:00"
+            results.append(
+                {
+                    "date": date,
+                    "datatype": data_types[datatype],
+                    "station": self.stations[station],
+                    "attributes": ",,N,",
+                    "value": observation_value(
+                        self.stations[station], date, data_types[datatype]
+                    ),
+                }
+            )
+        return self.page(results, offset, limit, count)
+
+    def stations_page(self, params):
+        """
+        One page of /stations results
+        """
+        limit = int(params.get("limit", 25))
+        offset = int(params.get("offset", 1))
+        names = self.station_names()
+        results = [
+            {"id": station, "name": names[station]}
+            for station in self.stations[offset - 1 : offset - 1 + limit]
+        ]
+        return self.page(results, offset, limit, len(self.stations))
+
+    def page(self, results, offset, limit, count):
+        """
+        Wrap the results in the NOAA response envelope
+        """
+        if not results:
+            # NOAA answers an empty object past the last page
+            return {}
+        return {
+            "metadata": {
+                "resultset": {"offset": offset, "count": count, "limit": limit}
+            },
+            "results": results,
+        }
+
+
+class FakeNoaaServer:
+    """
+    This class runs the fake API on a local port in a background thread. Every
+    request waits latency seconds, and requests beyond requests_per_second are
+    answered with 429 and a Retry-After header like the real API.
+    """
+
+    def __init__(
+        self,
+        port=0,
+        latency=0.0,
+        requests_per_second=None,
+        station_count=20,
+        data_types=DEFAULT_DATA_TYPES,
+    ):
+        """
+        Initialize the server, port 0 picks a free port
+        """
+        self.data = FakeNoaaData(station_count, data_types)
+        self.latency = latency
+        self.limiter = None
+        if requests_per_second is not None:
+            self.limiter = TokenBucket(requests_per_second, requests_per_second)
+        self.requests = 0
+        self.throttled = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+        Base url of the server, DATA_URL is url + "/data"
+        """
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def admit(self):
+        """
+        Count a request and tell whether it is within the rate limit
+        """
+        with self.lock:
+            self.requests += 1
+            if self.limiter is None or self.limiter.try_acquire() == 0:
+                return True
+            self.throttled += 1
+            return False
+
+    def handler(self):
+        """
+        Build the request handler class bound to this server
+        """
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlparse(self.path)
+                params = {
+                    key: values[-1] for key, values in parse_qs(url.query).items()
+                }
+                if fake.latency:
+                    time.sleep(fake.latency)
+                if not fake.admit():
+                    self.respond(429, {"message": "rate limited"}, {"Retry-After": "1"})
+                    return
+
+                if url.path.endswith("/data"):
+                    self.respond(200, fake.data.data_page(params))
+                elif url.path.endswith("/stations"):
+                    self.respond(200, fake.data.stations_page(params))
+                elif "/stations/" in url.path:
+                    station = url.path.rsplit("/", 1)[1]
+                    name = fake.data.station_names().get(station)
+                    if name is None:
+                        self.respond(404, {})
+                    else:
+                        self.respond(200, {"id": station, "name": name})
+                else:
+                    self.respond(404, {})
+
+            def respond(self, status, body, headers=None):
+                payload = json.dumps(body).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                logger.debug(f"Fake NOAA: {format % args}")
+
+        return Handler
+
+    def start(self):
+        """
+        Serve requests in a background thread
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        logger.info(f"Fake NOAA API listening on {self.url}")
+        return self
+
+    def stop(self):
+        """
+        Stop serving and release the port
+        """
+        self.server.shutdown()
+        self.server.server_close()
+        if self.thread is not None:
+            self.thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
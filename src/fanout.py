@@ -0,0 +1,238 @@
+""" 
+    This file contains the multi-location fan-out producer. Each NOAA location
+    is produced by its own Producer in a worker process, with its own checkpoint
+    file, while the parent process tracks the progress of every location. The
+    NOAA rate limit and daily quota are split between the worker processes.
+"""
+
+# required imports
+import os
+import time
+import threading
+import multiprocessing
+import logging
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from src.constants import (
+    LOG_LEVEL,
+    NOAA_REQUESTS_PER_SECOND,
+    NOAA_REQUESTS_PER_DAY,
+    DEFAULT_LOCATION_PROCESSES,
+)
+from src import noaa_client
+from src.checkpoint import CheckpointStore
+from src.jobs import Job
+from src.producer import Producer
+
+# configure logging
+logger = logging.getLogger()
+
+# progress queue of the worker process, set by init_worker
+progress_queue = None
+
+
+def location_checkpoint_path(path, location_id):
+    """
+    Checkpoint file of one location, next to the shared checkpoint path, so
+    worker processes never write the same file
+    """
+    root, extension = os.path.splitext(path)
+    return f"{root}-{location_id.replace(':', '_')}{extension}"
+
+
+def init_worker(queue, processes):
+    """
+    Set up a worker process: its progress queue and its share of the NOAA
+    rate limit and daily quota
+    """
+    global progress_queue
+    progress_queue = queue
+    logging.basicConfig(level=LOG_LEVEL)
+    with noaa_client.client_lock:
+        noaa_client.client = noaa_client.NoaaClient(
+            requests_per_second=NOAA_REQUESTS_PER_SECOND / processes,
+            requests_per_day=NOAA_REQUESTS_PER_DAY // processes,
+        )
+
+
+def produce_location(
+    location_id,
+    data_types,
+    start_date,
+    end_date,
+    stations,
+    checkpoint_path=None,
+    engine="threads",
+    **producer_kwargs,
+):
+    """
+    Produce one location in a worker process and return its stats. Progress is
+    reported to the parent through the progress queue. The NOAA client stats
+    are those of this location, although the client serves every location of
+    the process.
+    """
+    noaa_start = noaa_client.get_client().stats()
+
+    def report(pages=0, records=0, errors=0):
+        progress_queue.put((location_id, pages, records, errors))
+
+    producer_class = Producer
+    if engine == "async":
+        from src.async_producer import AsyncProducer
+
+        producer_class = AsyncProducer
+
+    producer = producer_class(
+        data_types,
+        start_date,
+        end_date,
+        False,
+        stations,
+        location_id=location_id,
+        checkpoint=(
+            CheckpointStore(location_checkpoint_path(checkpoint_path, location_id))
+            if checkpoint_path
+            else None
+        ),
+        progress_callback=report,
+        **producer_kwargs,
+    )
+    producer.produce()
+    stats = producer.stats()
+    stats.update(
+        {
+            f"noaa_{k}": v - noaa_start[k]
+            for k, v in noaa_client.get_client().stats().items()
+        }
+    )
+    return stats
+
+
+class FanOutProducer:
+    """
+    This class produces several NOAA locations in parallel on a process pool.
+    Every location is one work unit with its own Job tracking its progress.
+    """
+
+    def __init__(
+        self,
+        location_ids,
+        data_types,
+        start_date,
+        end_date,
+        stations,
+        processes=DEFAULT_LOCATION_PROCESSES,
+        checkpoint_path=None,
+        engine="threads",
+        **producer_kwargs,
+    ):
+        """
+        Initialize the fan-out. stations maps each location id to the
+        {name: id} mapping of its stations, see
+        StationStore.get_location_stations. The other keyword arguments are
+        passed to the Producer of every location.
+        """
+        self.location_ids = list(location_ids)
+        self.data_types = data_types
+        self.start_date = start_date
+        self.end_date = end_date
+        self.stations = stations
+        self.processes = max(1, min(processes, len(self.location_ids)))
+        self.checkpoint_path = checkpoint_path
+        self.engine = engine
+        self.producer_kwargs = producer_kwargs
+        self.jobs = {location_id: Job(location_id) for location_id in self.location_ids}
+        self.results = {}
+        self.elapsed = 0.0
+
+    def track_progress(self, queue):
+        """
+        Apply the progress reported by the workers to the location jobs, until
+        None is received
+        """
+        while True:
+            update = queue.get()
+            if update is None:
+                return
+            location_id, pages, records, errors = update
+            job = self.jobs[location_id]
+            with job.lock:
+                if job.status == "queued":
+                    job.status = "running"
+                    job.started = time.time()
+            job.update(pages, records, errors)
+
+    def produce(self):
+        """
+        Produce every location and return the stats of each one. A failed
+        location is recorded on its job without stopping the others.
+        """
+        logger.info(
+            f"Producing {len(self.location_ids)} locations on {self.processes} processes"
+        )
+        start = time.perf_counter()
+        queue = multiprocessing.Queue()
+        tracker = threading.Thread(
+            target=self.track_progress, args=(queue,), daemon=True
+        )
+        tracker.start()
+
+        try:
+            with ProcessPoolExecutor(
+                max_workers=self.processes,
+                initializer=init_worker,
+                initargs=(queue, self.processes),
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        produce_location,
+                        location_id,
+                        self.data_types,
+                        self.start_date,
+                        self.end_date,
+                        self.stations.get(location_id, {}),
+                        self.checkpoint_path,
+                        self.engine,
+                        **self.producer_kwargs,
+                    ): location_id
+                    for location_id in self.location_ids
+                }
+                for future in as_completed(futures):
+                    self.finish(futures[future], future)
+        finally:
+            queue.put(None)
+            tracker.join()
+
+        self.elapsed = time.perf_counter() - start
+        failed = [job.id for job in self.jobs.values() if job.status == "failed"]
+        logger.info(
+            f"Produced {len(self.location_ids) - len(failed)} locations "
+            f"in {self.elapsed:.1f}s, {len(failed)} failed"
+        )
+        return self.results
+
+    def finish(self, location_id, future):
+        """
+        Record the outcome of a location on its job
+        """
+        job = self.jobs[location_id]
+        try:
+            self.results[location_id] = future.result()
+        except Exception as e:
+            logger.error(f"Producing {location_id} failed: {e}")
+            with job.lock:
+                job.status = "failed"
+                job.error = str(e)
+        else:
+            with job.lock:
+                job.status = "succeeded"
+        finally:
+            with job.lock:
+                job.started = job.started or time.time()
+                job.finished = time.time()
+
+    def progress(self):
+        """
+        Snapshots of the job of every location
+        """
+        return [self.jobs[location_id].snapshot() for location_id in self.location_ids]
@@ -0,0 +1,131 @@
+""" 
+    This file contains the background job runner used to run producers
+    outside of the Streamlit script thread
+"""
+
+# required imports
+import time
+import uuid
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from src.constants import DEFAULT_JOB_WORKERS
+
+# configure logging
+logger = logging.getLogger()
+
+
+class Job:
+    """
+    This class tracks the status and progress of one producer run
+    """
+
+    def __init__(self, description):
+        """
+        Initialize a queued job
+        """
+        self.id = uuid.uuid4().hex[:8]
+        self.description = description
+        self.status = "queued"
+        self.error = None
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.pages = 0
+        self.records = 0
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def update(self, pages=0, records=0, errors=0):
+        """
+        Add to the progress counters, called from the producer threads
+        """
+        with self.lock:
+            self.pages += pages
+            self.records += records
+            self.errors += errors
+
+    def snapshot(self):
+        """
+        Return the job state as a plain dict
+        """
+        with self.lock:
+            end = self.finished or time.time()
+            elapsed = end - self.started if self.started else 0.0
+            return {
+                "id": self.id,
+                "description": self.description,
+                "status": self.status,
+                "pages": self.pages,
+                "records": self.records,
+                "records_per_second": round(self.records / elapsed, 1)
+                if elapsed
+                else 0.0,
+                "errors": self.errors,
+                "elapsed_seconds": round(elapsed, 1),
+                "error": self.error,
+            }
+
+
+class JobRegistry:
+    """
+    This class runs producers on a worker pool and keeps track of their jobs
+    """
+
+    def __init__(self, max_workers=DEFAULT_JOB_WORKERS):
+        """
+        Initialize the registry and its worker pool
+        """
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="producer-job"
+        )
+        self.jobs = {}
+        self.lock = threading.Lock()
+
+    def submit(self, description, producer):
+        """
+        Queue the producer and return its job immediately
+        """
+        job = Job(description)
+        producer.progress_callback = job.update
+        with self.lock:
+            self.jobs[job.id] = job
+        self.executor.submit(self.run, job, producer)
+        logger.info(f"Queued job {job.id}: {description}")
+        return job
+
+    def run(self, job, producer):
+        """
+        Run the producer, recording the outcome on the job
+        """
+        with job.lock:
+            job.status = "running"
+            job.started = time.time()
+        try:
+            producer.produce()
+        except Exception as e:
+            logger.error(f"Job {job.id} failed: {e}")
+            with job.lock:
+                job.status = "failed"
+                job.error = str(e)
+        else:
+            with job.lock:
+                job.status = "succeeded"
+        finally:
+            with job.lock:
+                job.finished = time.time()
+
+    def list_jobs(self):
+        """
+        Snapshots of every job, newest first
+        """
+        with self.lock:
+            jobs = list(self.jobs.values())
+        return [job.snapshot() for job in reversed(jobs)]
+
+    def shutdown(self):
+        """
+        Wait for the running jobs and stop the worker pool
+        """
+        self.executor.shutdown(wait=True)
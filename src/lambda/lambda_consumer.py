@@ -1,34 +1,272 @@
-import json
+import time
 import base64
 import boto3
 from decimal import Decimal
 
-# Initialize DynamoDB client
+# codec.py and metrics.py are packaged next to this file, the fallback is for
+# running from the repo
+try:
+    from codec import decode_payload
+    from metrics import MetricsRegistry
+except ImportError:
+    from src.codec import decode_payload
+    from src.metrics import MetricsRegistry
+
+# Initialize DynamoDB client, reused across warm invocations
 dynamodb = boto3.resource("dynamodb")
 
+# Destination table for each datatype
+TABLES = {
+    "PRCP": "Precipitation",
+    "SNOW": "Precipitation",
+    "TOBS": "Temperature",
+    "TMAX": "Temperature",
+    "TMIN": "Temperature",
+}
+
+# Table holding the set of stations written to each data table
+STATION_INDEX_TABLE = "StationIndex"
+
+# Table holding the monthly rollups of each station and datatype
+ROLLUP_TABLE = "Rollups"
+
+# BatchWriteItem accepts at most 25 items per call
+BATCH_WRITE_LIMIT = 25
+MAX_BATCH_WRITE_ATTEMPTS = 5
+
+# Table handles and stations already registered, reused across warm invocations
+tables = {}
+known_stations = {}
+
+# Metrics of one invocation, logged in CloudWatch embedded metric format
+METRICS_NAMESPACE = "ClimaStream"
+metrics = MetricsRegistry()
+
+
+def get_table(table_name):
+    """
+    Get a cached Table handle
+    """
+    if table_name not in tables:
+        tables[table_name] = dynamodb.Table(table_name)
+    return tables[table_name]
+
+
+def register_stations(table_name, stations):
+    """
+    Add the stations to the station index of the table. Stations already
+    registered by this container are skipped, so steady state costs no writes.
+    """
+    new_stations = set(stations) - known_stations.get(table_name, set())
+    if not new_stations:
+        return
+
+    try:
+        get_table(STATION_INDEX_TABLE).update_item(
+            Key={"table_name": table_name},
+            UpdateExpression="ADD stations :stations",
+            ExpressionAttributeValues={":stations": new_stations},
+        )
+    except Exception as e:
+        # the index is rebuilt from later batches, so don't fail the records
+        print(f"Error registering stations for {table_name}: {e}")
+        return
+    known_stations.setdefault(table_name, set()).update(new_stations)
+
+
+def table_key(item):
+    """
+    Primary key of the item in the data tables, which hold one item per station
+    and day
+    """
+    return (item["station"], item["date"])
+
+
+def chunk_items(items):
+    """
+    Split the items into BatchWriteItem chunks in which no two items share a
+    primary key, since DynamoDB rejects such a call. An item always lands in a
+    later chunk than the earlier items with its key, so the last put still wins.
+    """
+    chunks = []
+    last_chunk = {}
+    for item in items:
+        key = table_key(item)
+        index = last_chunk.get(key, -1) + 1
+        while index < len(chunks) and len(chunks[index]) == BATCH_WRITE_LIMIT:
+            index += 1
+        if index == len(chunks):
+            chunks.append([])
+        chunks[index].append(item)
+        last_chunk[key] = index
+    return chunks
+
+
+def batch_write(table_name, items):
+    """
+    Write the items to the table with BatchWriteItem, retrying unprocessed items.
+    Returns the items that could not be written. A call that raises (e.g. a
+    ValidationException) only fails the items of its own chunk.
+    """
+    failed = []
+
+    for chunk in chunk_items(items):
+        write_requests = [{"PutRequest": {"Item": item}} for item in chunk]
+
+        for attempt in range(MAX_BATCH_WRITE_ATTEMPTS):
+            try:
+                with metrics.histogram(
+                    "dynamodb_batch_write_seconds", "Latency of BatchWriteItem calls"
+                ).time(table=table_name):
+                    response = dynamodb.batch_write_item(
+                        RequestItems={table_name: write_requests}
+                    )
+            except Exception as e:
+                print(f"Error writing {len(write_requests)} items to {table_name}: {e}")
+                break
+            write_requests = response.get("UnprocessedItems", {}).get(table_name, [])
+            if not write_requests or attempt == MAX_BATCH_WRITE_ATTEMPTS - 1:
+                break
+            # back off before retrying the throttled items
+            time.sleep(0.05 * 2**attempt)
+
+        failed.extend(request["PutRequest"]["Item"] for request in write_requests)
+
+    return failed
+
+
+def update_rollups(items):
+    """
+    Fold the items into the station x datatype x month rollups. Each rollup item
+    stores the value of every day as its own attribute (d01 to d31), so applying
+    the same observation twice is harmless and min/max/mean/sum/count are derived
+    from at most 31 values on read. Returns the items whose rollup failed.
+    """
+    # group the day values by rollup item
+    rollups = {}
+    for item in items:
+        month = item["date"][:7]
+        rollup = rollups.setdefault(
+            (item["station"], item["datatype"], month), {"items": [], "days": {}}
+        )
+        rollup["items"].append(item)
+        rollup["days"][f"d{item['date'][8:10]}"] = item["value"]
+
+    failed = []
+    for (station, datatype, month), rollup in rollups.items():
+        names = {"#datatype": "datatype", "#month": "month"}
+        values = {":datatype": datatype, ":month": month}
+        assignments = ["#datatype = :datatype", "#month = :month"]
+        for day, value in sorted(rollup["days"].items()):
+            names[f"#{day}"] = day
+            values[f":{day}"] = value
+            assignments.append(f"#{day} = :{day}")
+
+        try:
+            with metrics.histogram(
+                "rollup_update_seconds", "Latency of rollup UpdateItem calls"
+            ).time():
+                get_table(ROLLUP_TABLE).update_item(
+                    Key={"station": station, "period": f"{datatype}#{month}"},
+                    UpdateExpression="SET " + ", ".join(assignments),
+                    ExpressionAttributeNames=names,
+                    ExpressionAttributeValues=values,
+                )
+        except Exception as e:
+            print(f"Error updating rollup {station} {datatype}#{month}: {e}")
+            failed.extend(rollup["items"])
+
+    return failed
+
 
 def lambda_handler(event, context):
     """
-    Lambda function handler to process the Kinesis stream
+    Lambda function handler to process the Kinesis stream. Returns the sequence
+    numbers of the records that could not be written as batchItemFailures, so
+    that Kinesis only retries those (requires ReportBatchItemFailures on the
+    event source mapping).
     """
+    # Group the observations by destination table and table key. The tables
+    # hold one item per station-day, so the last observation of a key is the
+    # one written, while the rollups get one observation per datatype.
+    observations_by_table = {}
+    sequence_numbers = {}
     for record in event["Records"]:
-        payload = base64.b64decode(record["kinesis"]["data"])
-        data = json.loads(payload, parse_float=Decimal)
-
-        # Determine the table based on the datatype
-        if data["datatype"] in ["PRCP", "SNOW"]:
-            table = dynamodb.Table("Precipitation")
-        elif data["datatype"] in ["TOBS", "TMAX", "TMIN"]:
-            table = dynamodb.Table("Temperature")
-        else:
-            print(f"Unknown datatype: {data['datatype']}")
-            continue  # Skip unknown datatypes
-
-        # Insert the data into the appropriate table
+        sequence_number = record["kinesis"]["sequenceNumber"]
         try:
-            table.put_item(Item=data)
-            print("Successful")
+            payload = base64.b64decode(record["kinesis"]["data"])
+            # one Kinesis record may hold several observations
+            observations = decode_payload(payload, parse_float=Decimal)
         except Exception as e:
-            print(f"Error inserting data: {e}")
+            # poison records are dropped so they can't stall the shard
+            print(f"Skipping malformed record {sequence_number}: {e}")
+            continue
+
+        for data in observations:
+            # Determine the table based on the datatype
+            table_name = TABLES.get(data["datatype"])
+            if table_name is None:
+                print(f"Unknown datatype: {data['datatype']}")
+                continue  # Skip unknown datatypes
+
+            key = table_key(data)
+            datatypes = observations_by_table.setdefault(table_name, {}).setdefault(
+                key, {}
+            )
+            # move the datatype to the end, so the last observation wins
+            datatypes.pop(data["datatype"], None)
+            datatypes[data["datatype"]] = data
+            sequence_numbers.setdefault((table_name, key), []).append(sequence_number)
+
+    # Insert the data into the appropriate tables
+    failed_keys = []
+    for table_name, observations in observations_by_table.items():
+        items = [list(datatypes.values())[-1] for datatypes in observations.values()]
+        try:
+            failed = batch_write(table_name, items)
+        except Exception as e:
+            print(f"Error inserting data into {table_name}: {e}")
+            failed = items
+        print(f"Wrote {len(items) - len(failed)} items to {table_name}")
+        if failed:
+            print(f"Error inserting {len(failed)} items into {table_name}")
+        table_failed_keys = {table_key(item) for item in failed}
+
+        # Keep the station index and rollups in step with the items written
+        written = [
+            data
+            for key, datatypes in observations.items()
+            if key not in table_failed_keys
+            for data in datatypes.values()
+        ]
+        register_stations(
+            table_name,
+            {item["station"] for item in written}
+            - {item["station"] for item in failed},
+        )
+        table_failed_keys.update(table_key(item) for item in update_rollups(written))
+        failed_keys.extend((table_name, key) for key in table_failed_keys)
 
-    return f"Processed {len(event['Records'])}"
+    # Report every record whose observation was not written
+    failures = sorted(
+        {number for key in failed_keys for number in sequence_numbers[key]}, key=int
+    )
+    unique_observations = sum(
+        len(datatypes)
+        for observations in observations_by_table.values()
+        for datatypes in observations.values()
+    )
+    print(
+        f"Processed {len(event['Records'])} records, "
+        f"{unique_observations} unique observations, {len(failures)} failed"
+    )
+    records = metrics.counter("records_total", "Kinesis records by outcome")
+    records.inc(len(event["Records"]) - len(failures), outcome="processed")
+    records.inc(len(failures), outcome="failed")
+    metrics.counter("observations_total", "Unique observations per batch").inc(
+        unique_observations
+    )
+    for line in metrics.emf_lines(METRICS_NAMESPACE, {"Service": "lambda_consumer"}):
+        print(line)
+    metrics.reset()
+    return {"batchItemFailures": [{"itemIdentifier": number} for number in failures]}
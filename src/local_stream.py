@@ -0,0 +1,255 @@
+""" 
+    This file contains an in-process stand-in for a Kinesis stream. It speaks
+    the subset of the boto3 kinesis client used by the producer and the
+    partitioning module, and can be read back as Lambda events for the consumer.
+"""
+
+# required imports
+import os
+import json
+import time
+import base64
+import threading
+import logging
+
+from src.partitioning import shard_for_entry
+
+# configure logging
+logger = logging.getLogger()
+
+# hash keys are 128 bit
+MAX_HASH_KEY = 2**128 - 1
+
+
+class LocalStream:
+    """
+    This class keeps the records of a stream in memory, split over shards with
+    evenly sized hash key ranges like a freshly created Kinesis stream. With a
+    path, every record is also appended to one JSON lines file per shard and
+    reloaded on start. records_per_shard_second optionally enforces a per-shard
+    write limit, failing the excess entries like Kinesis throttling does.
+    """
+
+    def __init__(self, shard_count=4, path=None, records_per_shard_second=None):
+        """
+        Initialize the stream and reload the shard files, if any
+        """
+        self.shards = [
+            {
+                "ShardId": f"shardId-{i:012d}",
+                "start": i * (MAX_HASH_KEY + 1) // shard_count,
+                "end": (i + 1) * (MAX_HASH_KEY + 1) // shard_count - 1,
+            }
+            for i in range(shard_count)
+        ]
+        self.records = {shard["ShardId"]: [] for shard in self.shards}
+        self.path = path
+        self.records_per_shard_second = records_per_shard_second
+        self.windows = {}
+        self.sequence_number = 0
+        self.lock = threading.Lock()
+
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+            for shard_id in self.records:
+                self.load(shard_id)
+
+    def shard_file(self, shard_id):
+        """
+        Path of the JSON lines file of the shard
+        """
+        return os.path.join(self.path, f"{shard_id}.jsonl")
+
+    def load(self, shard_id):
+        """
+        Reload the records of the shard from its file
+        """
+        if not os.path.exists(self.shard_file(shard_id)):
+            return
+        with open(self.shard_file(shard_id)) as f:
+            for line in f:
+                record = json.loads(line)
+                record["Data"] = base64.b64decode(record["Data"])
+                self.records[shard_id].append(record)
+                self.sequence_number = max(
+                    self.sequence_number, int(record["SequenceNumber"])
+                )
+
+    def throttled(self, shard_id):
+        """
+        Count a write to the shard and tell whether it exceeds the write limit
+        """
+        if self.records_per_shard_second is None:
+            return False
+        second = int(time.monotonic())
+        window = self.windows.get(shard_id)
+        if window is None or window[0] != second:
+            window = [second, 0]
+            self.windows[shard_id] = window
+        window[1] += 1
+        return window[1] > self.records_per_shard_second
+
+    def put_records(self, StreamName, Records):
+        """
+        Append the entries to their shards, like Kinesis PutRecords
+        """
+        results = []
+        written = []
+        with self.lock:
+            for entry in Records:
+                shard_id = shard_for_entry(entry, self.shards)
+                if self.throttled(shard_id):
+                    results.append(
+                        {
+                            "ErrorCode": "ProvisionedThroughputExceededException",
+                            "ErrorMessage": "Rate exceeded for shard",
+                        }
+                    )
+                    continue
+
+                self.sequence_number += 1
+                record = {
+                    "SequenceNumber": str(self.sequence_number),
+                    "PartitionKey": entry["PartitionKey"],
+                    "Data": bytes(entry["Data"]),
+                    "ApproximateArrivalTimestamp": time.time(),
+                }
+                self.records[shard_id].append(record)
+                written.append((shard_id, record))
+                results.append(
+                    {"SequenceNumber": record["SequenceNumber"], "ShardId": shard_id}
+                )
+
+            if self.path is not None:
+                self.persist(written)
+
+        failed = sum("ErrorCode" in result for result in results)
+        return {"FailedRecordCount": failed, "Records": results}
+
+    def put_record(self, StreamName, Data, PartitionKey, ExplicitHashKey=None):
+        """
+        Append a single record, like Kinesis PutRecord
+        """
+        entry = {"Data": Data.encode("utf-8") if isinstance(Data, str) else Data}
+        entry["PartitionKey"] = PartitionKey
+        if ExplicitHashKey is not None:
+            entry["ExplicitHashKey"] = ExplicitHashKey
+        result = self.put_records(StreamName, [entry])["Records"][0]
+        if "ErrorCode" in result:
+            raise RuntimeError(result["ErrorMessage"])
+        return result
+
+    def persist(self, written):
+        """
+        Append the written records to their shard files
+        """
+        by_shard = {}
+        for shard_id, record in written:
+            line = dict(record, Data=base64.b64encode(record["Data"]).decode())
+            by_shard.setdefault(shard_id, []).append(json.dumps(line) + "\n")
+        for shard_id, lines in by_shard.items():
+            with open(self.shard_file(shard_id), "a") as f:
+                f.writelines(lines)
+
+    def list_shards(self, StreamName=None, NextToken=None):
+        """
+        Describe the shards and their hash key ranges, like Kinesis ListShards
+        """
+        return {
+            "Shards": [
+                {
+                    "ShardId": shard["ShardId"],
+                    "HashKeyRange": {
+                        "StartingHashKey": str(shard["start"]),
+                        "EndingHashKey": str(shard["end"]),
+                    },
+                    "SequenceNumberRange": {"StartingSequenceNumber": "0"},
+                }
+                for shard in self.shards
+            ]
+        }
+
+    def get_shard_iterator(
+        self, StreamName, ShardId, ShardIteratorType, StartingSequenceNumber=None
+    ):
+        """
+        Return an iterator for the shard. Iterators are plain "shard:position"
+        strings, positions being indexes into the shard's records.
+        """
+        with self.lock:
+            records = self.records[ShardId]
+            if ShardIteratorType == "TRIM_HORIZON":
+                position = 0
+            elif ShardIteratorType == "LATEST":
+                position = len(records)
+            else:
+                # AT/AFTER_SEQUENCE_NUMBER, sequence numbers increase within a shard
+                position = next(
+                    (
+                        i
+                        for i, record in enumerate(records)
+                        if int(record["SequenceNumber"]) >= int(StartingSequenceNumber)
+                    ),
+                    len(records),
+                )
+                if (
+                    ShardIteratorType == "AFTER_SEQUENCE_NUMBER"
+                    and position < len(records)
+                    and records[position]["SequenceNumber"] == StartingSequenceNumber
+                ):
+                    position += 1
+        return {"ShardIterator": f"{ShardId}:{position}"}
+
+    def get_records(self, ShardIterator, Limit=10000):
+        """
+        Read records from the iterator position, like Kinesis GetRecords
+        """
+        shard_id, position = ShardIterator.rsplit(":", 1)
+        position = int(position)
+        with self.lock:
+            records = self.records[shard_id][position : position + Limit]
+            behind = len(self.records[shard_id]) - position - len(records)
+        return {
+            "Records": records,
+            "NextShardIterator": f"{shard_id}:{position + len(records)}",
+            "MillisBehindLatest": 0 if not behind else 1,
+        }
+
+    def lambda_events(self, batch_size=100):
+        """
+        Yield Kinesis Lambda events holding every record of the stream, shard by
+        shard in batches of at most batch_size records, like an event source
+        mapping reading from TRIM_HORIZON
+        """
+        for shard in self.shards:
+            iterator = self.get_shard_iterator(None, shard["ShardId"], "TRIM_HORIZON")[
+                "ShardIterator"
+            ]
+            while True:
+                response = self.get_records(iterator, Limit=batch_size)
+                if not response["Records"]:
+                    break
+                iterator = response["NextShardIterator"]
+                yield {
+                    "Records": [
+                        {
+                            "eventSource": "aws:kinesis",
+                            "eventID": f"{shard['ShardId']}:{record['SequenceNumber']}",
+                            "kinesis": {
+                                "partitionKey": record["PartitionKey"],
+                                "sequenceNumber": record["SequenceNumber"],
+                                "data": base64.b64encode(record["Data"]).decode(),
+                            },
+                        }
+                        for record in response["Records"]
+                    ]
+                }
+
+    def stats(self):
+        """
+        Number of records held by each shard
+        """
+        with self.lock:
+            return {
+                shard_id: len(records) for shard_id, records in self.records.items()
+            }
@@ -0,0 +1,425 @@
+""" 
+    This file contains a SQLite backed stand-in for the DynamoDB tables. It
+    speaks the subset of the boto3 DynamoDB resource used by the visualizer and
+    the Lambda consumer: get/put/update items, key condition queries, scans and
+    batch writes, with DynamoDB style pagination.
+"""
+
+# required imports
+import re
+import json
+import time
+import sqlite3
+import threading
+import logging
+from decimal import Decimal
+
+# configure logging
+logger = logging.getLogger()
+
+# partition and sort key of each table, None for tables without sort key
+KEY_SCHEMAS = {
+    "Precipitation": ("station", "date"),
+    "Temperature": ("station", "date"),
+    "StationIndex": ("table_name", None),
+    "Rollups": ("station", "period"),
+}
+
+# items returned per query or scan page, DynamoDB pages by 1 MB instead
+DEFAULT_PAGE_SIZE = 1000
+
+# requests accepted by one BatchWriteItem call
+MAX_BATCH_WRITE_ITEMS = 25
+
+
+def to_attribute(value):
+    """
+    Encode a Python value as a typed DynamoDB attribute
+    """
+    if isinstance(value, bool):
+        return {"BOOL": value}
+    if isinstance(value, str):
+        return {"S": value}
+    if isinstance(value, (int, float, Decimal)):
+        return {"N": str(value)}
+    if isinstance(value, (set, frozenset)):
+        if all(isinstance(member, str) for member in value):
+            return {"SS": sorted(value)}
+        return {"NS": sorted(str(member) for member in value)}
+    if isinstance(value, (list, tuple)):
+        return {"L": [to_attribute(member) for member in value]}
+    if isinstance(value, dict):
+        return {"M": {key: to_attribute(member) for key, member in value.items()}}
+    if value is None:
+        return {"NULL": True}
+    raise TypeError(f"Unsupported attribute type {type(value)}")
+
+
+def from_attribute(attribute):
+    """
+    Decode a typed DynamoDB attribute, numbers as Decimal like boto3
+    """
+    ((kind, value),) = attribute.items()
+    if kind == "N":
+        return Decimal(value)
+    if kind == "SS":
+        return set(value)
+    if kind == "NS":
+        return {Decimal(member) for member in value}
+    if kind == "L":
+        return [from_attribute(member) for member in value]
+    if kind == "M":
+        return {key: from_attribute(member) for key, member in value.items()}
+    if kind == "NULL":
+        return None
+    return value
+
+
+def encode_item(item):
+    """
+    Serialize an item for storage
+    """
+    return json.dumps({key: to_attribute(value) for key, value in item.items()})
+
+
+def decode_item(data):
+    """
+    Deserialize a stored item
+    """
+    return {key: from_attribute(value) for key, value in json.loads(data).items()}
+
+
+def condition_bounds(condition):
+    """
+    Flatten a boto3 key condition into [(attribute, operator, values)]
+    """
+    expression = condition.get_expression()
+    if expression["operator"] == "AND":
+        left, right = expression["values"]
+        return condition_bounds(left) + condition_bounds(right)
+    key, *values = expression["values"]
+    return [(key.name, expression["operator"], values)]
+
+
+def project(item, projection, names):
+    """
+    Keep only the attributes of the projection expression
+    """
+    if not projection:
+        return item
+    attributes = [
+        (names or {}).get(name.strip(), name.strip()) for name in projection.split(",")
+    ]
+    return {name: item[name] for name in attributes if name in item}
+
+
+class LocalTable:
+    """
+    This class is a DynamoDB table stored in a shared SQLite database
+    """
+
+    def __init__(self, database, name, key_schema):
+        """
+        Initialize the table
+        """
+        self.database = database
+        self.name = name
+        self.hash_key, self.range_key = key_schema
+
+    def key_values(self, key):
+        """
+        The stored (hash, range) key of an item or key
+        """
+        range_value = key[self.range_key] if self.range_key else ""
+        return str(key[self.hash_key]), str(range_value)
+
+    def item_key(self, item):
+        """
+        The key attributes of an item, used as LastEvaluatedKey
+        """
+        key = {self.hash_key: item[self.hash_key]}
+        if self.range_key:
+            key[self.range_key] = item[self.range_key]
+        return key
+
+    def put_item(self, Item):
+        """
+        Create or replace an item
+        """
+        self.database.put(self.name, *self.key_values(Item), Item)
+        return {}
+
+    def delete_item(self, Key):
+        """
+        Delete an item
+        """
+        self.database.delete(self.name, *self.key_values(Key))
+        return {}
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None):
+        """
+        Read an item by key
+        """
+        item = self.database.get(self.name, *self.key_values(Key))
+        if item is None:
+            return {}
+        return {"Item": project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def update_item(
+        self,
+        Key,
+        UpdateExpression,
+        ExpressionAttributeNames=None,
+        ExpressionAttributeValues=None,
+    ):
+        """
+        Apply SET and ADD actions to an item, creating it if needed
+        """
+        names = ExpressionAttributeNames or {}
+        values = ExpressionAttributeValues or {}
+
+        with self.database.lock:
+            item = self.database.get(self.name, *self.key_values(Key)) or dict(Key)
+            for action, clause in re.findall(
+                r"\b(SET|ADD)\s+(.*?)(?=\s+\b(?:SET|ADD|REMOVE|DELETE)\b|$)",
+                UpdateExpression,
+            ):
+                for assignment in clause.split(","):
+                    if action == "SET":
+                        name, value = (part.strip() for part in assignment.split("="))
+                        item[names.get(name, name)] = values[value]
+                        continue
+
+                    name, value = assignment.split()
+                    name = names.get(name, name)
+                    if isinstance(values[value], (set, frozenset)):
+                        item[name] = set(item.get(name, set())) | set(values[value])
+                    else:
+                        item[name] = item.get(name, 0) + values[value]
+            self.database.put(self.name, *self.key_values(Key), item)
+        return {}
+
+    def query(
+        self,
+        KeyConditionExpression,
+        ProjectionExpression=None,
+        ExpressionAttributeNames=None,
+        ExclusiveStartKey=None,
+        Limit=None,
+        ScanIndexForward=True,
+    ):
+        """
+        Query the items of one partition with an optional sort key condition
+        """
+        clauses = ["table_name = ?"]
+        params = [self.name]
+        for name, operator, operands in condition_bounds(KeyConditionExpression):
+            column = "hash_key" if name == self.hash_key else "range_key"
+            if operator == "BETWEEN":
+                clauses.append(f"{column} BETWEEN ? AND ?")
+                params.extend(str(operand) for operand in operands)
+            elif operator == "begins_with":
+                clauses.append(f"substr({column}, 1, ?) = ?")
+                params.extend([len(operands[0]), operands[0]])
+            else:
+                clauses.append(f"{column} {operator} ?")
+                params.append(str(operands[0]))
+
+        return self.page(
+            clauses,
+            params,
+            ProjectionExpression,
+            ExpressionAttributeNames,
+            ExclusiveStartKey,
+            Limit,
+            ScanIndexForward,
+        )
+
+    def scan(
+        self,
+        ProjectionExpression=None,
+        ExpressionAttributeNames=None,
+        ExclusiveStartKey=None,
+        Limit=None,
+    ):
+        """
+        Read every item of the table
+        """
+        return self.page(
+            ["table_name = ?"],
+            [self.name],
+            ProjectionExpression,
+            ExpressionAttributeNames,
+            ExclusiveStartKey,
+            Limit,
+        )
+
+    def page(
+        self,
+        clauses,
+        params,
+        projection,
+        names,
+        start_key=None,
+        limit=None,
+        forward=True,
+    ):
+        """
+        Read one page of the matching items in key order
+        """
+        clauses = list(clauses)
+        params = list(params)
+        if start_key is not None:
+            hash_value, range_value = self.key_values(start_key)
+            comparison = ">" if forward else "<"
+            clauses.append(f"(hash_key, range_key) {comparison} (?, ?)")
+            params.extend([hash_value, range_value])
+
+        limit = limit or DEFAULT_PAGE_SIZE
+        order = "ASC" if forward else "DESC"
+        items = self.database.select(
+            f"WHERE {' AND '.join(clauses)} "
+            f"ORDER BY hash_key {order}, range_key {order} LIMIT ?",
+            params + [limit + 1],
+        )
+
+        response = {
+            "Items": [project(item, projection, names) for item in items[:limit]],
+            "Count": min(len(items), limit),
+        }
+        if len(items) > limit:
+            response["LastEvaluatedKey"] = self.item_key(items[limit - 1])
+        return response
+
+
+class LocalDynamoDB:
+    """
+    This class stands in for the boto3 DynamoDB resource, keeping every table
+    in one SQLite database. Use ":memory:" for a throwaway database.
+    items_per_second optionally enforces a batch write limit, returning the
+    excess requests as UnprocessedItems like DynamoDB throttling does.
+    """
+
+    def __init__(self, path=":memory:", key_schemas=None, items_per_second=None):
+        """
+        Open the database and create its schema
+        """
+        self.key_schemas = dict(KEY_SCHEMAS, **(key_schemas or {}))
+        self.items_per_second = items_per_second
+        self.window = [None, 0]
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.lock = threading.RLock()
+        with self.lock, self.connection:
+            self.connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS items (
+                    table_name TEXT,
+                    hash_key TEXT,
+                    range_key TEXT,
+                    item TEXT,
+                    PRIMARY KEY (table_name, hash_key, range_key)
+                )
+                """
+            )
+
+    def Table(self, name):
+        """
+        Return a handle on the table, like the boto3 resource
+        """
+        if name not in self.key_schemas:
+            raise ValueError(f"No key schema for table {name}")
+        return LocalTable(self, name, self.key_schemas[name])
+
+    def put(self, table_name, hash_value, range_value, item):
+        """
+        Store an item
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO items VALUES (?, ?, ?, ?)",
+                (table_name, hash_value, range_value, encode_item(item)),
+            )
+
+    def delete(self, table_name, hash_value, range_value):
+        """
+        Remove an item
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "DELETE FROM items WHERE table_name = ? AND hash_key = ? "
+                "AND range_key = ?",
+                (table_name, hash_value, range_value),
+            )
+
+    def get(self, table_name, hash_value, range_value):
+        """
+        Load an item, or None
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT item FROM items WHERE table_name = ? AND hash_key = ? "
+                "AND range_key = ?",
+                (table_name, hash_value, range_value),
+            ).fetchone()
+        return decode_item(row[0]) if row else None
+
+    def select(self, where, params):
+        """
+        Load the items matching the WHERE clause
+        """
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT item FROM items {where}", params
+            ).fetchall()
+        return [decode_item(row[0]) for row in rows]
+
+    def throttled(self):
+        """
+        Count a batch write request and tell whether it exceeds the write limit
+        """
+        if self.items_per_second is None:
+            return False
+        second = int(time.monotonic())
+        if self.window[0] != second:
+            self.window = [second, 0]
+        self.window[1] += 1
+        return self.window[1] > self.items_per_second
+
+    def batch_write_item(self, RequestItems):
+        """
+        Apply put and delete requests to several tables. Like DynamoDB, calls
+        with more than MAX_BATCH_WRITE_ITEMS requests or with several requests
+        on the same item are rejected, and requests past the write limit are
+        returned as UnprocessedItems.
+        """
+        count = sum(len(requests) for requests in RequestItems.values())
+        if count > MAX_BATCH_WRITE_ITEMS:
+            raise ValueError(
+                f"Too many items requested for the BatchWriteItem call: {count}, "
+                f"at most {MAX_BATCH_WRITE_ITEMS}"
+            )
+        for table_name, requests in RequestItems.items():
+            table = self.Table(table_name)
+            keys = {
+                table.key_values(
+                    request["PutRequest"]["Item"]
+                    if "PutRequest" in request
+                    else request["DeleteRequest"]["Key"]
+                )
+                for request in requests
+            }
+            if len(keys) < len(requests):
+                raise ValueError("Provided list of item keys contains duplicates")
+
+        unprocessed = {}
+        with self.lock:
+            for table_name, requests in RequestItems.items():
+                table = self.Table(table_name)
+                for request in requests:
+                    if self.throttled():
+                        unprocessed.setdefault(table_name, []).append(request)
+                    elif "PutRequest" in request:
+                        table.put_item(Item=request["PutRequest"]["Item"])
+                    else:
+                        table.delete_item(Key=request["DeleteRequest"]["Key"])
+        return {"UnprocessedItems": unprocessed}
@@ -0,0 +1,367 @@
+""" 
+    This file contains the lightweight metrics used across the producer, the
+    consumer and the visualizer: counters and latency histograms, exported as
+    Prometheus text or as CloudWatch embedded metric format (EMF) log lines, and
+    an optional sampling profiler. It only depends on the standard library so it
+    can be packaged next to the Lambda consumer.
+"""
+
+# required imports
+import sys
+import json
+import time
+import threading
+import traceback
+import logging
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# configure logging
+logger = logging.getLogger()
+
+# latency buckets in seconds, from a cache hit to a slow NOAA page
+DEFAULT_BUCKETS = [0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+# EMF accepts at most 100 values per metric
+EMF_MAX_VALUES = 100
+
+
+def label_key(labels):
+    """
+    Hashable, ordered key of a label set
+    """
+    return tuple(sorted(labels.items()))
+
+
+def format_labels(key, extra=()):
+    """
+    Prometheus label string of a label key
+    """
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    """
+    This class counts events per label set
+    """
+
+    def __init__(self, name, help):
+        """
+        Initialize the counter
+        """
+        self.name = name
+        self.help = help
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, value=1, **labels):
+        """
+        Add value to the counter of the label set
+        """
+        key = label_key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + value
+
+    def render(self):
+        """
+        Prometheus text lines of the counter
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{format_labels(key)} {value}")
+        return lines
+
+
+class Histogram:
+    """
+    This class tracks a latency distribution per label set in fixed buckets.
+    The latest values are also kept, up to EMF_MAX_VALUES, for EMF export.
+    """
+
+    def __init__(self, name, help, buckets=DEFAULT_BUCKETS):
+        """
+        Initialize the histogram
+        """
+        self.name = name
+        self.help = help
+        self.buckets = sorted(buckets)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        """
+        Record one observation for the label set
+        """
+        key = label_key(labels)
+        with self.lock:
+            series = self.series.setdefault(
+                key,
+                {
+                    "buckets": [0] * len(self.buckets),
+                    "sum": 0.0,
+                    "count": 0,
+                    "values": [],
+                },
+            )
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["buckets"][i] += 1
+                    break
+            series["sum"] += value
+            series["count"] += 1
+            if len(series["values"]) < EMF_MAX_VALUES:
+                series["values"].append(value)
+
+    @contextmanager
+    def time(self, **labels):
+        """
+        Observe the duration of the with block
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        """
+        Prometheus text lines of the histogram, with cumulative buckets
+        """
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, series in sorted(self.series.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, series["buckets"]):
+                    cumulative += count
+                    labels = format_labels(key, [("le", bound)])
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                labels = format_labels(key, [("le", "+Inf")])
+                lines.append(f"{self.name}_bucket{labels} {series['count']}")
+                lines.append(f"{self.name}_sum{format_labels(key)} {series['sum']}")
+                lines.append(f"{self.name}_count{format_labels(key)} {series['count']}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    This class holds the metrics of a process
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty registry
+        """
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def get_or_create(self, name, factory):
+        """
+        Return the metric with the name, creating it with factory on first use
+        """
+        with self.lock:
+            if name not in self.metrics:
+                self.metrics[name] = factory()
+            return self.metrics[name]
+
+    def counter(self, name, help=""):
+        """
+        Return the counter with the name
+        """
+        return self.get_or_create(name, lambda: Counter(name, help))
+
+    def histogram(self, name, help="", buckets=DEFAULT_BUCKETS):
+        """
+        Return the histogram with the name
+        """
+        return self.get_or_create(name, lambda: Histogram(name, help, buckets))
+
+    def reset(self):
+        """
+        Drop every recorded value
+        """
+        with self.lock:
+            self.metrics = {}
+
+    def render_prometheus(self):
+        """
+        Render every metric in the Prometheus text exposition format
+        """
+        with self.lock:
+            metrics = sorted(self.metrics.items())
+        lines = []
+        for _, metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def emf_lines(self, namespace, dimensions=None):
+        """
+        Render the metrics as CloudWatch EMF JSON lines, one per label set.
+        Labels become dimensions next to the static dimensions. Histograms are
+        exported as their latest values in milliseconds, so CloudWatch can
+        compute percentiles.
+        """
+        dimensions = dimensions or {}
+        documents = {}
+
+        def document(key):
+            if key not in documents:
+                documents[key] = {"metrics": [], "values": {}}
+            return documents[key]
+
+        with self.lock:
+            metrics = list(self.metrics.values())
+        for metric in metrics:
+            with metric.lock:
+                if isinstance(metric, Counter):
+                    for key, value in metric.values.items():
+                        doc = document(key)
+                        doc["metrics"].append({"Name": metric.name, "Unit": "Count"})
+                        doc["values"][metric.name] = value
+                else:
+                    for key, series in metric.series.items():
+                        doc = document(key)
+                        doc["metrics"].append(
+                            {"Name": metric.name, "Unit": "Milliseconds"}
+                        )
+                        doc["values"][metric.name] = [
+                            round(value * 1000, 3) for value in series["values"]
+                        ]
+
+        lines = []
+        timestamp = int(time.time() * 1000)
+        for key, doc in documents.items():
+            properties = dict(dimensions, **dict(key))
+            lines.append(
+                json.dumps(
+                    {
+                        "_aws": {
+                            "Timestamp": timestamp,
+                            "CloudWatchMetrics": [
+                                {
+                                    "Namespace": namespace,
+                                    "Dimensions": [sorted(properties)],
+                                    "Metrics": doc["metrics"],
+                                }
+                            ],
+                        },
+                        **properties,
+                        **doc["values"],
+                    }
+                )
+            )
+        return lines
+
+
+# registry shared by the producer and visualizer modules of a process
+metrics = MetricsRegistry()
+
+
+def start_metrics_server(port, registry=metrics):
+    """
+    Serve the registry as Prometheus text on http://0.0.0.0:port/metrics from
+    a background thread. Returns the server, call shutdown() to stop it.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            payload = registry.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, format, *args):
+            logger.debug(f"Metrics endpoint: {format % args}")
+
+    server = ThreadingHTTPServer(("0.0.0.0", port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logger.info(f"Serving metrics on port {server.server_address[1]}")
+    return server
+
+
+class SamplingProfiler:
+    """
+    This class samples the stacks of every other thread at a fixed interval and
+    counts them in the collapsed format read by flame graph tools
+    (frame;frame;frame count). Sampling costs nothing in the profiled threads
+    beyond holding the GIL while the stacks are walked.
+    """
+
+    def __init__(self, interval=0.01):
+        """
+        Initialize a stopped profiler
+        """
+        self.interval = interval
+        self.stacks = {}
+        self.samples = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def sample(self):
+        """
+        Count the current stack of every other thread
+        """
+        own = threading.get_ident()
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id == own:
+                continue
+            stack = ";".join(
+                f"{entry.name} ({entry.filename.rsplit('/', 1)[-1]}:{entry.lineno})"
+                for entry in traceback.extract_stack(frame)
+            )
+            self.stacks[stack] = self.stacks.get(stack, 0) + 1
+        self.samples += 1
+
+    def run(self):
+        """
+        Sample until stopped
+        """
+        while not self.stop_event.wait(self.interval):
+            self.sample()
+
+    def start(self):
+        """
+        Start sampling in a background thread
+        """
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        """
+        Stop sampling
+        """
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+
+    def write_collapsed(self, path):
+        """
+        Write the sampled stacks in the collapsed format
+        """
+        with open(path, "w") as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write(f"{stack} {count}\n")
+        logger.info(f"Wrote {self.samples} profiler samples to {path}")
+
+
+@contextmanager
+def profile(path, interval=0.01):
+    """
+    Profile the with block and write the collapsed stacks to path
+    """
+    profiler = SamplingProfiler(interval).start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+        profiler.write_collapsed(path)
@@ -0,0 +1,228 @@
+""" 
+    This file contains the shared NOAA API client with connection pooling,
+    rate limiting and retries
+"""
+
+# required imports
+import random
+import datetime
+import threading
+import time
+import logging
+import requests
+from requests.adapters import HTTPAdapter
+
+from src.constants import (
+    API_KEY,
+    NOAA_REQUESTS_PER_SECOND,
+    NOAA_REQUESTS_PER_DAY,
+    NOAA_MAX_RETRIES,
+    NOAA_BACKOFF_BASE,
+    NOAA_BACKOFF_MAX,
+    NOAA_POOL_SIZE,
+)
+from src.metrics import metrics
+
+# configure logging
+logger = logging.getLogger()
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+class NoaaApiError(Exception):
+    """
+    Raised when a NOAA request keeps failing after all retries
+    """
+
+
+class NoaaQuotaExceeded(NoaaApiError):
+    """
+    Raised when the daily NOAA request quota has been used up
+    """
+
+
+class TokenBucket:
+    """
+    Thread safe token bucket limiting the request rate
+    """
+
+    def __init__(self, rate, capacity):
+        """
+        Initialize the bucket with rate tokens per second and a burst of capacity
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Take one token if one is available. Returns 0 on success, otherwise the
+        time until the next token.
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Take one token, sleeping until one is available. Returns the time waited.
+        """
+        waited = 0.0
+        while True:
+            delay = self.try_acquire()
+            if not delay:
+                return waited
+            time.sleep(delay)
+            waited += delay
+
+
+class NoaaClient:
+    """
+    This class wraps a pooled requests session for the NOAA API
+    """
+
+    def __init__(
+        self,
+        token=API_KEY,
+        requests_per_second=NOAA_REQUESTS_PER_SECOND,
+        requests_per_day=NOAA_REQUESTS_PER_DAY,
+        max_retries=NOAA_MAX_RETRIES,
+        pool_size=NOAA_POOL_SIZE,
+    ):
+        """
+        Initialize the client
+        """
+        # keep-alive session shared by every thread
+        self.session = requests.Session()
+        self.session.headers["token"] = token
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.limiter = TokenBucket(requests_per_second, requests_per_second)
+        self.requests_per_day = requests_per_day
+        self.max_retries = max_retries
+        self.day = datetime.date.today()
+        self.day_count = 0
+        self.lock = threading.Lock()
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "throttle_waits": 0,
+            "throttle_wait_seconds": 0.0,
+            "errors": 0,
+        }
+
+    def count(self, name, value=1):
+        """
+        Increment one of the client counters
+        """
+        with self.lock:
+            self.counters[name] += value
+
+    def stats(self):
+        """
+        Return a snapshot of the client counters
+        """
+        with self.lock:
+            return dict(self.counters)
+
+    def observe(self, start, response):
+        """
+        Record the latency and outcome of one HTTP request
+        """
+        status = "error" if response is None else str(response.status_code)
+        metrics.histogram(
+            "noaa_request_seconds", "Latency of NOAA API requests"
+        ).observe(time.perf_counter() - start, status=status)
+        metrics.counter("noaa_requests_total", "NOAA API requests by status").inc(
+            status=status
+        )
+
+    def reserve_daily_quota(self):
+        """
+        Count a request against the daily quota, raising if it is used up
+        """
+        with self.lock:
+            today = datetime.date.today()
+            if today != self.day:
+                self.day = today
+                self.day_count = 0
+            if self.day_count >= self.requests_per_day:
+                raise NoaaQuotaExceeded(
+                    f"Daily NOAA quota of {self.requests_per_day} requests reached"
+                )
+            self.day_count += 1
+
+    def backoff(self, attempt, response=None):
+        """
+        Seconds to wait before the next attempt, honouring Retry-After
+        """
+        if response is not None and response.headers.get("Retry-After", "").isdigit():
+            return int(response.headers["Retry-After"])
+        # full jitter exponential backoff
+        return random.uniform(
+            0, min(NOAA_BACKOFF_MAX, NOAA_BACKOFF_BASE * 2**attempt)
+        )
+
+    def get(self, url, params=None, timeout=15):
+        """
+        Rate limited GET with retries on 429, 5xx and connection errors
+        """
+        for attempt in range(self.max_retries + 1):
+            self.reserve_daily_quota()
+            waited = self.limiter.acquire()
+            if waited:
+                self.count("throttle_waits")
+                self.count("throttle_wait_seconds", waited)
+
+            self.count("requests")
+            start = time.perf_counter()
+            try:
+                response = self.session.get(url, params=params, timeout=timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                error = f"{type(e).__name__}: {e}"
+                response = None
+            self.observe(start, response)
+            if response is not None:
+                if response.status_code not in RETRY_STATUS_CODES:
+                    return response
+                error = f"status {response.status_code}"
+
+            if attempt == self.max_retries:
+                break
+            delay = self.backoff(attempt, response)
+            logger.warning(
+                f"NOAA request to {url} failed with {error}, retrying in {delay:.2f}s"
+            )
+            self.count("retries")
+            time.sleep(delay)
+
+        self.count("errors")
+        raise NoaaApiError(
+            f"NOAA request to {url} failed with {error} after {attempt + 1} attempts"
+        )
+
+
+client = None
+client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process wide NOAA client, creating it on first use
+    """
+    global client
+    with client_lock:
+        if client is None:
+            client = NoaaClient()
+        return client
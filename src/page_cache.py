@@ -0,0 +1,228 @@
+""" 
+    This file contains the local cache of raw NOAA pages. Every page is stored
+    as a JSON file named after the hash of its normalized query params, so the
+    same page fetched twice is stored once and re-runs skip the rate limited
+    API. The first line of a file holds the params and the second the page
+    verbatim, so replayed pages are the pages that were fetched, whatever
+    fields and value types their results hold. The cache is bounded in bytes,
+    evicting the least recently used pages.
+"""
+
+# required imports
+import os
+import json
+import time
+import hashlib
+import threading
+import logging
+
+from src.constants import PAGE_CACHE_MAX_BYTES
+from src.metrics import metrics
+
+# configure logging
+logger = logging.getLogger()
+
+
+def normalize_params(params):
+    """
+    Canonical form of the query params of a page: string values, with the
+    datatypes of a multi-datatype query sorted
+    """
+    normalized = {str(k).lower(): str(v) for k, v in params.items() if v is not None}
+    if "datatypeid" in normalized:
+        normalized["datatypeid"] = ",".join(sorted(normalized["datatypeid"].split(",")))
+    return normalized
+
+
+def cache_key(params):
+    """
+    Content address of the page requested with the params
+    """
+    query = json.dumps(normalize_params(params), sort_keys=True)
+    return hashlib.sha256(query.encode("utf-8")).hexdigest()
+
+
+class CachedResponse:
+    """
+    This class serves a cached page with the parts of the requests Response
+    interface the producer uses
+    """
+
+    status_code = 200
+    headers = {}
+
+    def __init__(self, page):
+        """
+        Initialize the response
+        """
+        self.page = page
+
+    def json(self):
+        """
+        The cached page
+        """
+        return self.page
+
+
+class PageCache:
+    """
+    This class stores raw NOAA pages as JSON files under path, one file per
+    page, and evicts the least recently read pages once they take more than
+    max_bytes. File modification times serve as the LRU clock, so the cache
+    can be shared by processes and survives restarts.
+    """
+
+    def __init__(self, path, max_bytes=PAGE_CACHE_MAX_BYTES):
+        """
+        Initialize the cache, indexing the pages already on disk
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}
+        os.makedirs(path, exist_ok=True)
+
+        for directory, _, files in os.walk(path):
+            for name in files:
+                if name.endswith(".json"):
+                    stat = os.stat(os.path.join(directory, name))
+                    self.entries[name[: -len(".json")]] = [
+                        stat.st_size,
+                        stat.st_mtime,
+                    ]
+        logger.info(f"Page cache at {path} holds {len(self.entries)} pages")
+
+    def __reduce__(self):
+        """
+        Pickle the cache as its location, e.g. for the fan-out worker processes
+        """
+        return PageCache, (self.path, self.max_bytes)
+
+    def file(self, key):
+        """
+        Path of the file of a page, spread over 256 directories
+        """
+        return os.path.join(self.path, key[:2], f"{key}.json")
+
+    def size(self):
+        """
+        Bytes taken by the cached pages
+        """
+        with self.lock:
+            return sum(size for size, _ in self.entries.values())
+
+    def get(self, params):
+        """
+        The cached page for the query params, or None
+        """
+        key = cache_key(params)
+        requests = metrics.counter(
+            "page_cache_requests_total", "NOAA page cache lookups by result"
+        )
+        try:
+            page = self.read(key)
+            # mark the page as recently used
+            now = time.time()
+            os.utime(self.file(key), (now, now))
+        except FileNotFoundError:
+            # not cached, or evicted by another process
+            with self.lock:
+                self.entries.pop(key, None)
+            requests.inc(result="miss")
+            return None
+
+        with self.lock:
+            if key in self.entries:
+                self.entries[key][1] = now
+        requests.inc(result="hit")
+        return page
+
+    def read(self, key):
+        """
+        Load the page stored under the key
+        """
+        with open(self.file(key), encoding="utf-8") as f:
+            f.readline()
+            return json.loads(f.readline())
+
+    def read_params(self, key):
+        """
+        Load the params of the page stored under the key, without its results
+        """
+        with open(self.file(key), encoding="utf-8") as f:
+            return json.loads(f.readline())
+
+    def put(self, params, page):
+        """
+        Store the page fetched with the query params
+        """
+        key = cache_key(params)
+
+        # write atomically, concurrent readers see the old page or the new one
+        path = self.file(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(normalize_params(params)) + "\n")
+            f.write(json.dumps(page) + "\n")
+        os.replace(tmp_path, path)
+
+        stat = os.stat(path)
+        with self.lock:
+            self.entries[key] = [stat.st_size, stat.st_mtime]
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used pages until the cache fits max_bytes
+        """
+        with self.lock:
+            total = sum(size for size, _ in self.entries.values())
+            if total <= self.max_bytes:
+                return
+            evicted = []
+            for key, (size, _) in sorted(self.entries.items(), key=lambda e: e[1][1]):
+                if total <= self.max_bytes:
+                    break
+                evicted.append(key)
+                total -= size
+            for key in evicted:
+                del self.entries[key]
+
+        for key in evicted:
+            try:
+                os.remove(self.file(key))
+            except FileNotFoundError:
+                pass
+        logger.debug(f"Evicted {len(evicted)} pages from the page cache")
+
+    def pages(self, match=None):
+        """
+        Yield (params, page) for every cached page, ordered by query and
+        offset. match(params) selects the pages from their normalized params.
+        """
+        with self.lock:
+            keys = list(self.entries)
+
+        selected = []
+        for key in keys:
+            try:
+                params = self.read_params(key)
+            except FileNotFoundError:
+                continue
+            if match is None or match(params):
+                selected.append((params, key))
+
+        selected.sort(
+            key=lambda item: (
+                item[0].get("locationid", ""),
+                item[0].get("datatypeid", ""),
+                item[0].get("startdate", ""),
+                int(item[0].get("offset", 1)),
+            )
+        )
+        for params, key in selected:
+            try:
+                yield params, self.read(key)
+            except FileNotFoundError:
+                continue
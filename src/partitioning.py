@@ -0,0 +1,137 @@
+""" 
+    This file contains the partition key strategies used to spread the
+    producer's records across the shards of the Kinesis stream
+"""
+
+# required imports
+import hashlib
+import logging
+
+from src.constants import DEFAULT_SALT_BUCKETS
+
+# configure logging
+logger = logging.getLogger()
+
+PARTITION_STRATEGIES = ["station", "station-salted", "datatype-date", "explicit-hash"]
+
+
+def hash_key(key):
+    """
+    The 128 bit hash Kinesis uses to map a partition key to a shard
+    """
+    return int(hashlib.md5(key.encode("utf-8")).hexdigest(), 16)
+
+
+def load_shard_map(kinesis_client, stream_name):
+    """
+    List the open shards of the stream with their hash key ranges, ordered by
+    starting hash key
+    """
+    shards = []
+    kwargs = {"StreamName": stream_name}
+    while True:
+        response = kinesis_client.list_shards(**kwargs)
+        for shard in response["Shards"]:
+            # closed shards, left behind by resharding, take no new records
+            if "EndingSequenceNumber" in shard.get("SequenceNumberRange", {}):
+                continue
+            shards.append(
+                {
+                    "ShardId": shard["ShardId"],
+                    "start": int(shard["HashKeyRange"]["StartingHashKey"]),
+                    "end": int(shard["HashKeyRange"]["EndingHashKey"]),
+                }
+            )
+        if "NextToken" not in response:
+            break
+        kwargs = {"NextToken": response["NextToken"]}
+
+    shards.sort(key=lambda shard: shard["start"])
+    logger.info(f"Loaded {len(shards)} open shards of {stream_name}")
+    return shards
+
+
+def shard_for_entry(entry, shards):
+    """
+    The id of the shard a PutRecords entry is written to
+    """
+    if "ExplicitHashKey" in entry:
+        value = int(entry["ExplicitHashKey"])
+    else:
+        value = hash_key(entry["PartitionKey"])
+    for shard in shards:
+        if shard["start"] <= value <= shard["end"]:
+            return shard["ShardId"]
+    return None
+
+
+class Partitioner:
+    """
+    This class picks the partition key, and optionally the explicit hash key, of
+    each Kinesis record. Keys are derived from the record only, so replays of an
+    observation always land on the same shard.
+
+    - station: every record of a station goes to one shard (per-station order)
+    - station-salted: a station is spread over salt_buckets keys by date
+    - datatype-date: one key per datatype and day
+    - explicit-hash: records are spread evenly over the open shards of the
+      stream by setting ExplicitHashKey to the middle of a shard's range
+    """
+
+    def __init__(
+        self, strategy="station", salt_buckets=DEFAULT_SALT_BUCKETS, shards=None
+    ):
+        """
+        Initialize the partitioner. The explicit-hash strategy needs the shard
+        map from load_shard_map.
+        """
+        if strategy not in PARTITION_STRATEGIES:
+            raise ValueError(
+                f"Unknown partition strategy {strategy}, "
+                f"expected one of {PARTITION_STRATEGIES}"
+            )
+        if strategy == "explicit-hash" and not shards:
+            raise ValueError("The explicit-hash strategy requires the shard map")
+
+        self.strategy = strategy
+        self.salt_buckets = salt_buckets
+        self.hash_keys = [
+            str((shard["start"] + shard["end"]) // 2) for shard in shards or []
+        ]
+
+    def keys(self, record):
+        """
+        Return the PartitionKey (and ExplicitHashKey) entry fields of the record
+        """
+        station = record["station"]
+        date = record["date"][:10]
+
+        if self.strategy == "station":
+            return {"PartitionKey": station}
+        if self.strategy == "station-salted":
+            bucket = hash_key(date) % self.salt_buckets
+            return {"PartitionKey": f"{station}#{bucket}"}
+        if self.strategy == "datatype-date":
+            return {"PartitionKey": f"{record['datatype']}#{date}"}
+
+        # explicit-hash: the observation identity picks the shard
+        index = hash_key(f"{station}#{record['datatype']}#{date}") % len(self.hash_keys)
+        return {"PartitionKey": station, "ExplicitHashKey": self.hash_keys[index]}
+
+
+def summarize_distribution(distribution):
+    """
+    Summarize a {shard id: {"records", "bytes"}} distribution: the share of the
+    busiest shard and its skew, the ratio of its records to the mean
+    """
+    total = sum(counts["records"] for counts in distribution.values())
+    if not total:
+        return {"shards": len(distribution), "max_share": 0.0, "skew": 0.0}
+
+    busiest = max(counts["records"] for counts in distribution.values())
+    mean = total / len(distribution)
+    return {
+        "shards": len(distribution),
+        "max_share": busiest / total,
+        "skew": busiest / mean,
+    }
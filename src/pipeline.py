@@ -0,0 +1,251 @@
+""" 
+    This file contains the streaming pipeline stages used by the producer.
+    Pages flow through fetch -> parse -> enrich -> serialize -> batch -> publish
+    as dicts, each stage adding what it produces and dropping what later stages
+    no longer need, so memory stays bounded by the queue sizes.
+"""
+
+# required imports
+import time
+import queue
+import itertools
+import threading
+import logging
+from collections import deque
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+from src.metrics import metrics
+from src.constants import (
+    KINESIS_MAX_BATCH_RECORDS,
+    KINESIS_MAX_BATCH_BYTES,
+    PIPELINE_QUEUE_SIZE,
+)
+
+# configure logging
+logger = logging.getLogger()
+
+
+class StageTimer:
+    """
+    This class accumulates the time spent and items handled by each stage
+    """
+
+    def __init__(self):
+        """
+        Initialize empty totals
+        """
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def add(self, stage, seconds, items=1):
+        """
+        Add the time and item count of one stage call, also recorded in the
+        pipeline_stage_seconds histogram
+        """
+        metrics.histogram(
+            "pipeline_stage_seconds", "Latency of one call of each producer stage"
+        ).observe(seconds, stage=stage)
+        with self.lock:
+            total = self.totals.setdefault(stage, {"seconds": 0.0, "items": 0})
+            total["seconds"] += seconds
+            total["items"] += items
+
+    @contextmanager
+    def time(self, stage, items=1):
+        """
+        Time the body of the with block as one call of the stage
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(stage, time.perf_counter() - start, items)
+
+    def report(self):
+        """
+        Return a copy of the totals per stage
+        """
+        with self.lock:
+            return {stage: dict(total) for stage, total in self.totals.items()}
+
+
+def buffered(iterable, maxsize=PIPELINE_QUEUE_SIZE):
+    """
+    Run the upstream stage in its own thread, handing its items over through a
+    bounded queue. Errors upstream are raised downstream, and closing the
+    downstream generator stops the upstream thread.
+    """
+    items = queue.Queue(maxsize)
+    stop = threading.Event()
+    done = object()
+
+    def put(item):
+        # give up when the consumer has gone away
+        while not stop.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run():
+        error = None
+        try:
+            for item in iterable:
+                if not put((item, None)):
+                    return
+        except BaseException as e:
+            error = e
+        finally:
+            close = getattr(iterable, "close", None)
+            if close is not None:
+                close()
+        put((done, error))
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item, error = items.get()
+            if item is done:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def fetch_pages(fetch, limit, start, max_workers, timer):
+    """
+    Yield {"offset", "response"} for every page of a query in offset order.
+    fetch(offset) returns the HTTP response, or None if the page could not be
+    fetched. The first page is fetched alone to read the result count, the
+    remaining pages are fetched by a bounded worker pool ahead of the consumer.
+    """
+
+    def timed_fetch(offset):
+        with timer.time("fetch"):
+            return fetch(offset)
+
+    response = timed_fetch(start)
+    if response is None:
+        yield {"offset": start, "response": None}
+        return
+
+    # only the count is needed here, the parse stage parses the body again
+    count = response.json().get("metadata", {}).get("resultset", {}).get("count", 0)
+    yield {"offset": start, "response": response}
+
+    offsets = iter(range(start + limit, count + 1, limit))
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = deque()
+
+    def submit(offset):
+        pending.append((offset, executor.submit(timed_fetch, offset)))
+
+    try:
+        # keep a bounded number of pages in flight ahead of the consumer
+        for offset in itertools.islice(offsets, max_workers * 2):
+            submit(offset)
+
+        while pending:
+            offset, future = pending.popleft()
+            next_offset = next(offsets, None)
+            if next_offset is not None:
+                submit(next_offset)
+            yield {"offset": offset, "response": future.result()}
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def parse_pages(pages, timer):
+    """
+    Parse the response of each page into its raw results. Pages that could not
+    be fetched are marked as missing.
+    """
+    for page in pages:
+        response = page.pop("response")
+        page["missing"] = response is None
+        if response is None:
+            page["results"] = []
+        else:
+            with timer.time("parse"):
+                page["results"] = response.json().get("results", [])
+        yield page
+
+
+def enrich_records(pages, enrich, timer):
+    """
+    Turn the raw results of each page into a RecordBatch with enrich(results)
+    """
+    for page in pages:
+        results = page.pop("results")
+        with timer.time("enrich", len(results)):
+            page["records"] = enrich(results)
+        yield page
+
+
+def serialize_records(pages, serialize, timer):
+    """
+    Turn the RecordBatch of each page into PutRecords entries with
+    serialize(records), keeping the record count and the latest date per
+    datatype for progress tracking
+    """
+    for page in pages:
+        records = page.pop("records")
+        with timer.time("serialize", len(records)):
+            page["entries"] = serialize(records)
+            latest_dates = records.latest_dates()
+        page["records"] = len(records)
+        page["latest_dates"] = latest_dates
+        yield page
+
+
+def batch_entries(
+    pages, max_records=KINESIS_MAX_BATCH_RECORDS, max_bytes=KINESIS_MAX_BATCH_BYTES
+):
+    """
+    Pack the entries of consecutive pages into PutRecords batches within the
+    record and byte limits. Each batch lists the pages whose last entry it
+    holds, so once it is published those pages are fully in the stream.
+    """
+    batch = []
+    batch_size = 0
+    completed = []
+
+    for page in pages:
+        for entry in page.pop("entries"):
+            entry_size = len(entry["Data"]) + len(entry["PartitionKey"])
+
+            # flush the batch if the entry would exceed the PutRecords limits
+            if batch and (
+                len(batch) >= max_records or batch_size + entry_size > max_bytes
+            ):
+                yield {"entries": batch, "pages": completed}
+                batch = []
+                batch_size = 0
+                completed = []
+
+            batch.append(entry)
+            batch_size += entry_size
+        completed.append(page)
+
+    if batch or completed:
+        yield {"entries": batch, "pages": completed}
+
+
+def publish_batches(batches, send, timer):
+    """
+    Publish each batch with send(entries), which returns the highest sequence
+    number per shard, and yield the pages it completed with those numbers
+    """
+    for batch in batches:
+        sequence_numbers = {}
+        if batch["entries"]:
+            with timer.time("publish", len(batch["entries"])):
+                sequence_numbers = send(batch["entries"])
+        yield {"pages": batch["pages"], "sequence_numbers": sequence_numbers}
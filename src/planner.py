@@ -0,0 +1,85 @@
+""" 
+    This file contains the query planner that splits large backfills into
+    independent sub-queries
+"""
+
+# required imports
+import datetime
+import logging
+
+from src.constants import NOAA_MAX_QUERY_DAYS
+
+# configure logging
+logger = logging.getLogger()
+
+SHARD_BY_OPTIONS = ["none", "month", "datatype", "month+datatype"]
+
+
+def split_by_span(start, end, max_days=NOAA_MAX_QUERY_DAYS):
+    """
+    Split the inclusive date range into windows of at most max_days days
+    """
+    windows = []
+    while start <= end:
+        window_end = min(start + datetime.timedelta(days=max_days - 1), end)
+        windows.append((start, window_end))
+        start = window_end + datetime.timedelta(days=1)
+    return windows
+
+
+def split_by_month(start, end):
+    """
+    Split the inclusive date range into calendar month windows
+    """
+    windows = []
+    while start <= end:
+        # first day of the following month
+        next_month = (start.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+        window_end = min(next_month - datetime.timedelta(days=1), end)
+        windows.append((start, window_end))
+        start = next_month
+    return windows
+
+
+def plan_queries(start_date, end_date, data_types, shard_by="none"):
+    """
+    Plan the sub-queries for a backfill. Every sub-query is a dict with the
+    startdate, enddate and datatypeid params and can be run on its own. Ranges
+    longer than NOAA allows are always split, whatever shard_by is.
+    """
+    if shard_by not in SHARD_BY_OPTIONS:
+        raise ValueError(
+            f"Unknown shard_by {shard_by}, expected one of {SHARD_BY_OPTIONS}"
+        )
+
+    start = datetime.date.fromisoformat(start_date)
+    end = datetime.date.fromisoformat(end_date)
+    if start > end:
+        raise ValueError(f"Start date {start_date} is after end date {end_date}")
+
+    # split the date range
+    if "month" in shard_by:
+        windows = split_by_month(start, end)
+    else:
+        windows = split_by_span(start, end)
+
+    # split the data types
+    if "datatype" in shard_by:
+        type_groups = [[data_type] for data_type in data_types]
+    else:
+        type_groups = [list(data_types)]
+
+    queries = [
+        {
+            "startdate": window_start.isoformat(),
+            "enddate": window_end.isoformat(),
+            "datatypeid": ",".join(types),
+        }
+        for window_start, window_end in windows
+        for types in type_groups
+    ]
+    logger.info(
+        f"Planned {len(queries)} queries for {start_date} to {end_date} "
+        f"(shard by {shard_by})"
+    )
+    return queries
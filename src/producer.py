@@ -4,81 +4,215 @@
 
 # required imports
 import json
+import argparse
+import contextlib
 import boto3
-import requests
 import os
+import time
+import threading
 import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
 from src.constants import (
-    API_KEY,
     DATA_URL,
     STATION_URL,
     AWS_REGION,
     STREAM_NAME,
+    KINESIS_MAX_PUT_ATTEMPTS,
+    DEFAULT_FETCH_WORKERS,
+    NOAA_PAGE_LIMIT,
+    DEFAULT_SHARD_PARALLELISM,
+    CHECKPOINT_PATH,
+    HIGH_WATER_MARK_PATH,
+    LOG_LEVEL,
+    DEFAULT_CODEC,
+    COMPRESS_RECORDS,
+    BACKEND,
+    METRICS_PORT,
+    DEFAULT_PARTITION_STRATEGY,
+    DEFAULT_SALT_BUCKETS,
+    ASYNC_FETCH_CONCURRENCY,
+    ASYNC_PUBLISH_CONCURRENCY,
+    LOCATION_IDS,
+    DEFAULT_LOCATION_PROCESSES,
+    PAGE_CACHE_PATH,
 )
+from src.planner import plan_queries, SHARD_BY_OPTIONS
+from src.checkpoint import CheckpointStore, HighWaterMarkStore
+from src.pipeline import (
+    StageTimer,
+    buffered,
+    fetch_pages,
+    parse_pages,
+    enrich_records,
+    serialize_records,
+    batch_entries,
+    publish_batches,
+)
+from src.codec import CODECS, check_codec, encode_records
+from src.record_batch import RecordBatch, encode_batch
+from src.partitioning import (
+    PARTITION_STRATEGIES,
+    Partitioner,
+    load_shard_map,
+    shard_for_entry,
+    summarize_distribution,
+)
+from src.noaa_client import get_client
+from src.page_cache import PageCache, CachedResponse, normalize_params
+from src.backends import get_local_stream
+from src.metrics import metrics, profile, start_metrics_server
+from src.station_store import get_station_store
 
 # configure logging
 logger = logging.getLogger()
 
 
+class PublishError(Exception):
+    """
+    Raised when records could not be published to the kinesis stream. entries
+    holds the PutRecords entries that were given up on.
+    """
+
+    def __init__(self, message, entries=()):
+        """
+        Initialize the error with the entries that were not published
+        """
+        super().__init__(message)
+        self.entries = list(entries)
+
+
+def put_backoff(attempt):
+    """
+    Delay before retrying the failed entries of a PutRecords call
+    """
+    return min(0.1 * 2**attempt, 5)
+
+
 class Producer:
     """
     This class is responsible for producing the data
     """
 
-    def __init__(self, data_types, start_date, end_date, station_name_flag, stations):
+    def __init__(
+        self,
+        data_types,
+        start_date,
+        end_date,
+        station_name_flag,
+        stations,
+        max_workers=DEFAULT_FETCH_WORKERS,
+        shard_by="none",
+        shard_parallelism=DEFAULT_SHARD_PARALLELISM,
+        checkpoint=None,
+        resume=False,
+        location_id=LOCATION_IDS[0],
+        progress_callback=None,
+        codec=DEFAULT_CODEC,
+        compress=COMPRESS_RECORDS,
+        partition_by=DEFAULT_PARTITION_STRATEGY,
+        salt_buckets=DEFAULT_SALT_BUCKETS,
+        dry_run=False,
+        page_size=NOAA_PAGE_LIMIT,
+        cache=None,
+        replay=False,
+    ):
         """
-        Initialize the producer class
+        Initialize the producer class. With a PageCache, fetched pages are
+        served from and added to the cache; replay re-publishes the cached
+        pages of the query without calling NOAA.
         """
+        if replay and cache is None:
+            raise ValueError("Replaying needs a page cache")
+        check_codec(codec)
 
         logger.info("Initializing Producer")
 
-        # initialize kinesis client
-        self.kinesis_client = boto3.client(
-            "kinesis",
-            region_name=AWS_REGION,
-            aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
-            aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
-        )
+        # initialize kinesis client, or the in-process stream for local runs
+        if BACKEND == "local":
+            self.kinesis_client = get_local_stream()
+        else:
+            self.kinesis_client = boto3.client(
+                "kinesis",
+                region_name=AWS_REGION,
+                aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+                aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+            )
 
         # initialize class variables
         self.station_name_flag = station_name_flag
         self.station_cache = {v: k for k, v in stations.items()}
-        self.headers = {"token": API_KEY}
+        self.client = get_client()
+        self.data_url = DATA_URL
         self.data_types = data_types
+        self.max_workers = max_workers
+        self.shard_by = shard_by
+        self.shard_parallelism = shard_parallelism
+        self.checkpoint = checkpoint
+        self.resume = resume
+        self.codec = codec
+        self.compress = compress
+        self.dry_run = dry_run
+        self.cache = cache
+        self.replay = replay
+
+        # the shard map is only needed to spread explicit hash keys or to report
+        # the shard distribution of a dry run
+        self.shards = None
+        if partition_by == "explicit-hash" or dry_run:
+            self.shards = load_shard_map(self.kinesis_client, STREAM_NAME)
+        self.partitioner = Partitioner(partition_by, salt_buckets, self.shards)
+        self.distribution = {}
         self.params = {
             "datasetid": "GHCND",
             "startdate": start_date,
             "enddate": end_date,
-            "locationid": "FIPS:24",
+            "locationid": location_id,
             "datatypeid": ",".join(self.data_types),
-            "limit": 1000,
+            "limit": page_size,
             "offset": 1,
             "units": "metric",
         }
+        self.batch_stats = []
+        self.observations = 0
+        self.missing_pages = 0
+        self.latest_dates = {}
+        self.elapsed = 0.0
+        self.progress_callback = progress_callback
+        self.lock = threading.Lock()
+        self.timer = StageTimer()
         logger.info("Producer initialized")
 
     def get_station(self, station_id):
         """
-        Get the station information from the station url (deprecated, using st cache now. Find in visualization.py)
+        Get the station name from the cache, the shared station store or, as a
+        last resort, the station url
         """
-        logger.info(f"Getting station {station_id}")
+        logger.debug(f"Getting station {station_id}")
 
         # check if station is in cache
         if station_id in self.station_cache:
-            logger.info(f"Station {station_id} found in cache")
+            logger.debug(f"Station {station_id} found in cache")
             return self.station_cache[station_id]
 
+        # check if station is in the shared station store
+        store = get_station_store()
+        name = store.get_station_name(station_id)
+        if name is not None:
+            logger.debug(f"Station {station_id} found in station store")
+            self.station_cache[station_id] = name
+            return name
+
         # get station from NOAA
-        station = requests.get(
-            f"{STATION_URL}/{station_id}", headers=self.headers, timeout=15
-        )
+        station = self.client.get(f"{STATION_URL}/{station_id}", timeout=15)
 
         # check if station is found
         if station.status_code == 200:
-            logger.info(f"Station {station_id} found in NOAA")
+            logger.debug(f"Station {station_id} found in NOAA")
             station_data = station.json()
             self.station_cache[station_id] = station_data.get("name", "")
+            store.add_station(station_id, station_data.get("name", ""))
             return station_data.get("name", "")
 
         logger.error(
@@ -93,54 +227,117 @@ class Producer:
         """
         Get the data from the data url
         """
+        response = self.fetch_response(limit, offset)
+        if response is None:
+            return []
 
-        logger.info(f"Getting data with limit {limit} and offset {offset}")
+        # format the data
+        results = response.json().get("results", [])
+        return RecordBatch.from_rows(
+            results, self.station_namer(station_name_flag, stations)
+        ).to_records()
 
-        # set limit and offset
-        self.params["limit"] = limit
-        self.params["offset"] = offset
+    def fetch_response(self, limit, offset, query=None):
+        """
+        Fetch one page from the data url and return the response, or None if it
+        could not be fetched. query overrides the base params for a
+        planned sub-query. Safe to call from several threads at once.
+        """
+
+        logger.debug(f"Getting data with limit {limit} and offset {offset}")
+
+        # set limit and offset on a copy so concurrent fetches don't interfere
+        params = dict(self.params, **(query or {}), limit=limit, offset=offset)
+
+        # serve the page from the cache, if it was fetched before
+        if self.cache is not None:
+            page = self.cache.get(params)
+            if page is not None:
+                logger.debug(
+                    f"Data found in cache with limit {limit} and offset {offset}"
+                )
+                return CachedResponse(page)
 
         # get data from NOAA
-        data = requests.get(
-            DATA_URL, headers=self.headers, params=self.params, timeout=90
-        )
+        data = self.client.get(self.data_url, params=params, timeout=90)
 
         # check if data is found
         if data.status_code == 200:
-            data = data.json()
-            logger.info(f"Data found with limit {limit} and offset {offset}")
-            results = data.get("results", [])
-            count = data.get("metadata", {}).get("resultset", {}).get("count", 0)
-            logger.info(f"Data found with count {count}")
-            clean_results = []
-
-            # format the data
-            for record in results:
-                formatted_record = {
-                    "date": record["date"],
-                    "datatype": record["datatype"],
-                    "station": record["station"],
-                    "value": record["value"],
-                }
-                if station_name_flag:
-                    station_name = self.get_station(formatted_record["station"])
-                    formatted_record["station_name"] = station_name
-                formatted_record["station_name"] = (
-                    stations[formatted_record["station"]]
-                    if formatted_record["station"] in stations
-                    else "Unknown"
-                )
-                clean_results.append(formatted_record)
-
-            # return the data
-            return clean_results
+            logger.debug(f"Data found with limit {limit} and offset {offset}")
+            if self.cache is not None:
+                page = data.json()
+                self.cache.put(params, page)
+                return CachedResponse(page)
+            return data
 
         logger.error(
             f"Data not found with limit {limit} and offset {offset}, error: {data.status_code}"
         )
 
-        # if data not found, return empty list
-        return []
+        # if data not found, return None
+        return None
+
+    def station_namer(self, station_name_flag, stations):
+        """
+        Function naming a station id. Stations missing from the stations
+        mapping are looked up only if station_name_flag is set.
+        """
+
+        def station_name(station_id):
+            name = stations.get(station_id)
+            if name is None:
+                name = self.get_station(station_id) if station_name_flag else "Unknown"
+            return name
+
+        return station_name
+
+    def enrich_page(self, results):
+        """
+        Turn the raw NOAA results of a page into a RecordBatch, naming each
+        distinct station once
+        """
+        return RecordBatch.from_rows(
+            results, self.station_namer(self.station_name_flag, self.station_cache)
+        )
+
+    def serialize_records(self, records):
+        """
+        Turn records, a RecordBatch or a list of dicts, into PutRecords entries
+        with the configured codec and partitioning. The columnar codec packs
+        the observations of a station into one entry, keyed by its first
+        observation.
+        """
+        encode = encode_batch if isinstance(records, RecordBatch) else encode_records
+        return [
+            {"Data": payload, **keys}
+            for payload, keys, _ in encode(
+                records, self.codec, self.compress, self.partitioner.keys
+            )
+        ]
+
+    def iter_pages(self, limit, query=None, start=1):
+        """
+        Yield (offset, records) for every page of the query in offset order,
+        beginning at the start offset. Runs the fetch, parse and enrich stages of
+        the pipeline, so later pages are fetched while the caller is busy.
+        """
+        for page in self.enriched_pages(limit, query, start):
+            yield page["offset"], page["records"].to_records()
+
+    def enriched_pages(self, limit, query=None, start=1):
+        """
+        The fetch -> parse -> enrich stages of the pipeline for one query. Pages
+        are handed to the parser through a bounded queue.
+        """
+        pages = fetch_pages(
+            lambda offset: self.fetch_response(limit, offset, query),
+            limit,
+            start,
+            self.max_workers,
+            self.timer,
+        )
+        pages = parse_pages(buffered(pages), self.timer)
+        return enrich_records(pages, self.enrich_page, self.timer)
 
     def put_record(self, record):
         """
@@ -154,33 +351,656 @@ class Producer:
             PartitionKey=record["station"],
         )
 
+    def put_records(self, records):
+        """
+        Put the records in the kinesis stream using batched PutRecords calls.
+        Returns the highest sequence number written to each shard.
+        """
+        pages = [{"entries": self.serialize_records(records)}]
+
+        sequence_numbers = {}
+        for published in publish_batches(
+            batch_entries(pages), self.send_batch, self.timer
+        ):
+            sequence_numbers.update(published["sequence_numbers"])
+        return sequence_numbers
+
+    def send_batch(self, entries):
+        """
+        Send one PutRecords batch, retrying only the entries that failed.
+        Returns the highest sequence number written to each shard. A dry run
+        only records which shard each entry would be written to.
+        """
+        if self.dry_run:
+            self.track_distribution(entries)
+            return {}
+
+        start = time.perf_counter()
+        total = len(entries)
+        total_bytes = sum(len(entry["Data"]) for entry in entries)
+        sequence_numbers = {}
+
+        for attempt in range(1, KINESIS_MAX_PUT_ATTEMPTS + 1):
+            with metrics.histogram(
+                "kinesis_put_records_seconds", "Latency of Kinesis PutRecords calls"
+            ).time():
+                response = self.kinesis_client.put_records(
+                    StreamName=STREAM_NAME, Records=entries
+                )
+            entries = self.handle_put_response(entries, response, sequence_numbers)
+            if not entries:
+                break
+
+            logger.warning(
+                f"{len(entries)} of {total} records failed on attempt {attempt}, retrying"
+            )
+            if attempt < KINESIS_MAX_PUT_ATTEMPTS:
+                time.sleep(put_backoff(attempt))
+
+        self.record_batch(total, total_bytes, attempt, entries, start)
+        return sequence_numbers
+
+    def handle_put_response(self, entries, response, sequence_numbers):
+        """
+        Count the outcome of a PutRecords call, collect the sequence numbers of
+        the written entries and return the entries that failed
+        """
+        failed = response.get("FailedRecordCount", 0)
+        published = metrics.counter(
+            "kinesis_records_total", "Kinesis records by PutRecords result"
+        )
+        published.inc(len(entries) - failed, result="published")
+        published.inc(failed, result="failed")
+
+        # sequence numbers increase within a shard, so the last one wins
+        for result in response["Records"]:
+            if "SequenceNumber" in result:
+                sequence_numbers[result["ShardId"]] = result["SequenceNumber"]
+
+        if not failed:
+            return []
+
+        # keep only the entries that failed in this response
+        return [
+            entry
+            for entry, result in zip(entries, response["Records"])
+            if "ErrorCode" in result
+        ]
+
+    def record_batch(self, total, total_bytes, attempts, failed_entries, start):
+        """
+        Add the stats of a published batch, raising PublishError if some of its
+        entries could not be published. The error stops the query before the
+        checkpoint of the batch's pages advances, so a resumed run publishes
+        them again.
+        """
+        failed = len(failed_entries)
+        latency = time.perf_counter() - start
+        with self.lock:
+            self.batch_stats.append(
+                {
+                    "records": total,
+                    "bytes": total_bytes,
+                    "attempts": attempts,
+                    "failed": failed,
+                    "latency": latency,
+                }
+            )
+        logger.debug(
+            f"Published batch of {total} records in {latency:.3f}s "
+            f"({attempts} attempts, {failed} failed)"
+        )
+
+        if failed:
+            raise PublishError(
+                f"{failed} records could not be published after {attempts} attempts",
+                failed_entries,
+            )
+
+    def track_distribution(self, entries):
+        """
+        Count the records and bytes each shard would receive
+        """
+        with self.lock:
+            for entry in entries:
+                shard_id = shard_for_entry(entry, self.shards)
+                counts = self.distribution.setdefault(
+                    shard_id, {"records": 0, "bytes": 0}
+                )
+                counts["records"] += 1
+                counts["bytes"] += len(entry["Data"])
+
+    def shard_report(self):
+        """
+        Per-shard distribution of a dry run, including shards that received
+        nothing, with its summary
+        """
+        distribution = {
+            shard["ShardId"]: self.distribution.get(
+                shard["ShardId"], {"records": 0, "bytes": 0}
+            )
+            for shard in self.shards or []
+        }
+        return {
+            "shards": distribution,
+            "summary": summarize_distribution(distribution),
+        }
+
+    def track_latest_dates(self, latest_dates):
+        """
+        Remember the latest observation date published for each datatype
+        """
+        with self.lock:
+            for data_type, date in latest_dates.items():
+                if date > self.latest_dates.get(data_type, ""):
+                    self.latest_dates[data_type] = date
+
+    def report_progress(self, pages=0, records=0, errors=0):
+        """
+        Pass page level progress to the progress callback, if any
+        """
+        if self.progress_callback is not None:
+            self.progress_callback(pages=pages, records=records, errors=errors)
+
+    def produce_query(self, query):
+        """
+        Produce the data for a single planned sub-query
+        """
+        logger.info(
+            f"Producing {query['datatypeid']} from {query['startdate']} "
+            f"to {query['enddate']}"
+        )
+        limit = self.params["limit"]
+        start = 1
+        params = dict(self.params, **query)
+
+        # continue after the last fully published page of a previous run
+        if self.checkpoint is not None and self.resume:
+            checkpoint = self.checkpoint.get(params)
+            if checkpoint and checkpoint["complete"]:
+                logger.info("Query already produced, skipping")
+                return
+            if checkpoint:
+                start = checkpoint["offset"] + checkpoint["limit"]
+                logger.info(f"Resuming query from offset {start}")
+
+        last_offset = start - limit
+        missing_pages = False
+
+        # fetch -> parse -> enrich -> serialize -> batch -> publish, with bounded
+        # queues so later pages are fetched while earlier ones are published
+        pages = serialize_records(
+            self.enriched_pages(limit, query, start), self.serialize_records, self.timer
+        )
+        batches = batch_entries(buffered(pages))
+
+        for published in publish_batches(batches, self.send_batch, self.timer):
+            for page in published["pages"]:
+                if page["missing"]:
+                    logger.error(
+                        f"No data found at offset {page['offset']}, skipping page"
+                    )
+                    missing_pages = True
+                    with self.lock:
+                        self.missing_pages += 1
+                    self.report_progress(errors=1)
+                    continue
+
+                self.track_latest_dates(page["latest_dates"])
+                with self.lock:
+                    self.observations += page["records"]
+                self.report_progress(pages=1, records=page["records"])
+
+                # the checkpoint only advances while every earlier page is published
+                if self.checkpoint is not None and not missing_pages:
+                    last_offset = page["offset"]
+                    self.checkpoint.update(
+                        params,
+                        page["offset"],
+                        limit,
+                        published["sequence_numbers"],
+                    )
+
+        if self.checkpoint is not None and not missing_pages:
+            self.checkpoint.update(params, last_offset, limit, complete=True)
+
+    def cached_pages(self):
+        """
+        Yield the cached pages overlapping the query as enriched pipeline pages,
+        keeping only the records within its date range and datatypes. Pages
+        cached by runs with other sub-queries or page sizes are replayed as well,
+        so an observation held by several pages is only published once.
+        """
+        query = normalize_params(self.params)
+        start = self.params["startdate"][:10]
+        end = self.params["enddate"][:10]
+        data_types = set(self.data_types)
+
+        def match(params):
+            return (
+                all(
+                    params.get(name) == query.get(name)
+                    for name in ("datasetid", "locationid", "units")
+                )
+                and params.get("startdate", "")[:10] <= end
+                and params.get("enddate", "")[:10] >= start
+                and bool(data_types & set(params.get("datatypeid", "").split(",")))
+            )
+
+        seen = set()
+        for params, page in self.cache.pages(match):
+            results = []
+            for result in page.get("results", []):
+                key = (result.get("station"), result["date"], result["datatype"])
+                if key not in seen:
+                    seen.add(key)
+                    results.append(result)
+            with self.timer.time("enrich", len(results)):
+                records = self.enrich_page(results)
+                records = records.take(records.mask(data_types, start, end))
+            yield {
+                "offset": int(params["offset"]),
+                "missing": False,
+                "records": records,
+            }
+
+    def produce_from_cache(self):
+        """
+        Re-publish the cached pages of the query without calling NOAA. Batches
+        are published by max_workers threads at once, so the stream is the only
+        limit. Checkpoints are left untouched.
+        """
+        pages = serialize_records(
+            self.cached_pages(), self.serialize_records, self.timer
+        )
+        batches = batch_entries(buffered(pages))
+
+        def send(entries):
+            with self.timer.time("publish", len(entries)):
+                return self.send_batch(entries)
+
+        def complete(batch, future):
+            if future is not None:
+                future.result()
+            for page in batch["pages"]:
+                self.track_latest_dates(page["latest_dates"])
+                with self.lock:
+                    self.observations += page["records"]
+                self.report_progress(pages=1, records=page["records"])
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = deque()
+            for batch in batches:
+                future = (
+                    executor.submit(send, batch["entries"])
+                    if batch["entries"]
+                    else None
+                )
+                pending.append((batch, future))
+                # keep a bounded number of batches in flight
+                while len(pending) > self.max_workers * 2:
+                    complete(*pending.popleft())
+            while pending:
+                complete(*pending.popleft())
+
     def produce(self):
         """
         Produce the data
         """
         logger.info("Producing data")
-        limit = 1000
-        offset = 1
-
-        while True:
-            # get the data
-            data = self.get_data(
-                limit, offset, self.station_name_flag, self.station_cache
+        start = time.perf_counter()
+
+        if self.replay:
+            self.produce_from_cache()
+        else:
+            # split the date range into sub-queries that fit the API limits
+            queries = plan_queries(
+                self.params["startdate"],
+                self.params["enddate"],
+                self.data_types,
+                self.shard_by,
             )
-            if not data:
-                logger.info("No data found, exiting")
-                break
 
-            # put the data in the stream
-            for record in data:
-                self.put_record(record)
+            # run the sub-queries as independent work units
+            with ThreadPoolExecutor(max_workers=self.shard_parallelism) as executor:
+                for _ in executor.map(self.produce_query, queries):
+                    pass
 
-            # update the offset
-            offset += limit
+        self.elapsed = time.perf_counter() - start
+        failed = sum(stats["failed"] for stats in self.batch_stats)
+        logger.info(
+            f"Data produced in {len(self.batch_stats)} batches, {failed} records failed"
+        )
+
+    def stats(self):
+        """
+        Summarize the throughput of the last produce run
+        """
+        records = sum(stats["records"] for stats in self.batch_stats)
+        return {
+            "records": records,
+            "observations": self.observations,
+            "missing_pages": self.missing_pages,
+            "bytes": sum(stats["bytes"] for stats in self.batch_stats),
+            "batches": len(self.batch_stats),
+            "failed_records": sum(stats["failed"] for stats in self.batch_stats),
+            "publish_seconds": sum(stats["latency"] for stats in self.batch_stats),
+            "seconds": self.elapsed,
+            "records_per_second": records / self.elapsed if self.elapsed else 0.0,
+            "observations_per_second": (
+                self.observations / self.elapsed if self.elapsed else 0.0
+            ),
+            **{
+                f"{stage}_seconds": total["seconds"]
+                for stage, total in self.timer.report().items()
+            },
+        }
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments of the headless producer
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.producer",
+        description="Fetch NOAA GHCND data and publish it to the Kinesis stream",
+    )
+    parser.add_argument(
+        "--data-types",
+        nargs="+",
+        default=["TOBS", "PRCP", "SNOW", "TMAX", "TMIN"],
+        help="datatypes to fetch",
+    )
+    parser.add_argument("--start-date", help="first day to fetch (YYYY-MM-DD)")
+    parser.add_argument("--end-date", help="last day to fetch (YYYY-MM-DD)")
+    parser.add_argument(
+        "--locations",
+        "--location",
+        nargs="+",
+        default=LOCATION_IDS,
+        help="NOAA location ids, produced in parallel when there are several",
+    )
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=DEFAULT_LOCATION_PROCESSES,
+        help="locations produced in parallel, one process each",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=DEFAULT_FETCH_WORKERS,
+        help="concurrent page fetches per sub-query",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=["threads", "async"],
+        default="threads",
+        help="run the fetches and publishes on worker threads or an asyncio loop",
+    )
+    parser.add_argument(
+        "--fetch-concurrency",
+        type=int,
+        default=ASYNC_FETCH_CONCURRENCY,
+        help="NOAA requests in flight with the async engine",
+    )
+    parser.add_argument(
+        "--publish-concurrency",
+        type=int,
+        default=ASYNC_PUBLISH_CONCURRENCY,
+        help="PutRecords calls in flight with the async engine",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=NOAA_PAGE_LIMIT,
+        help="results per NOAA page, at most 1000",
+    )
+    parser.add_argument(
+        "--parallelism",
+        type=int,
+        default=DEFAULT_SHARD_PARALLELISM,
+        help="sub-queries run in parallel",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_BY_OPTIONS,
+        default="none",
+        help="how to split the date range into sub-queries",
+    )
+    parser.add_argument(
+        "--checkpoint", default=CHECKPOINT_PATH, help="checkpoint file path"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="continue the previous run"
+    )
+    parser.add_argument(
+        "--codec",
+        choices=CODECS,
+        default=DEFAULT_CODEC,
+        help="encoding of the Kinesis records",
+    )
+    parser.add_argument(
+        "--compress",
+        action="store_true",
+        default=COMPRESS_RECORDS,
+        help="zlib compress the Kinesis records",
+    )
+    parser.add_argument(
+        "--partition-by",
+        choices=PARTITION_STRATEGIES,
+        default=DEFAULT_PARTITION_STRATEGY,
+        help="how records are spread across the shards of the stream",
+    )
+    parser.add_argument(
+        "--salt-buckets",
+        type=int,
+        default=DEFAULT_SALT_BUCKETS,
+        help="keys per station for the station-salted strategy",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="fetch and encode without publishing, and report the shard distribution",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=METRICS_PORT,
+        help="serve Prometheus metrics on this port while producing",
+    )
+    parser.add_argument(
+        "--profile", help="sample the stacks while producing and write them here"
+    )
+    parser.add_argument(
+        "--cache",
+        default=PAGE_CACHE_PATH,
+        help="directory of the NOAA page cache, pages are fetched once",
+    )
+    parser.add_argument(
+        "--replay",
+        action="store_true",
+        help="re-publish the cached pages of the query without calling NOAA",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="only fetch observations newer than the stored high-water marks",
+    )
+    args = parser.parse_args(argv)
+
+    if not args.incremental and not (args.start_date and args.end_date):
+        parser.error("--start-date and --end-date are required unless --incremental")
+    if not 1 <= args.page_size <= NOAA_PAGE_LIMIT:
+        parser.error(f"--page-size must be between 1 and {NOAA_PAGE_LIMIT}")
+    if args.incremental and args.dry_run:
+        parser.error("--dry-run can't be combined with --incremental")
+    if args.incremental and args.engine == "async":
+        parser.error("--engine async can't be combined with --incremental")
+    if args.replay and not args.cache:
+        parser.error("--replay needs --cache or PAGE_CACHE_PATH")
+    if args.replay and args.incremental:
+        parser.error("--replay can't be combined with --incremental")
+    if args.cache and args.incremental:
+        # a cached page would hide the observations NOAA added since
+        parser.error(
+            "--cache can't be combined with --incremental, unset PAGE_CACHE_PATH"
+        )
+    if args.dry_run and len(args.locations) > 1:
+        parser.error("--dry-run takes a single location")
+    try:
+        check_codec(args.codec)
+    except ImportError as e:
+        parser.error(str(e))
+    return args
+
+
+def main(argv=None):
+    """
+    Run the producer from the command line and print throughput stats
+    """
+    args = parse_args(argv)
+    logging.basicConfig(level=LOG_LEVEL)
+
+    # the stations of every location are loaded in one pass
+    stations = get_station_store().get_location_stations(args.locations)
+    producer_kwargs = {
+        "max_workers": args.workers,
+        "page_size": args.page_size,
+        "shard_by": args.shard_by,
+        "shard_parallelism": args.parallelism,
+        "resume": args.resume,
+        "codec": args.codec,
+        "compress": args.compress,
+        "partition_by": args.partition_by,
+        "salt_buckets": args.salt_buckets,
+        "dry_run": args.dry_run,
+        "cache": PageCache(args.cache) if args.cache else None,
+        "replay": args.replay,
+    }
+    if args.engine == "async":
+        producer_kwargs["fetch_concurrency"] = args.fetch_concurrency
+        producer_kwargs["publish_concurrency"] = args.publish_concurrency
+
+    if args.metrics_port:
+        start_metrics_server(args.metrics_port)
+    profiler = profile(args.profile) if args.profile else contextlib.nullcontext()
+
+    with profiler:
+        start = time.perf_counter()
+        if args.incremental:
+            # imported here, the sync module imports this one
+            from src.sync import incremental_sync
+
+            # the locations share the stores, so their updates don't collide
+            high_water_marks = HighWaterMarkStore(HIGH_WATER_MARK_PATH)
+            checkpoint = CheckpointStore(args.checkpoint)
+            window_stats = []
+            for location_id in args.locations:
+                window_stats += incremental_sync(
+                    args.data_types,
+                    stations[location_id],
+                    high_water_marks,
+                    end_date=args.end_date,
+                    checkpoint=checkpoint,
+                    location_id=location_id,
+                    **producer_kwargs,
+                )
+            seconds = time.perf_counter() - start
+            stats = {
+                "windows": len(window_stats),
+                **{
+                    name: sum(window[name] for window in window_stats)
+                    for name in (
+                        "records",
+                        "observations",
+                        "missing_pages",
+                        "bytes",
+                        "batches",
+                        "failed_records",
+                    )
+                },
+                "seconds": seconds,
+            }
+            stats["records_per_second"] = stats["records"] / seconds if seconds else 0.0
+            stats["observations_per_second"] = (
+                stats["observations"] / seconds if seconds else 0.0
+            )
+            stats.update({f"noaa_{k}": v for k, v in get_client().stats().items()})
+        elif len(args.locations) > 1:
+            # imported here, the fan-out module imports this one
+            from src.fanout import FanOutProducer
+
+            fan_out = FanOutProducer(
+                args.locations,
+                args.data_types,
+                args.start_date,
+                args.end_date,
+                stations,
+                processes=args.processes,
+                checkpoint_path=args.checkpoint,
+                engine=args.engine,
+                **producer_kwargs,
+            )
+            results = fan_out.produce()
+            for job in fan_out.progress():
+                print(
+                    f"{job['description']}: {job['status']}, {job['pages']} pages, "
+                    f"{job['records']} records, {job['errors']} errors"
+                    + (f" ({job['error']})" if job["error"] else "")
+                )
+            stats = {
+                "locations": len(results),
+                "seconds": fan_out.elapsed,
+                **{
+                    name: sum(result[name] for result in results.values())
+                    for name in ("observations", "records", "batches", "failed_records")
+                },
+            }
+            stats.update(
+                {
+                    name: sum(result[name] for result in results.values())
+                    for name in next(iter(results.values()), {})
+                    if name.startswith("noaa_")
+                }
+            )
+        else:
+            producer_class = Producer
+            if args.engine == "async":
+                # imported here, the async module imports this one
+                from src.async_producer import AsyncProducer
+
+                producer_class = AsyncProducer
+
+            location_id = args.locations[0]
+            producer = producer_class(
+                args.data_types,
+                args.start_date,
+                args.end_date,
+                False,
+                stations[location_id],
+                # a dry run publishes nothing, so it must not advance the checkpoints
+                checkpoint=None if args.dry_run else CheckpointStore(args.checkpoint),
+                location_id=location_id,
+                **producer_kwargs,
+            )
+            producer.produce()
+            stats = producer.stats()
+
+            if args.dry_run:
+                report = producer.shard_report()
+                for shard_id, counts in report["shards"].items():
+                    print(
+                        f"{shard_id}: {counts['records']} records, {counts['bytes']} bytes"
+                    )
+                stats.update({f"shard_{k}": v for k, v in report["summary"].items()})
+            stats.update({f"noaa_{k}": v for k, v in get_client().stats().items()})
+
+    for name, value in stats.items():
+        print(
+            f"{name}: {value:.2f}" if isinstance(value, float) else f"{name}: {value}"
+        )
 
-            # check if all data is produced
-            if len(data) < limit:
-                logger.info("All data produced, exiting")
-                break
 
-        logger.info("Data produced")
+if __name__ == "__main__":
+    main()
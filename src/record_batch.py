@@ -0,0 +1,222 @@
+""" 
+    This file contains the columnar record batch shared by the producer and the
+    visualizer. A page of observations is held as NumPy arrays (date, datatype
+    code, station index, value) with the distinct datatypes and stations stored
+    once, so enrichment, date parsing and grouping run over whole pages instead
+    of one dict at a time.
+"""
+
+# required imports
+import json
+import logging
+import numpy as np
+
+from src.codec import encode_records, frame
+
+# configure logging
+logger = logging.getLogger()
+
+# seconds resolution matches the NOAA dates, 2021-10-01T00:00:00
+DATE_UNIT = "s"
+
+# body of one observation, the same text as encode_body for these codecs
+TEMPLATES = {
+    "json": '{{"date": {}, "datatype": {}, "station": {}, "value": {}, "station_name": {}}}',
+    "compact": "[[{},{},{},{},{}]]",
+}
+
+
+def factorize(values):
+    """
+    Codes of the values and their distinct values, in order of appearance. A
+    dict lookup per value is several times faster than np.unique on strings.
+    """
+    uniques = {}
+    codes = [uniques.setdefault(value, len(uniques)) for value in values]
+    return np.array(codes, dtype=np.int32), np.array(list(uniques), dtype=object)
+
+
+class RecordBatch:
+    """
+    This class holds observations as columns. datatype and station are codes
+    into the datatypes and stations arrays, and station_names is aligned with
+    stations.
+    """
+
+    def __init__(
+        self, date, datatype, station, value, datatypes, stations, station_names
+    ):
+        """
+        Initialize the batch from its columns
+        """
+        self.date = date
+        self.datatype = datatype
+        self.station = station
+        self.value = value
+        self.datatypes = datatypes
+        self.stations = stations
+        self.station_names = station_names
+
+    @classmethod
+    def from_rows(cls, rows, station_name=None):
+        """
+        Build a batch from NOAA results or DynamoDB items. station_name(id)
+        names each distinct station once; rows without a station (e.g. the
+        items read by the visualizer) share an empty one.
+        """
+        date = np.array([row["date"] for row in rows], dtype=f"datetime64[{DATE_UNIT}]")
+        # DynamoDB items hold Decimals, float() converts them one by one
+        value = np.fromiter(
+            (row["value"] for row in rows), dtype="float64", count=len(rows)
+        )
+        datatype, datatypes = factorize([row["datatype"] for row in rows])
+        station, stations = factorize([row.get("station", "") for row in rows])
+
+        # enrichment runs once per distinct station instead of once per row
+        names = np.array(
+            [
+                station_name(station_id) if station_name else ""
+                for station_id in stations
+            ],
+            dtype=object,
+        )
+        return cls(date, datatype, station, value, datatypes, stations, names)
+
+    def __len__(self):
+        """
+        Number of observations
+        """
+        return len(self.value)
+
+    def take(self, selection):
+        """
+        A batch of the observations picked by an index array or boolean mask
+        """
+        return RecordBatch(
+            self.date[selection],
+            self.datatype[selection],
+            self.station[selection],
+            self.value[selection],
+            self.datatypes,
+            self.stations,
+            self.station_names,
+        )
+
+    def mask(self, data_types=None, start_date=None, end_date=None):
+        """
+        Boolean mask of the observations of the datatypes within the date range
+        (YYYY-MM-DD, both days included)
+        """
+        selected = np.ones(len(self), dtype=bool)
+        if data_types is not None:
+            codes = np.flatnonzero(np.isin(self.datatypes, list(data_types)))
+            selected &= np.isin(self.datatype, codes)
+        day = self.date.astype("datetime64[D]")
+        if start_date:
+            selected &= day >= np.datetime64(start_date[:10])
+        if end_date:
+            selected &= day <= np.datetime64(end_date[:10])
+        return selected
+
+    def latest_dates(self):
+        """
+        The latest observation day (YYYY-MM-DD) of each datatype
+        """
+        latest = np.full(len(self.datatypes), np.iinfo(np.int64).min + 1)
+        np.maximum.at(latest, self.datatype, self.date.astype(np.int64))
+        present = np.bincount(self.datatype, minlength=len(self.datatypes)) > 0
+        latest = latest.astype(self.date.dtype)
+        return dict(
+            zip(
+                self.datatypes[present].tolist(),
+                np.datetime_as_string(latest[present], unit="D").tolist(),
+            )
+        )
+
+    def to_records(self):
+        """
+        The observations as producer records, the dicts encoded by the codecs
+        """
+        # a page holds few distinct dates, format each of them once
+        days, day = np.unique(self.date, return_inverse=True)
+        dates = np.datetime_as_string(days, unit=DATE_UNIT).astype(object)[day]
+        return [
+            {
+                "date": date,
+                "datatype": datatype,
+                "station": station,
+                "value": value,
+                "station_name": station_name,
+            }
+            for date, datatype, station, value, station_name in zip(
+                dates.tolist(),
+                self.datatypes[self.datatype].tolist(),
+                self.stations[self.station].tolist(),
+                self.value.tolist(),
+                self.station_names[self.station].tolist(),
+            )
+        ]
+
+    def to_frame(self):
+        """
+        The date, datatype and value columns as a pandas DataFrame, with the
+        dates already parsed
+        """
+        # imported here, the headless producer doesn't need pandas
+        import pandas as pd
+
+        return pd.DataFrame(
+            {
+                "date": self.date,
+                "datatype": self.datatypes[self.datatype],
+                "value": self.value,
+            }
+        )
+
+
+def encode_batch(
+    batch,
+    codec="json",
+    compress=False,
+    partition_key=lambda record: record["station"],
+):
+    """
+    Encode the batch into Kinesis payloads, the same payloads as
+    encode_records(batch.to_records(), ...). For the json and compact codecs
+    every distinct date, datatype and station is JSON encoded once and each
+    observation fills a template; the other codecs and non-finite values go
+    through encode_records.
+    """
+    if codec not in TEMPLATES or not np.isfinite(batch.value).all():
+        return encode_records(batch.to_records(), codec, compress, partition_key)
+
+    days, day = np.unique(batch.date, return_inverse=True)
+    dates = np.datetime_as_string(days, unit=DATE_UNIT).tolist()
+    datatypes = batch.datatypes.tolist()
+    stations = batch.stations.tolist()
+    encoded_dates = [json.dumps(date) for date in dates]
+    encoded_datatypes = [json.dumps(datatype) for datatype in datatypes]
+    encoded_stations = [json.dumps(station) for station in stations]
+    encoded_names = [json.dumps(name) for name in batch.station_names.tolist()]
+
+    template = TEMPLATES[codec]
+    payloads = []
+    for d, t, s, value in zip(
+        day.tolist(),
+        batch.datatype.tolist(),
+        batch.station.tolist(),
+        batch.value.tolist(),
+    ):
+        body = template.format(
+            encoded_dates[d],
+            encoded_datatypes[t],
+            encoded_stations[s],
+            float.__repr__(value),
+            encoded_names[s],
+        )
+        # the partitioners only read these fields
+        record = {"station": stations[s], "date": dates[d], "datatype": datatypes[t]}
+        payloads.append(
+            (frame(codec, body.encode("utf-8"), compress), partition_key(record), 1)
+        )
+    return payloads
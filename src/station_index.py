@@ -0,0 +1,116 @@
+""" 
+    This file contains the one-off backfill of the station index. The Lambda
+    consumer only registers the stations it writes, and the visualizer stops
+    scanning a table once its index item exists, so the stations of data
+    written before the index was deployed must be seeded once, before or at
+    deploy:
+
+        python -m src.station_index
+"""
+
+# required imports
+import os
+import argparse
+import boto3
+import logging
+
+from src.constants import (
+    AWS_REGION,
+    BACKEND,
+    LOG_LEVEL,
+    STATION_INDEX_TABLE,
+    TABLE_DATATYPES,
+)
+from src.backends import get_local_tables
+
+# configure logging
+logger = logging.getLogger()
+
+# stations added per UpdateItem call, well below the 400 KB item size limit
+BACKFILL_CHUNK_SIZE = 1000
+
+
+def get_dynamodb():
+    """
+    The DynamoDB resource, or the local tables for local runs
+    """
+    if BACKEND == "local":
+        return get_local_tables()
+    return boto3.resource(
+        "dynamodb",
+        region_name=AWS_REGION,
+        aws_access_key_id=os.environ["AWS_ACCESS_KEY_ID"],
+        aws_secret_access_key=os.environ["AWS_SECRET_ACCESS_KEY"],
+    )
+
+
+def scan_stations(table):
+    """
+    Every station of the table, following the scan pagination
+    """
+    response = table.scan(ProjectionExpression="station")
+    stations = {item["station"] for item in response["Items"]}
+    while "LastEvaluatedKey" in response:
+        response = table.scan(
+            ProjectionExpression="station",
+            ExclusiveStartKey=response["LastEvaluatedKey"],
+        )
+        stations.update(item["station"] for item in response["Items"])
+    return stations
+
+
+def backfill_station_index(dynamodb, table_names=tuple(TABLE_DATATYPES)):
+    """
+    Add every station of the tables to their station index items. Stations are
+    added to the existing sets, so the backfill is safe to run while the
+    consumer writes and to run again. Returns the station count per table.
+    """
+    index = dynamodb.Table(STATION_INDEX_TABLE)
+    counts = {}
+    for table_name in table_names:
+        stations = sorted(scan_stations(dynamodb.Table(table_name)))
+        for start in range(0, len(stations), BACKFILL_CHUNK_SIZE):
+            index.update_item(
+                Key={"table_name": table_name},
+                UpdateExpression="ADD stations :stations",
+                ExpressionAttributeValues={
+                    ":stations": set(stations[start : start + BACKFILL_CHUNK_SIZE])
+                },
+            )
+        logger.info(f"Indexed {len(stations)} stations of {table_name}")
+        counts[table_name] = len(stations)
+    return counts
+
+
+def parse_args(argv=None):
+    """
+    Parse the command line arguments of the backfill
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m src.station_index",
+        description="Seed the station index from the stations already in the data tables",
+    )
+    parser.add_argument(
+        "--tables",
+        nargs="+",
+        choices=list(TABLE_DATATYPES),
+        default=list(TABLE_DATATYPES),
+        help="data tables to index",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    """
+    Run the backfill from the command line and print the station counts
+    """
+    args = parse_args(argv)
+    logging.basicConfig(level=LOG_LEVEL)
+    for table_name, count in backfill_station_index(
+        get_dynamodb(), args.tables
+    ).items():
+        print(f"{table_name}: {count} stations")
+
+
+if __name__ == "__main__":
+    main()
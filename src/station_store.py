@@ -0,0 +1,203 @@
+""" 
+    This file contains the station metadata store, a SQLite cache of NOAA
+    stations shared by the producer and the visualizer
+"""
+
+# required imports
+import time
+import sqlite3
+import threading
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from src.constants import (
+    STATION_URL,
+    STATION_DB_PATH,
+    STATION_CACHE_TTL,
+    STATION_WARMUP_WORKERS,
+)
+from src.noaa_client import get_client
+
+# configure logging
+logger = logging.getLogger()
+
+STATION_PAGE_LIMIT = 1000
+
+
+class StationStore:
+    """
+    This class persists NOAA station metadata to a local SQLite database and
+    refreshes a location's stations once they are older than the TTL
+    """
+
+    def __init__(self, path, ttl=STATION_CACHE_TTL, client=None):
+        """
+        Initialize the store, creating the schema if needed
+        """
+        self.ttl = ttl
+        self.client = client or get_client()
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS stations "
+                "(id TEXT PRIMARY KEY, name TEXT, location_id TEXT)"
+            )
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS locations "
+                "(location_id TEXT PRIMARY KEY, fetched_at REAL)"
+            )
+
+    def is_fresh(self, location_id):
+        """
+        Check if the stations of the location were fetched within the TTL
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT fetched_at FROM locations WHERE location_id = ?",
+                (location_id,),
+            ).fetchone()
+        return row is not None and time.time() - row[0] < self.ttl
+
+    def get_stations(self, location_id):
+        """
+        Get the {name: id} mapping of the location's stations, refreshing them
+        from NOAA if they are missing or stale
+        """
+        return self.get_location_stations([location_id])[location_id]
+
+    def get_location_stations(self, location_ids):
+        """
+        Get the {name: id} mapping of the stations of each location, refreshing
+        the missing or stale locations from NOAA in one pass
+        """
+        stale = [
+            location_id
+            for location_id in location_ids
+            if not self.is_fresh(location_id)
+        ]
+        if stale:
+            try:
+                self.warmup(*stale)
+            except Exception as e:
+                # stale stations are better than none
+                logger.error(f"Error while refreshing stations of {stale}: {e}")
+
+        placeholders = ",".join("?" * len(location_ids))
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT location_id, name, id FROM stations "
+                f"WHERE location_id IN ({placeholders}) ORDER BY id",
+                list(location_ids),
+            ).fetchall()
+
+        stations = {location_id: {} for location_id in location_ids}
+        for location_id, name, station_id in rows:
+            stations[location_id][name] = station_id
+        return stations
+
+    def get_station_name(self, station_id):
+        """
+        Get the name of the station, or None if it isn't stored
+        """
+        with self.lock:
+            row = self.connection.execute(
+                "SELECT name FROM stations WHERE id = ?", (station_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def add_station(self, station_id, name, location_id=None):
+        """
+        Store a single station
+        """
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO stations VALUES (?, ?, ?)",
+                (station_id, name, location_id),
+            )
+
+    def fetch_page(self, location_id, offset):
+        """
+        Fetch one page of the location's stations from NOAA
+        """
+        params = {
+            "locationid": location_id,
+            "limit": STATION_PAGE_LIMIT,
+            "offset": offset,
+        }
+        response = self.client.get(STATION_URL, params=params, timeout=15)
+        if response.status_code != 200:
+            raise RuntimeError(
+                f"Error while fetching stations from NOAA API, error: {response.status_code}"
+            )
+        return response.json()
+
+    def warmup(self, *location_ids):
+        """
+        Fetch every station of the locations from NOAA and replace the stored
+        ones. The first page of each location gives its count, then the other
+        pages of every location are fetched concurrently and stored in one
+        transaction.
+        """
+        with ThreadPoolExecutor(max_workers=STATION_WARMUP_WORKERS) as executor:
+            first_pages = list(
+                executor.map(
+                    lambda location_id: self.fetch_page(location_id, 1), location_ids
+                )
+            )
+
+            results = {}
+            pages = []
+            for location_id, data in zip(location_ids, first_pages):
+                results[location_id] = list(data.get("results", []))
+                count = data.get("metadata", {}).get("resultset", {}).get("count", 0)
+                pages.extend(
+                    (location_id, offset)
+                    for offset in range(
+                        1 + STATION_PAGE_LIMIT, count + 1, STATION_PAGE_LIMIT
+                    )
+                )
+
+            for (location_id, _), page in zip(
+                pages, executor.map(lambda page: self.fetch_page(*page), pages)
+            ):
+                results[location_id].extend(page.get("results", []))
+
+        for location_id, stations in results.items():
+            logger.info(
+                f"Fetched {len(stations)} stations of {location_id} from NOAA API"
+            )
+
+        placeholders = ",".join("?" * len(location_ids))
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"DELETE FROM stations WHERE location_id IN ({placeholders})",
+                list(location_ids),
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO stations VALUES (?, ?, ?)",
+                [
+                    (result["id"], result["name"], location_id)
+                    for location_id, stations in results.items()
+                    for result in stations
+                ],
+            )
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO locations VALUES (?, ?)",
+                [(location_id, time.time()) for location_id in location_ids],
+            )
+
+
+store = None
+store_lock = threading.Lock()
+
+
+def get_station_store():
+    """
+    Return the process wide station store, creating it on first use
+    """
+    global store
+    with store_lock:
+        if store is None:
+            store = StationStore(STATION_DB_PATH)
+        return store
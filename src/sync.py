@@ -0,0 +1,135 @@
+""" 
+    This file contains the incremental sync that only fetches observations newer
+    than the last ones produced
+"""
+
+# required imports
+import datetime
+import threading
+import logging
+
+from src.constants import INCREMENTAL_INITIAL_DAYS, LOCATION_IDS
+from src.producer import Producer
+
+# configure logging
+logger = logging.getLogger()
+
+
+def plan_incremental_windows(
+    data_types, location_id, high_water_marks, end_date, lookback_days=0
+):
+    """
+    Group the datatypes by the start date of their next window. Returns a dict of
+    {start_date: [datatypes]} holding only windows that are not empty.
+    """
+    windows = {}
+    end = datetime.date.fromisoformat(end_date)
+
+    for data_type in data_types:
+        mark = high_water_marks.get(location_id, data_type)
+        if mark:
+            start = datetime.date.fromisoformat(mark) + datetime.timedelta(days=1)
+        else:
+            start = end - datetime.timedelta(days=INCREMENTAL_INITIAL_DAYS)
+
+        # NOAA backfills late observations, so optionally re-read recent days
+        start -= datetime.timedelta(days=lookback_days)
+
+        if start > end:
+            logger.info(f"{data_type} is up to date")
+            continue
+        windows.setdefault(start.isoformat(), []).append(data_type)
+
+    return windows
+
+
+def incremental_sync(
+    data_types,
+    stations,
+    high_water_marks,
+    end_date=None,
+    lookback_days=0,
+    location_id=LOCATION_IDS[0],
+    **producer_kwargs,
+):
+    """
+    Produce only the observations newer than the stored high-water marks and
+    advance the marks once everything has been published. The marks of a window
+    with pages that could not be fetched are left in place, so the next run
+    fetches it again. Returns the stats of the producer run of every window.
+    """
+    end_date = end_date or datetime.date.today().isoformat()
+    windows = plan_incremental_windows(
+        data_types, location_id, high_water_marks, end_date, lookback_days
+    )
+
+    window_stats = []
+    for start_date, window_types in sorted(windows.items()):
+        logger.info(f"Syncing {window_types} from {start_date} to {end_date}")
+        producer = Producer(
+            window_types,
+            start_date,
+            end_date,
+            False,
+            stations,
+            location_id=location_id,
+            **producer_kwargs,
+        )
+        producer.produce()
+        window_stats.append(producer.stats())
+
+        # only advance the marks after the whole window has been published
+        if producer.missing_pages:
+            logger.error(
+                f"{producer.missing_pages} pages of {window_types} from {start_date} "
+                "could not be fetched, keeping their high-water marks"
+            )
+            continue
+        high_water_marks.update(location_id, producer.latest_dates)
+
+    return window_stats
+
+
+class IncrementalSync:
+    """
+    This class wraps an incremental sync as a job of the JobRegistry, which runs
+    anything with a produce method and a progress_callback
+    """
+
+    def __init__(self, data_types, stations, high_water_marks, **sync_kwargs):
+        """
+        Initialize the sync, run later by produce
+        """
+        self.data_types = data_types
+        self.stations = stations
+        self.high_water_marks = high_water_marks
+        self.sync_kwargs = sync_kwargs
+        self.progress_callback = None
+        self.window_stats = []
+
+    def produce(self):
+        """
+        Run the sync, reporting the progress of every window to the job
+        """
+        self.window_stats = incremental_sync(
+            self.data_types,
+            self.stations,
+            self.high_water_marks,
+            progress_callback=self.progress_callback,
+            **self.sync_kwargs,
+        )
+
+
+def schedule_incremental_sync(interval_seconds, stop_event=None, **sync_kwargs):
+    """
+    Run incremental_sync every interval_seconds until stop_event is set. Errors
+    are logged and the next run is still scheduled.
+    """
+    stop_event = stop_event or threading.Event()
+
+    while not stop_event.is_set():
+        try:
+            incremental_sync(**sync_kwargs)
+        except Exception as e:
+            logger.error(f"Error during incremental sync: {e}")
+        stop_event.wait(interval_seconds)
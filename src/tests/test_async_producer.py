@@ -0,0 +1,186 @@
+""" 
+Test the asyncio producer engine
+"""
+
+import os
+import time
+import asyncio
+import tempfile
+import unittest
+from unittest.mock import patch, MagicMock
+from src.async_producer import AsyncProducer, PageResponse
+from src.checkpoint import CheckpointStore
+from src.fake_noaa import FakeNoaaServer
+from src.local_stream import LocalStream
+from src.noaa_client import NoaaClient, NoaaApiError
+from src.producer import PublishError
+
+
+class FakeAsyncKinesis:
+    """
+    Async PutRecords client failing the first entry of the first call, or
+    every entry of every call
+    """
+
+    def __init__(self, fail_all=False):
+        self.fail_all = fail_all
+        self.calls = []
+
+    async def put_records(self, StreamName, Records):
+        self.calls.append(len(Records))
+        failed = [
+            self.fail_all or (len(self.calls) == 1 and i == 0)
+            for i in range(len(Records))
+        ]
+        return {
+            "FailedRecordCount": sum(failed),
+            "Records": [
+                {"ErrorCode": "ProvisionedThroughputExceededException"}
+                if failed[i]
+                else {"ShardId": "shardId-000", "SequenceNumber": str(i)}
+                for i in range(len(Records))
+            ],
+        }
+
+
+class TestAsyncProducer(unittest.TestCase):
+    """
+    Test the AsyncProducer class
+    """
+
+    def make_producer(self, server, **kwargs):
+        """
+        Build an async producer reading from the fake API into a local stream
+        """
+        with patch(
+            "src.producer.get_client", return_value=NoaaClient(token="x")
+        ), patch("src.producer.DATA_URL", f"{server.url}/data"):
+            producer = AsyncProducer(
+                ["PRCP", "TMAX"],
+                "2021-10-01",
+                "2021-10-10",
+                False,
+                {"FAKE STATION 0, MD US": "GHCND:US1MD0000000"},
+                page_size=7,
+                **kwargs,
+            )
+        producer.kinesis_client = LocalStream(shard_count=2)
+        return producer
+
+    def test_produce(self):
+        """
+        Test that every page is published in order and checkpointed
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, FakeNoaaServer(
+            station_count=3
+        ) as server:
+            checkpoint = CheckpointStore(os.path.join(tmp_dir, "checkpoints.json"))
+            producer = self.make_producer(
+                server, checkpoint=checkpoint, fetch_concurrency=3
+            )
+            # without aiohttp the fetches fall back to threads, with a warning
+            with patch("src.async_producer.aiohttp", None), self.assertLogs(
+                level="WARNING"
+            ) as logs:
+                producer.produce()
+
+        self.assertIn("aiohttp is not installed", logs.output[0])
+        self.assertEqual(producer.stats()["observations"], 60)
+        self.assertEqual(sum(producer.kinesis_client.stats().values()), 60)
+        self.assertEqual(
+            producer.latest_dates, {"PRCP": "2021-10-10", "TMAX": "2021-10-10"}
+        )
+        state = checkpoint.get(producer.params)
+        self.assertTrue(state["complete"])
+        self.assertEqual(state["offset"], 57)
+
+    def test_put_records_retry(self):
+        """
+        Test that only the failed entries are retried on the async client
+        """
+        with FakeNoaaServer() as server:
+            producer = self.make_producer(server)
+        kinesis = FakeAsyncKinesis()
+        entries = [{"Data": b"{}", "PartitionKey": str(i)} for i in range(3)]
+
+        with patch("src.async_producer.put_backoff", return_value=0):
+            sequence_numbers = asyncio.run(producer.put_records_async(kinesis, entries))
+
+        self.assertEqual(kinesis.calls, [3, 1])
+        self.assertEqual(sequence_numbers, {"shardId-000": "0"})
+        self.assertEqual(producer.batch_stats[0]["attempts"], 2)
+
+    def test_produce_keeps_checkpoint_on_publish_failure(self):
+        """
+        Test that a page whose records can't be published is not checkpointed
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, FakeNoaaServer() as server:
+            checkpoint = CheckpointStore(os.path.join(tmp_dir, "checkpoints.json"))
+            # fetches running in worker threads finish even once cancelled
+            producer = self.make_producer(
+                server, checkpoint=checkpoint, fetch_concurrency=1
+            )
+            producer.kinesis_client = MagicMock()
+            producer.kinesis_client.put_records.side_effect = (
+                lambda StreamName, Records: {
+                    "FailedRecordCount": len(Records),
+                    "Records": [{"ErrorCode": "InternalFailure"} for _ in Records],
+                }
+            )
+
+            with patch("src.producer.put_backoff", return_value=0):
+                with self.assertRaises(PublishError):
+                    producer.produce()
+
+            self.assertIsNone(checkpoint.get(producer.params))
+
+    def test_produce_cancels_pending_fetches_on_error(self):
+        """
+        Test that a failing page cancels the other fetches of its query
+        """
+        with FakeNoaaServer() as server:
+            producer = self.make_producer(server, fetch_concurrency=4)
+
+        async def fetch(session, limit, offset, query):
+            if offset == 1:
+                return PageResponse(
+                    200,
+                    {},
+                    b'{"metadata": {"resultset": {"count": 100}}, "results": []}',
+                )
+            if offset == 8:
+                raise NoaaApiError("NOAA request failed")
+            await asyncio.sleep(10)
+
+        async def produce_query():
+            with self.assertRaises(NoaaApiError):
+                await producer.produce_query_async(producer.params, None, None)
+            # nothing of the query is left running once the error propagates
+            return asyncio.all_tasks() - {asyncio.current_task()}
+
+        with patch.object(producer, "fetch_async", side_effect=fetch):
+            start = time.perf_counter()
+            self.assertEqual(asyncio.run(produce_query()), set())
+
+        # the sleeping fetches were cancelled instead of awaited
+        self.assertLess(time.perf_counter() - start, 5)
+
+    def test_put_records_failure(self):
+        """
+        Test that entries failing every attempt raise PublishError
+        """
+        with FakeNoaaServer() as server:
+            producer = self.make_producer(server)
+        kinesis = FakeAsyncKinesis(fail_all=True)
+        with patch("src.async_producer.put_backoff", return_value=0):
+            with self.assertRaises(PublishError):
+                asyncio.run(
+                    producer.put_records_async(
+                        kinesis, [{"Data": b"{}", "PartitionKey": "a"}]
+                    )
+                )
+        self.assertEqual(producer.batch_stats[0]["failed"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
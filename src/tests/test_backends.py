@@ -0,0 +1,81 @@
+""" 
+Test an end-to-end run on the local backends
+"""
+
+import unittest
+from unittest.mock import patch
+from src.backends import load_consumer, run_consumer
+from src.fake_noaa import FakeNoaaServer
+from src.local_stream import LocalStream
+from src.local_tables import LocalDynamoDB
+from src.noaa_client import NoaaClient, NoaaApiError
+from src.producer import Producer
+from src.visualization import fetch_data_from_dynamodb
+
+
+class TestBackends(unittest.TestCase):
+    """
+    Test an end-to-end run on the local backends
+    """
+
+    def test_end_to_end(self):
+        """
+        Test producing from the fake API through the local stream and consumer
+        into the local tables, then reading them back like the visualizer
+        """
+        dynamodb = LocalDynamoDB()
+        stream = LocalStream(shard_count=2)
+
+        with FakeNoaaServer(station_count=3) as server, patch(
+            "src.producer.DATA_URL", f"{server.url}/data"
+        ), patch("src.producer.get_client", return_value=NoaaClient(token="x")):
+            producer = Producer(
+                ["PRCP", "TMAX"],
+                "2021-10-01",
+                "2021-10-10",
+                False,
+                {"FAKE STATION 0, MD US": "GHCND:US1MD0000000"},
+            )
+            producer.kinesis_client = stream
+            producer.produce()
+
+        self.assertEqual(producer.stats()["observations"], 60)
+        self.assertEqual(sum(stream.stats().values()), 60)
+
+        consumer = load_consumer(dynamodb)
+        self.assertEqual(run_consumer(stream, consumer, batch_size=25), 0)
+
+        with patch("src.visualization.init_dynamodb_client", return_value=dynamodb):
+            items = fetch_data_from_dynamodb(
+                "Temperature", "GHCND:US1MD0000000", "2021-10-03", "2021-10-04"
+            )
+        self.assertEqual(
+            [item["date"][:10] for item in items], ["2021-10-03", "2021-10-04"]
+        )
+        index = dynamodb.Table("StationIndex").get_item(
+            Key={"table_name": "Precipitation"}
+        )
+        self.assertEqual(len(index["Item"]["stations"]), 3)
+
+    def test_fake_noaa_rate_limit(self):
+        """
+        Test that the fake API answers 429 beyond its rate limit
+        """
+        with FakeNoaaServer(requests_per_second=2) as server:
+            client = NoaaClient(token="x", requests_per_second=100, max_retries=0)
+            statuses = []
+            for _ in range(4):
+                try:
+                    statuses.append(
+                        client.get(f"{server.url}/stations", timeout=5).status_code
+                    )
+                except NoaaApiError:
+                    statuses.append(429)
+
+        self.assertEqual(statuses[:2], [200, 200])
+        self.assertIn(429, statuses)
+        self.assertGreater(server.throttled, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+""" 
+Test the benchmark suite
+"""
+
+import json
+import unittest
+from unittest.mock import patch
+from src.benchmark import (
+    benchmark_producer,
+    benchmark_consumer,
+    benchmark_visualizer,
+    percentile,
+)
+
+
+class TestBenchmark(unittest.TestCase):
+    """
+    Test the benchmark suite on tiny workloads
+    """
+
+    def test_percentile(self):
+        """
+        Test the interpolated percentile
+        """
+        self.assertEqual(percentile([3, 1, 2], 0.5), 2)
+        self.assertEqual(percentile([1, 2], 0.95), 1.95)
+        self.assertEqual(percentile([7], 0.95), 7)
+
+    def test_benchmarks_report_json(self):
+        """
+        Test that every benchmark runs and reports JSON serializable results
+        """
+        producer = benchmark_producer([50], [1, 2], days=2, stations=3, latency=0)
+        consumer = benchmark_consumer([25], records=100, stations=10)
+        with patch("src.visualization.BACKEND", "local"):
+            visualizer = benchmark_visualizer([500])
+
+        self.assertEqual([run["observations"] for run in producer], [30, 30])
+        # batches never span shards, so 100 records take at least 4 of 25
+        self.assertGreaterEqual(consumer[0]["batches"], 4)
+        # 2 days of 10 stations, one Precipitation and one Temperature item
+        # per station-day
+        self.assertEqual(consumer[0]["failed_records"], 0)
+        self.assertEqual(consumer[0]["items_written"], 40)
+        self.assertEqual(visualizer[0]["rows"], 500)
+        json.dumps(
+            {"producer": producer, "consumer": consumer, "visualizer": visualizer}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
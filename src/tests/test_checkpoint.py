@@ -0,0 +1,35 @@
+""" 
+Test the checkpoint store
+"""
+
+import os
+import tempfile
+import unittest
+from src.checkpoint import CheckpointStore
+
+
+class TestCheckpointStore(unittest.TestCase):
+    """
+    Test the checkpoint store
+    """
+
+    def test_update_persists(self):
+        """
+        Test that checkpoints survive reloading the store and ignore paging params
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "checkpoints.json")
+            params = {"datatypeid": "PRCP", "startdate": "2021-10-01", "offset": 1}
+
+            store = CheckpointStore(path)
+            store.update(params, 1, 1000, {"shardId-0": "9"})
+            store.update(params, 1001, 1000, {"shardId-0": "10"})
+
+            checkpoint = CheckpointStore(path).get(dict(params, offset=2001))
+            self.assertEqual(checkpoint["offset"], 1001)
+            self.assertFalse(checkpoint["complete"])
+            self.assertEqual(checkpoint["sequence_numbers"], {"shardId-0": "10"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,138 @@
+""" 
+Test the record codecs
+"""
+
+import json
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from src.codec import (
+    encode_records,
+    decode_payload,
+    msgpack,
+    COLUMNAR_MAX_RECORDS,
+    HEADER,
+    MAGIC,
+)
+
+RECORDS = [
+    {
+        "date": "2021-10-01T00:00:00",
+        "datatype": "PRCP",
+        "station": "GHCND:S1",
+        "value": 1.5,
+        "station_name": "Station 1",
+    },
+    {
+        "date": "2021-10-01T00:00:00",
+        "datatype": "TMAX",
+        "station": "GHCND:S2",
+        "value": 20,
+        "station_name": "Station 2",
+    },
+    {
+        "date": "2021-10-02T00:00:00",
+        "datatype": "PRCP",
+        "station": "GHCND:S1",
+        "value": 0.0,
+        "station_name": "Station 1",
+    },
+]
+
+
+class TestCodec(unittest.TestCase):
+    """
+    Test the record codecs
+    """
+
+    def decode_all(self, payloads, parse_float=None):
+        """
+        Decode every payload into one list of observations
+        """
+        return [
+            record
+            for payload, _, _ in payloads
+            for record in decode_payload(payload, parse_float)
+        ]
+
+    def test_json_is_legacy_format(self):
+        """
+        Test that uncompressed json payloads are plain JSON objects
+        """
+        payloads = encode_records(RECORDS)
+
+        self.assertEqual(len(payloads), 3)
+        self.assertEqual(json.loads(payloads[0][0]), RECORDS[0])
+        self.assertEqual(payloads[1][1], "GHCND:S2")
+
+    def test_round_trip(self):
+        """
+        Test that every codec decodes back to the original records
+        """
+        codecs = ["json", "compact", "columnar"] + (["msgpack"] if msgpack else [])
+        for codec in codecs:
+            for compress in (False, True):
+                with self.subTest(codec=codec, compress=compress):
+                    payloads = encode_records(RECORDS, codec, compress)
+                    decoded = self.decode_all(payloads)
+                    key = lambda record: (record["station"], record["date"])
+                    self.assertEqual(sorted(decoded, key=key), sorted(RECORDS, key=key))
+
+    def test_columnar_packs_by_station(self):
+        """
+        Test that the columnar codec packs each station into bounded payloads
+        """
+        records = [dict(RECORDS[0], value=i) for i in range(COLUMNAR_MAX_RECORDS + 1)]
+        records.append(RECORDS[1])
+
+        payloads = encode_records(records, "columnar")
+
+        self.assertEqual(
+            [(key, count) for _, key, count in payloads],
+            [
+                ("GHCND:S1", COLUMNAR_MAX_RECORDS),
+                ("GHCND:S1", 1),
+                ("GHCND:S2", 1),
+            ],
+        )
+
+    def test_parse_float(self):
+        """
+        Test that floats are parsed with parse_float in framed payloads
+        """
+        payloads = encode_records(RECORDS[:1], "compact", compress=True)
+
+        decoded = self.decode_all(payloads, parse_float=Decimal)
+
+        self.assertEqual(decoded[0]["value"], Decimal("1.5"))
+
+    def test_unknown_version(self):
+        """
+        Test that payloads from a newer format version are rejected
+        """
+        payload = HEADER.pack(MAGIC, 99, 1, 0) + b"[]"
+
+        with self.assertRaises(ValueError):
+            decode_payload(payload)
+
+    def test_malformed_payloads(self):
+        """
+        Test that truncated and corrupt payloads are rejected as ValueError
+        """
+        compressed, _, _ = encode_records(RECORDS[:1], "compact", compress=True)[0]
+
+        for payload in [MAGIC, compressed[:-4] + b"xxxx", HEADER.pack(MAGIC, 1, 2, 0)]:
+            with self.subTest(payload=payload), patch("src.codec.msgpack", None):
+                with self.assertRaises(ValueError):
+                    decode_payload(payload)
+
+    def test_unknown_codec(self):
+        """
+        Test that unknown codec names are rejected
+        """
+        with self.assertRaises(ValueError):
+            encode_records(RECORDS, "xml")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,89 @@
+""" 
+Test the multi-location fan-out producer
+"""
+
+import os
+import tempfile
+import unittest
+import multiprocessing
+from unittest.mock import patch
+from src.fanout import FanOutProducer, location_checkpoint_path
+from src.checkpoint import CheckpointStore
+from src.fake_noaa import FakeNoaaServer
+from src.local_stream import LocalStream
+
+
+class TestFanOut(unittest.TestCase):
+    """
+    Test the FanOutProducer class
+    """
+
+    def test_location_checkpoint_path(self):
+        """
+        Test that every location gets its own checkpoint file
+        """
+        self.assertEqual(
+            location_checkpoint_path("state/checkpoints.json", "FIPS:24"),
+            "state/checkpoints-FIPS_24.json",
+        )
+
+    @unittest.skipUnless(
+        multiprocessing.get_start_method() == "fork",
+        "the worker processes inherit the patched settings",
+    )
+    def test_produce_locations(self):
+        """
+        Test that every location is produced by a worker process, with its own
+        progress, checkpoints and NOAA stats
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir, FakeNoaaServer(
+            station_count=3
+        ) as server, patch("src.producer.BACKEND", "local"), patch(
+            "src.producer.DATA_URL", f"{server.url}/data"
+        ), patch(
+            "src.backends.LOCAL_STREAM_PATH", os.path.join(tmp_dir, "stream")
+        ):
+            checkpoint_path = os.path.join(tmp_dir, "checkpoints.json")
+            fan_out = FanOutProducer(
+                ["FIPS:24", "FIPS:51"],
+                ["PRCP", "TMAX"],
+                "2021-10-01",
+                "2021-10-10",
+                {"FIPS:24": {"FAKE STATION 0, MD US": "GHCND:US1MD0000000"}},
+                # both locations run in the same worker process
+                processes=1,
+                checkpoint_path=checkpoint_path,
+            )
+            results = fan_out.produce()
+            stream = LocalStream(path=os.path.join(tmp_dir, "stream"))
+
+            # the fake API ignores the location, so both produce the same records
+            self.assertEqual(sorted(results), ["FIPS:24", "FIPS:51"])
+            self.assertEqual(
+                [result["observations"] for result in results.values()], [60, 60]
+            )
+            self.assertEqual(sum(stream.stats().values()), 120)
+
+            progress = fan_out.progress()
+            self.assertEqual(
+                [job["description"] for job in progress], ["FIPS:24", "FIPS:51"]
+            )
+            self.assertEqual([job["status"] for job in progress], ["succeeded"] * 2)
+            self.assertEqual([job["records"] for job in progress], [60, 60])
+
+            # each location only counts its own NOAA requests
+            self.assertEqual(
+                [result["noaa_requests"] for result in results.values()], [1, 1]
+            )
+
+            for location_id in ["FIPS:24", "FIPS:51"]:
+                checkpoint = CheckpointStore(
+                    location_checkpoint_path(checkpoint_path, location_id)
+                )
+                (state,) = checkpoint.checkpoints.values()
+                self.assertTrue(state["complete"])
+                self.assertEqual(state["params"]["locationid"], location_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+""" 
+Test the background job runner
+"""
+
+import unittest
+from unittest.mock import MagicMock
+from src.jobs import JobRegistry
+
+
+class TestJobRegistry(unittest.TestCase):
+    """
+    Test the background job runner
+    """
+
+    def test_submit_runs_producer_in_background(self):
+        """
+        Test that submitted producers run and report their progress
+        """
+        producer = MagicMock()
+        producer.produce.side_effect = lambda: producer.progress_callback(
+            pages=2, records=1500
+        )
+        failing = MagicMock()
+        failing.produce.side_effect = RuntimeError("quota exceeded")
+
+        registry = JobRegistry(max_workers=2)
+        job = registry.submit("PRCP 2021-10", producer)
+        registry.submit("TMAX 2021-10", failing)
+        registry.shutdown()
+
+        jobs = registry.list_jobs()
+        self.assertEqual(
+            [snapshot["status"] for snapshot in jobs], ["failed", "succeeded"]
+        )
+        self.assertEqual(jobs[0]["error"], "quota exceeded")
+        self.assertEqual(jobs[1]["id"], job.id)
+        self.assertEqual((jobs[1]["pages"], jobs[1]["records"]), (2, 1500))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,321 @@
+""" 
+Test the Lambda consumer
+"""
+
+import os
+import json
+import base64
+import unittest
+import importlib.util
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+from src.codec import encode_records
+from src.local_tables import LocalDynamoDB
+
+# lambda is a keyword, so the consumer is loaded from its path
+CONSUMER_PATH = os.path.join(
+    os.path.dirname(__file__), "..", "lambda", "lambda_consumer.py"
+)
+
+
+def load_consumer():
+    """
+    Load the consumer module with a mocked DynamoDB resource
+    """
+    spec = importlib.util.spec_from_file_location("lambda_consumer", CONSUMER_PATH)
+    module = importlib.util.module_from_spec(spec)
+    with patch("boto3.resource"):
+        spec.loader.exec_module(module)
+    return module
+
+
+def kinesis_event(records):
+    """
+    Build a Kinesis event for the records
+    """
+    return {
+        "Records": [
+            {
+                "kinesis": {
+                    "data": base64.b64encode(json.dumps(record).encode()).decode(),
+                    "sequenceNumber": str(i),
+                }
+            }
+            for i, record in enumerate(records)
+        ]
+    }
+
+
+class TestLambdaConsumer(unittest.TestCase):
+    """
+    Test the Lambda consumer
+    """
+
+    def setUp(self):
+        """
+        Load a fresh consumer for each test
+        """
+        self.consumer = load_consumer()
+        self.consumer.dynamodb = MagicMock()
+        self.consumer.dynamodb.batch_write_item.return_value = {"UnprocessedItems": {}}
+        self.tables = {}
+        self.consumer.dynamodb.Table.side_effect = lambda name: self.tables.setdefault(
+            name, MagicMock()
+        )
+
+    def test_lambda_handler_batches_by_table(self):
+        """
+        Test that records are grouped into one batch write per table, the last
+        observation of a station-day winning its table item
+        """
+        self.consumer.dynamodb = LocalDynamoDB()
+        records = [
+            {"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 1.5},
+            {"datatype": "TMIN", "date": "2023-01-01", "station": "S1", "value": -5},
+            {"datatype": "SNOW", "date": "2023-01-01", "station": "S1", "value": 0},
+            {"datatype": "PRCP", "date": "2023-01-02", "station": "S1", "value": 2.5},
+            {"datatype": "WIND", "date": "2023-01-01", "station": "S1", "value": 3},
+        ]
+
+        with patch.object(
+            self.consumer.dynamodb,
+            "batch_write_item",
+            wraps=self.consumer.dynamodb.batch_write_item,
+        ) as batch_write_item:
+            response = self.consumer.lambda_handler(kinesis_event(records), None)
+
+        self.assertEqual(response, {"batchItemFailures": []})
+        self.assertEqual(batch_write_item.call_count, 2)
+        precipitation = self.consumer.dynamodb.Table("Precipitation").scan()["Items"]
+        self.assertEqual(
+            sorted((item["date"], item["datatype"]) for item in precipitation),
+            [("2023-01-01", "SNOW"), ("2023-01-02", "PRCP")],
+        )
+        temperature = self.consumer.dynamodb.Table("Temperature").scan()["Items"]
+        self.assertEqual([item["value"] for item in temperature], [Decimal("-5")])
+        # the rollups still get every datatype of the station-day
+        rollups = self.consumer.dynamodb.Table("Rollups").scan()["Items"]
+        self.assertEqual(
+            sorted(item["period"] for item in rollups),
+            ["PRCP#2023-01", "SNOW#2023-01", "TMIN#2023-01"],
+        )
+
+    def test_batch_write_splits_duplicate_keys(self):
+        """
+        Test that items sharing a table key are written in separate calls,
+        the last one winning
+        """
+        self.consumer.dynamodb = LocalDynamoDB()
+        items = [
+            {"datatype": "PRCP", "date": f"2023-01-{day:02d}", "station": "S1"}
+            for day in range(1, 31)
+        ] + [{"datatype": "SNOW", "date": "2023-01-01", "station": "S1"}]
+
+        failed = self.consumer.batch_write("Precipitation", items)
+
+        self.assertEqual(failed, [])
+        chunks = self.consumer.chunk_items(items)
+        self.assertEqual([len(chunk) for chunk in chunks], [25, 6])
+        table = self.consumer.dynamodb.Table("Precipitation")
+        self.assertEqual(len(table.scan()["Items"]), 30)
+        item = table.get_item(Key={"station": "S1", "date": "2023-01-01"})["Item"]
+        self.assertEqual(item["datatype"], "SNOW")
+
+    @patch("time.sleep")
+    def test_batch_write_retries_unprocessed_items(self, mock_sleep):
+        """
+        Test that unprocessed items are retried and reported when they keep failing
+        """
+        item = {"datatype": "PRCP", "date": "2023-01-01", "station": "S1"}
+        unprocessed = {"Precipitation": [{"PutRequest": {"Item": item}}]}
+        self.consumer.dynamodb.batch_write_item.return_value = {
+            "UnprocessedItems": unprocessed
+        }
+
+        failed = self.consumer.batch_write("Precipitation", [item])
+
+        self.assertEqual(failed, [item])
+        self.assertEqual(
+            self.consumer.dynamodb.batch_write_item.call_count,
+            self.consumer.MAX_BATCH_WRITE_ATTEMPTS,
+        )
+
+    def test_batch_write_isolates_failing_chunks(self):
+        """
+        Test that an error on one chunk only fails the items of that chunk
+        """
+        items = [
+            {"datatype": "PRCP", "date": f"2023-01-{day:02d}", "station": "S1"}
+            for day in range(1, 31)
+        ]
+        self.consumer.dynamodb.batch_write_item.side_effect = [
+            Exception("ValidationException"),
+            {"UnprocessedItems": {}},
+        ]
+
+        failed = self.consumer.batch_write("Precipitation", items)
+
+        self.assertEqual(failed, items[: self.consumer.BATCH_WRITE_LIMIT])
+        self.assertEqual(self.consumer.dynamodb.batch_write_item.call_count, 2)
+
+    @patch("time.sleep")
+    def test_lambda_handler_reports_failures_and_dedupes(self, mock_sleep):
+        """
+        Test that duplicates are written once and failed records are reported
+        """
+        records = [
+            {"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 1},
+            {"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 2},
+            {"datatype": "TMAX", "date": "2023-01-01", "station": "S1", "value": 9},
+        ]
+        event = kinesis_event(records)
+        event["Records"].append(
+            {
+                "kinesis": {
+                    "data": base64.b64encode(b"not json").decode(),
+                    "sequenceNumber": "3",
+                }
+            }
+        )
+
+        def write(RequestItems):
+            # every temperature write is throttled
+            if "Temperature" in RequestItems:
+                return {"UnprocessedItems": RequestItems}
+            return {"UnprocessedItems": {}}
+
+        self.consumer.dynamodb.batch_write_item.side_effect = write
+
+        response = self.consumer.lambda_handler(event, None)
+
+        first_call = self.consumer.dynamodb.batch_write_item.call_args_list[0]
+        precipitation = first_call.kwargs["RequestItems"]["Precipitation"]
+        self.assertEqual(len(precipitation), 1)
+        self.assertEqual(precipitation[0]["PutRequest"]["Item"]["value"], 2)
+        self.assertEqual(response, {"batchItemFailures": [{"itemIdentifier": "2"}]})
+
+    def test_lambda_handler_registers_new_stations(self):
+        """
+        Test that new stations are added to the index once per container
+        """
+        records = [
+            {"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 1},
+            {"datatype": "PRCP", "date": "2023-01-02", "station": "S2", "value": 2},
+        ]
+
+        self.consumer.lambda_handler(kinesis_event(records), None)
+        self.consumer.lambda_handler(kinesis_event(records), None)
+
+        index = self.tables["StationIndex"]
+        index.update_item.assert_called_once_with(
+            Key={"table_name": "Precipitation"},
+            UpdateExpression="ADD stations :stations",
+            ExpressionAttributeValues={":stations": {"S1", "S2"}},
+        )
+
+    def test_lambda_handler_updates_rollups(self):
+        """
+        Test that observations are folded into monthly rollups by day
+        """
+        records = [
+            {"datatype": "TMAX", "date": "2023-01-01", "station": "S1", "value": 3},
+            {"datatype": "TMAX", "date": "2023-01-15", "station": "S1", "value": 7},
+            {"datatype": "TMAX", "date": "2023-02-01", "station": "S1", "value": 1},
+        ]
+
+        self.consumer.lambda_handler(kinesis_event(records), None)
+
+        calls = self.tables["Rollups"].update_item.call_args_list
+        self.assertEqual(len(calls), 2)
+        january = calls[0].kwargs
+        self.assertEqual(january["Key"], {"station": "S1", "period": "TMAX#2023-01"})
+        self.assertEqual(january["ExpressionAttributeValues"][":d15"], 7)
+        self.assertIn("#d01 = :d01", january["UpdateExpression"])
+
+    def test_lambda_handler_decodes_packed_records(self):
+        """
+        Test that a compressed columnar record is expanded into its observations
+        """
+        records = [
+            {"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 1.5},
+            {"datatype": "SNOW", "date": "2023-01-01", "station": "S1", "value": 0},
+            {"datatype": "PRCP", "date": "2023-01-02", "station": "S1", "value": 2.5},
+        ]
+        payload, _, _ = encode_records(records, "columnar", compress=True)[0]
+        event = {
+            "Records": [
+                {
+                    "kinesis": {
+                        "data": base64.b64encode(payload).decode(),
+                        "sequenceNumber": "0",
+                    }
+                }
+            ]
+        }
+
+        response = self.consumer.lambda_handler(event, None)
+
+        calls = self.consumer.dynamodb.batch_write_item.call_args_list
+        items = [
+            request["PutRequest"]["Item"]
+            for call in calls
+            for request in call.kwargs["RequestItems"]["Precipitation"]
+        ]
+        # both observations share a station-day, so SNOW is written last
+        self.assertEqual([item["datatype"] for item in items], ["SNOW", "PRCP"])
+        self.assertEqual(items[1]["value"], Decimal("2.5"))
+        self.assertEqual(response, {"batchItemFailures": []})
+
+    def test_lambda_handler_skips_undecodable_records(self):
+        """
+        Test that truncated and corrupt payloads are skipped, not retried
+        """
+        payload, _, _ = encode_records(
+            [{"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 1}],
+            "compact",
+            compress=True,
+        )[0]
+        event = {
+            "Records": [
+                {
+                    "kinesis": {
+                        "data": base64.b64encode(data).decode(),
+                        "sequenceNumber": str(i),
+                    }
+                }
+                for i, data in enumerate([b"NC", payload[:-4] + b"xxxx", payload])
+            ]
+        }
+
+        response = self.consumer.lambda_handler(event, None)
+
+        call = self.consumer.dynamodb.batch_write_item.call_args
+        self.assertEqual(len(call.kwargs["RequestItems"]["Precipitation"]), 1)
+        self.assertEqual(response, {"batchItemFailures": []})
+
+    def test_lambda_handler_logs_metrics(self):
+        """
+        Test that each invocation logs its metrics in embedded metric format
+        """
+        records = [
+            {"datatype": "PRCP", "date": "2023-01-01", "station": "S1", "value": 1},
+        ]
+
+        with patch("builtins.print") as mock_print:
+            self.consumer.lambda_handler(kinesis_event(records), None)
+
+        lines = [call.args[0] for call in mock_print.call_args_list]
+        documents = [json.loads(line) for line in lines if line.startswith("{")]
+        names = {
+            metric["Name"]
+            for document in documents
+            for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+        }
+        self.assertIn("dynamodb_batch_write_seconds", names)
+        self.assertIn("records_total", names)
+        # the registry starts empty for the next invocation
+        self.assertEqual(self.consumer.metrics.metrics, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,96 @@
+""" 
+Test the local stream
+"""
+
+import tempfile
+import unittest
+from src.local_stream import LocalStream
+from src.partitioning import load_shard_map
+
+
+class TestLocalStream(unittest.TestCase):
+    """
+    Test the local stream
+    """
+
+    def test_put_and_read_records(self):
+        """
+        Test that records are spread over the shards and read back in order
+        """
+        stream = LocalStream(shard_count=2)
+        entries = [
+            {"Data": f"{i}".encode(), "PartitionKey": f"S{i}"} for i in range(20)
+        ]
+
+        response = stream.put_records("NoaaStream", entries)
+
+        self.assertEqual(response["FailedRecordCount"], 0)
+        self.assertTrue(all(stream.stats().values()))
+        events = list(stream.lambda_events(batch_size=5))
+        numbers = [
+            int(record["kinesis"]["sequenceNumber"])
+            for event in events
+            for record in event["Records"]
+        ]
+        self.assertEqual(sorted(numbers), list(range(1, 21)))
+        self.assertTrue(all(len(event["Records"]) <= 5 for event in events))
+
+    def test_shard_map_matches_partitioning(self):
+        """
+        Test that explicit hash keys go to the shard whose range holds them
+        """
+        stream = LocalStream(shard_count=4)
+        shards = load_shard_map(stream, "NoaaStream")
+
+        response = stream.put_records(
+            "NoaaStream",
+            [
+                {
+                    "Data": b"x",
+                    "PartitionKey": "S1",
+                    "ExplicitHashKey": str(shards[2]["start"]),
+                }
+            ],
+        )
+
+        self.assertEqual(response["Records"][0]["ShardId"], shards[2]["ShardId"])
+
+    def test_throttling(self):
+        """
+        Test that writes beyond the per-shard limit fail like Kinesis throttling
+        """
+        stream = LocalStream(shard_count=1, records_per_shard_second=3)
+        entries = [{"Data": b"x", "PartitionKey": "S1"} for _ in range(5)]
+
+        response = stream.put_records("NoaaStream", entries)
+
+        self.assertEqual(response["FailedRecordCount"], 2)
+        self.assertEqual(
+            response["Records"][-1]["ErrorCode"],
+            "ProvisionedThroughputExceededException",
+        )
+
+    def test_file_backed_stream_reloads(self):
+        """
+        Test that a file backed stream keeps its records across instances
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            LocalStream(shard_count=2, path=tmp_dir).put_record(
+                "NoaaStream", Data='{"a": 1}', PartitionKey="S1"
+            )
+
+            stream = LocalStream(shard_count=2, path=tmp_dir)
+            records = [
+                record
+                for event in stream.lambda_events()
+                for record in event["Records"]
+            ]
+
+            self.assertEqual(len(records), 1)
+            self.assertEqual(
+                stream.put_record("NoaaStream", b"{}", "S2")["SequenceNumber"], "2"
+            )
+
+
+if __name__ == "__main__":
+    unittest.main()
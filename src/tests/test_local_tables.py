@@ -0,0 +1,143 @@
+""" 
+Test the local DynamoDB tables
+"""
+
+import unittest
+from decimal import Decimal
+from unittest.mock import patch
+from boto3.dynamodb.conditions import Key
+from src.local_tables import LocalDynamoDB, MAX_BATCH_WRITE_ITEMS
+
+
+class TestLocalTables(unittest.TestCase):
+    """
+    Test the local DynamoDB tables
+    """
+
+    def setUp(self):
+        """
+        Fill a table with a month of observations of two stations
+        """
+        self.dynamodb = LocalDynamoDB()
+        self.table = self.dynamodb.Table("Precipitation")
+        requests = [
+            {
+                "PutRequest": {
+                    "Item": {
+                        "station": station,
+                        "date": f"2021-10-{day:02d}T00:00:00",
+                        "datatype": "PRCP",
+                        "value": Decimal("1.5"),
+                    }
+                }
+            }
+            for station in ("S1", "S2")
+            for day in range(1, 32)
+        ]
+        for start in range(0, len(requests), MAX_BATCH_WRITE_ITEMS):
+            self.dynamodb.batch_write_item(
+                RequestItems={
+                    "Precipitation": requests[start : start + MAX_BATCH_WRITE_ITEMS]
+                }
+            )
+        self.requests = requests
+
+    def test_query_pages_and_filters(self):
+        """
+        Test key conditions, projections and pagination of queries
+        """
+        condition = Key("station").eq("S1") & Key("date").between(
+            "2021-10-05", "2021-10-14T23:59:59"
+        )
+
+        first = self.table.query(
+            KeyConditionExpression=condition,
+            ProjectionExpression="#date, #value",
+            ExpressionAttributeNames={"#date": "date", "#value": "value"},
+            Limit=6,
+        )
+        second = self.table.query(
+            KeyConditionExpression=condition,
+            ExclusiveStartKey=first["LastEvaluatedKey"],
+            Limit=6,
+        )
+
+        self.assertEqual(len(first["Items"]), 6)
+        self.assertEqual(set(first["Items"][0]), {"date", "value"})
+        self.assertEqual(first["Items"][0]["value"], Decimal("1.5"))
+        self.assertEqual(len(second["Items"]), 4)
+        self.assertNotIn("LastEvaluatedKey", second)
+        self.assertEqual(second["Items"][-1]["date"], "2021-10-14T00:00:00")
+
+    def test_scan(self):
+        """
+        Test that a scan pages through every item
+        """
+        response = self.table.scan(ProjectionExpression="station", Limit=50)
+        items = response["Items"]
+        while "LastEvaluatedKey" in response:
+            response = self.table.scan(
+                ProjectionExpression="station",
+                ExclusiveStartKey=response["LastEvaluatedKey"],
+                Limit=50,
+            )
+            items.extend(response["Items"])
+
+        self.assertEqual(len(items), 62)
+        self.assertEqual({item["station"] for item in items}, {"S1", "S2"})
+
+    def test_batch_write_limits(self):
+        """
+        Test that oversized batches and duplicate keys are rejected like
+        DynamoDB does, and that throttled requests come back unprocessed
+        """
+        with self.assertRaises(ValueError):
+            self.dynamodb.batch_write_item(
+                RequestItems={"Precipitation": self.requests[:26]}
+            )
+        with self.assertRaises(ValueError):
+            self.dynamodb.batch_write_item(
+                RequestItems={"Precipitation": [self.requests[0], self.requests[0]]}
+            )
+
+        dynamodb = LocalDynamoDB(items_per_second=10)
+        with patch("src.local_tables.time.monotonic", return_value=100.0):
+            response = dynamodb.batch_write_item(
+                RequestItems={"Precipitation": self.requests[:25]}
+            )
+        self.assertEqual(
+            response["UnprocessedItems"], {"Precipitation": self.requests[10:25]}
+        )
+
+    def test_update_item(self):
+        """
+        Test SET and ADD update expressions
+        """
+        index = self.dynamodb.Table("StationIndex")
+        index.update_item(
+            Key={"table_name": "Precipitation"},
+            UpdateExpression="ADD stations :stations",
+            ExpressionAttributeValues={":stations": {"S1"}},
+        )
+        index.update_item(
+            Key={"table_name": "Precipitation"},
+            UpdateExpression="ADD stations :stations",
+            ExpressionAttributeValues={":stations": {"S2"}},
+        )
+        rollups = self.dynamodb.Table("Rollups")
+        rollups.update_item(
+            Key={"station": "S1", "period": "PRCP#2021-10"},
+            UpdateExpression="SET #d01 = :d01, #datatype = :datatype",
+            ExpressionAttributeNames={"#d01": "d01", "#datatype": "datatype"},
+            ExpressionAttributeValues={":d01": Decimal("2"), ":datatype": "PRCP"},
+        )
+
+        item = index.get_item(Key={"table_name": "Precipitation"})["Item"]
+        self.assertEqual(item["stations"], {"S1", "S2"})
+        rollup = rollups.get_item(Key={"station": "S1", "period": "PRCP#2021-10"})
+        self.assertEqual(rollup["Item"]["d01"], Decimal("2"))
+        self.assertEqual(rollup["Item"]["datatype"], "PRCP")
+
+
+if __name__ == "__main__":
+    unittest.main()
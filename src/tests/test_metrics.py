@@ -0,0 +1,100 @@
+""" 
+Test the metrics registry, exporters and profiler
+"""
+
+import os
+import json
+import time
+import tempfile
+import unittest
+import requests
+from src.metrics import MetricsRegistry, start_metrics_server, profile
+
+
+class TestMetrics(unittest.TestCase):
+    """
+    Test the metrics registry, exporters and profiler
+    """
+
+    def setUp(self):
+        """
+        Record a few values in a fresh registry
+        """
+        self.registry = MetricsRegistry()
+        self.registry.counter("requests_total", "Requests").inc(status="200")
+        self.registry.counter("requests_total").inc(2, status="200")
+        histogram = self.registry.histogram("fetch_seconds", "Fetch", [0.1, 1])
+        histogram.observe(0.05, stage="fetch")
+        histogram.observe(0.5, stage="fetch")
+        histogram.observe(5, stage="fetch")
+
+    def test_render_prometheus(self):
+        """
+        Test the Prometheus text format with cumulative buckets
+        """
+        text = self.registry.render_prometheus()
+
+        self.assertIn("# TYPE requests_total counter", text)
+        self.assertIn('requests_total{status="200"} 3', text)
+        self.assertIn('fetch_seconds_bucket{stage="fetch",le="0.1"} 1', text)
+        self.assertIn('fetch_seconds_bucket{stage="fetch",le="1"} 2', text)
+        self.assertIn('fetch_seconds_bucket{stage="fetch",le="+Inf"} 3', text)
+        self.assertIn('fetch_seconds_count{stage="fetch"} 3', text)
+
+    def test_emf_lines(self):
+        """
+        Test that label sets become EMF documents with their dimensions
+        """
+        documents = [
+            json.loads(line)
+            for line in self.registry.emf_lines("ClimaStream", {"Service": "test"})
+        ]
+
+        by_metric = {
+            metric["Name"]: document
+            for document in documents
+            for metric in document["_aws"]["CloudWatchMetrics"][0]["Metrics"]
+        }
+        fetch = by_metric["fetch_seconds"]
+        self.assertEqual(fetch["fetch_seconds"], [50.0, 500.0, 5000.0])
+        self.assertEqual(fetch["stage"], "fetch")
+        self.assertEqual(
+            fetch["_aws"]["CloudWatchMetrics"][0]["Dimensions"], [["Service", "stage"]]
+        )
+        self.assertEqual(by_metric["requests_total"]["requests_total"], 3)
+
+    def test_metrics_server(self):
+        """
+        Test that the endpoint serves the registry
+        """
+        server = start_metrics_server(0, self.registry)
+        try:
+            port = server.server_address[1]
+            response = requests.get(f"http://127.0.0.1:{port}/metrics", timeout=5)
+        finally:
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('requests_total{status="200"} 3', response.text)
+
+    def test_profile(self):
+        """
+        Test that the profiler writes collapsed stacks of the profiled work
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "profile.txt")
+            with profile(path, interval=0.001) as profiler:
+                deadline = time.perf_counter() + 0.1
+                while time.perf_counter() < deadline:
+                    pass
+
+            with open(path) as f:
+                lines = f.read().splitlines()
+
+        self.assertGreater(profiler.samples, 0)
+        self.assertTrue(any("test_profile" in line for line in lines))
+
+
+if __name__ == "__main__":
+    unittest.main()
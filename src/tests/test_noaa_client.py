@@ -0,0 +1,61 @@
+""" 
+Test the NOAA client
+"""
+
+import unittest
+from unittest.mock import patch, MagicMock
+from src.noaa_client import NoaaClient, NoaaApiError, NoaaQuotaExceeded
+
+
+class TestNoaaClient(unittest.TestCase):
+    """
+    Test the NOAA client
+    """
+
+    @patch("src.noaa_client.time.sleep")
+    @patch("src.noaa_client.requests.Session.get")
+    def test_get_retries_throttled_requests(self, mock_get, mock_sleep):
+        """
+        Test that 429 responses are retried and counted
+        """
+        throttled = MagicMock(status_code=429, headers={"Retry-After": "1"})
+        ok = MagicMock(status_code=200, headers={})
+        mock_get.side_effect = [throttled, ok]
+
+        client = NoaaClient(token="token", requests_per_second=100)
+        response = client.get("http://noaa/data")
+
+        self.assertIs(response, ok)
+        mock_sleep.assert_called_with(1)
+        self.assertEqual(client.stats()["requests"], 2)
+        self.assertEqual(client.stats()["retries"], 1)
+
+    @patch("src.noaa_client.time.sleep")
+    @patch("src.noaa_client.requests.Session.get")
+    def test_get_raises_after_retries(self, mock_get, mock_sleep):
+        """
+        Test that a request failing every attempt raises instead of returning
+        """
+        mock_get.return_value = MagicMock(status_code=503, headers={})
+
+        client = NoaaClient(token="token", requests_per_second=100, max_retries=2)
+        with self.assertRaises(NoaaApiError):
+            client.get("http://noaa/data")
+        self.assertEqual(mock_get.call_count, 3)
+        self.assertEqual(client.stats()["errors"], 1)
+
+    @patch("src.noaa_client.requests.Session.get")
+    def test_daily_quota(self, mock_get):
+        """
+        Test that the daily quota is enforced
+        """
+        mock_get.return_value = MagicMock(status_code=200, headers={})
+
+        client = NoaaClient(token="token", requests_per_second=100, requests_per_day=1)
+        client.get("http://noaa/data")
+        with self.assertRaises(NoaaQuotaExceeded):
+            client.get("http://noaa/data")
+
+
+if __name__ == "__main__":
+    unittest.main()
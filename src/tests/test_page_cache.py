@@ -0,0 +1,175 @@
+""" 
+Test the NOAA page cache
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.page_cache import PageCache, cache_key
+from src.fake_noaa import FakeNoaaServer
+from src.local_stream import LocalStream
+from src.noaa_client import NoaaClient
+from src.producer import Producer
+
+
+def page(offset, count=3):
+    """
+    Build a NOAA page with one result
+    """
+    return {
+        "metadata": {"resultset": {"offset": offset, "count": count, "limit": 1}},
+        "results": [
+            {
+                "date": "2021-10-01T00:00:00",
+                "datatype": "PRCP",
+                "station": "GHCND:US1MD0000000",
+                "attributes": ",,N,",
+                "value": 1.5,
+            }
+        ],
+    }
+
+
+class TestPageCache(unittest.TestCase):
+    """
+    Test the PageCache class
+    """
+
+    def setUp(self):
+        """
+        Create a temporary cache directory
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "pages")
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        self.tmp_dir.cleanup()
+
+    def test_round_trip(self):
+        """
+        Test that pages are stored under their normalized params
+        """
+        cache = PageCache(self.path)
+        params = {"datatypeid": "TMAX,PRCP", "limit": 1, "offset": 1}
+        cache.put(params, page(1))
+        cache.put(dict(params, offset=2), {})
+
+        self.assertEqual(
+            cache_key(params),
+            cache_key({"datatypeid": "PRCP,TMAX", "limit": "1", "offset": "1"}),
+        )
+        self.assertEqual(
+            cache.get({"datatypeid": "PRCP,TMAX", "limit": 1, "offset": 1}), page(1)
+        )
+        self.assertEqual(cache.get(dict(params, offset=2)), {})
+        self.assertIsNone(cache.get(dict(params, offset=3)))
+
+        # a new cache on the same directory finds the pages
+        self.assertEqual(len(PageCache(self.path).entries), 2)
+
+    def test_heterogeneous_results(self):
+        """
+        Test that results with differing fields and value types round-trip
+        """
+        cache = PageCache(self.path)
+        original = page(1)
+        original["results"] += [
+            {"date": "2021-10-02T00:00:00", "datatype": "PRCP", "value": 3},
+            {
+                "date": "2021-10-03T00:00:00",
+                "datatype": "TMAX",
+                "station": "GHCND:US1MD0000001",
+                "value": 12,
+                "attributes": None,
+                "extra": {"source": "7"},
+            },
+        ]
+        cache.put({"offset": 1}, original)
+
+        cached = cache.get({"offset": 1})
+
+        self.assertEqual(cached, original)
+        self.assertIs(type(cached["results"][1]["value"]), int)
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently read pages are evicted past max_bytes
+        """
+        cache = PageCache(self.path)
+        cache.put({"offset": 1}, page(1))
+        page_size = cache.size()
+        cache.max_bytes = page_size * 2
+
+        with patch("src.page_cache.time.time", side_effect=[4e9]):
+            cache.put({"offset": 2}, page(2))
+            # reading the first page makes the second the least recently used
+            self.assertIsNotNone(cache.get({"offset": 1}))
+        cache.put({"offset": 3}, page(3))
+
+        self.assertIsNotNone(cache.get({"offset": 1}))
+        self.assertIsNone(cache.get({"offset": 2}))
+        self.assertIsNotNone(cache.get({"offset": 3}))
+        self.assertLessEqual(cache.size(), page_size * 2)
+
+    def test_produce_and_replay(self):
+        """
+        Test that a second run is served from the cache and that a replay
+        publishes the cached records within its range once, without calling
+        NOAA
+        """
+        cache = PageCache(self.path)
+        with FakeNoaaServer(station_count=3) as server, patch(
+            "src.producer.DATA_URL", f"{server.url}/data"
+        ), patch("src.producer.get_client", return_value=NoaaClient(token="x")):
+
+            def run(
+                start_date="2021-10-01", end_date="2021-10-10", page_size=25, **kwargs
+            ):
+                producer = Producer(
+                    ["PRCP", "TMAX"],
+                    start_date,
+                    end_date,
+                    False,
+                    {},
+                    page_size=page_size,
+                    cache=cache,
+                    **kwargs,
+                )
+                producer.kinesis_client = LocalStream()
+                producer.produce()
+                return producer
+
+            first = run()
+            requests = server.requests
+            second = run()
+            self.assertEqual(server.requests, requests)
+            self.assertEqual(second.observations, first.observations)
+
+            # pages of another page size overlap the first ones
+            run("2021-10-01", "2021-10-04", page_size=10)
+            requests = server.requests
+
+            replayed = run("2021-10-03", "2021-10-04", replay=True)
+            self.assertEqual(server.requests, requests)
+
+        self.assertEqual(first.observations, 60)
+        self.assertEqual(replayed.observations, 12)
+        self.assertEqual(sum(replayed.kinesis_client.stats().values()), 12)
+        self.assertEqual(
+            replayed.latest_dates, {"PRCP": "2021-10-04", "TMAX": "2021-10-04"}
+        )
+
+    def test_replay_needs_cache(self):
+        """
+        Test that replaying without a cache is refused
+        """
+        with self.assertRaises(ValueError):
+            Producer(["PRCP"], "2021-10-01", "2021-10-02", False, {}, replay=True)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+""" 
+Test the partition key strategies
+"""
+
+import unittest
+from unittest.mock import MagicMock
+from src.partitioning import (
+    Partitioner,
+    load_shard_map,
+    shard_for_entry,
+    summarize_distribution,
+)
+
+SHARDS = [
+    {"ShardId": f"shardId-{i}", "start": i * 2**126, "end": (i + 1) * 2**126 - 1}
+    for i in range(4)
+]
+
+
+def record(station, date, datatype="PRCP"):
+    """
+    Build a record for the station and date
+    """
+    return {"station": station, "date": date, "datatype": datatype, "value": 1}
+
+
+class TestPartitioning(unittest.TestCase):
+    """
+    Test the partition key strategies
+    """
+
+    def test_station_keys(self):
+        """
+        Test the station, salted and datatype-date partition keys
+        """
+        observation = record("S1", "2021-10-01T00:00:00")
+
+        self.assertEqual(
+            Partitioner("station").keys(observation), {"PartitionKey": "S1"}
+        )
+        salted = Partitioner("station-salted", salt_buckets=4).keys(observation)
+        self.assertRegex(salted["PartitionKey"], r"^S1#[0-3]$")
+        self.assertEqual(
+            Partitioner("datatype-date").keys(observation),
+            {"PartitionKey": "PRCP#2021-10-01"},
+        )
+
+    def test_salting_is_deterministic(self):
+        """
+        Test that replays of an observation get the same salted key
+        """
+        partitioner = Partitioner("station-salted")
+        first = partitioner.keys(record("S1", "2021-10-01T00:00:00"))
+        second = partitioner.keys(record("S1", "2021-10-01T00:00:00"))
+
+        self.assertEqual(first, second)
+
+    def test_explicit_hash_spreads_evenly(self):
+        """
+        Test that explicit hash keys spread one station over every shard
+        """
+        partitioner = Partitioner("explicit-hash", shards=SHARDS)
+        entries = [
+            partitioner.keys(record("S1", f"2021-{month:02d}-{day:02d}"))
+            for month in range(1, 13)
+            for day in range(1, 29)
+        ]
+
+        distribution = {}
+        for entry in entries:
+            shard_id = shard_for_entry(entry, SHARDS)
+            counts = distribution.setdefault(shard_id, {"records": 0, "bytes": 0})
+            counts["records"] += 1
+
+        self.assertEqual(len(distribution), 4)
+        self.assertLess(summarize_distribution(distribution)["skew"], 1.3)
+
+    def test_explicit_hash_requires_shards(self):
+        """
+        Test that the explicit-hash strategy needs the shard map
+        """
+        with self.assertRaises(ValueError):
+            Partitioner("explicit-hash")
+        with self.assertRaises(ValueError):
+            Partitioner("random")
+
+    def test_load_shard_map_skips_closed_shards(self):
+        """
+        Test that closed shards are left out and pages are followed
+        """
+        client = MagicMock()
+        client.list_shards.side_effect = [
+            {
+                "Shards": [
+                    {
+                        "ShardId": "shardId-0",
+                        "HashKeyRange": {"StartingHashKey": "0", "EndingHashKey": "9"},
+                        "SequenceNumberRange": {
+                            "StartingSequenceNumber": "1",
+                            "EndingSequenceNumber": "2",
+                        },
+                    }
+                ],
+                "NextToken": "token",
+            },
+            {
+                "Shards": [
+                    {
+                        "ShardId": "shardId-1",
+                        "HashKeyRange": {"StartingHashKey": "0", "EndingHashKey": "9"},
+                        "SequenceNumberRange": {"StartingSequenceNumber": "3"},
+                    }
+                ]
+            },
+        ]
+
+        shards = load_shard_map(client, "NoaaStream")
+
+        self.assertEqual(shards, [{"ShardId": "shardId-1", "start": 0, "end": 9}])
+        self.assertEqual(
+            client.list_shards.call_args_list[1].kwargs, {"NextToken": "token"}
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
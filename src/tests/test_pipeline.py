@@ -0,0 +1,92 @@
+""" 
+Test the streaming pipeline stages
+"""
+
+import unittest
+from src.pipeline import StageTimer, buffered, batch_entries, publish_batches
+
+
+def entry(size):
+    """
+    Build a PutRecords entry of the given data size
+    """
+    return {"Data": b"x" * size, "PartitionKey": "S"}
+
+
+class TestPipeline(unittest.TestCase):
+    """
+    Test the streaming pipeline stages
+    """
+
+    def test_batch_entries_reports_completed_pages(self):
+        """
+        Test that batches respect the limits and list the pages they complete
+        """
+        pages = [
+            {"offset": 1, "entries": [entry(1)] * 3},
+            {"offset": 4, "entries": [entry(1)] * 3},
+            {"offset": 7, "entries": []},
+        ]
+
+        batches = list(batch_entries(iter(pages), max_records=4))
+
+        self.assertEqual([len(batch["entries"]) for batch in batches], [4, 2])
+        self.assertEqual(
+            [[page["offset"] for page in batch["pages"]] for batch in batches],
+            [[1], [4, 7]],
+        )
+
+    def test_batch_entries_byte_limit(self):
+        """
+        Test that a batch is flushed before it exceeds the byte limit
+        """
+        pages = [{"offset": 1, "entries": [entry(9), entry(9), entry(9)]}]
+
+        batches = list(batch_entries(iter(pages), max_bytes=25))
+
+        self.assertEqual([len(batch["entries"]) for batch in batches], [2, 1])
+
+    def test_buffered(self):
+        """
+        Test that buffered keeps the order and re-raises upstream errors
+        """
+
+        def failing():
+            yield from range(10)
+            raise ValueError("upstream failed")
+
+        self.assertEqual(list(buffered(iter(range(100)), maxsize=2)), list(range(100)))
+        items = []
+        with self.assertRaises(ValueError):
+            for item in buffered(failing(), maxsize=2):
+                items.append(item)
+        self.assertEqual(items, list(range(10)))
+
+    def test_publish_batches_times_stage(self):
+        """
+        Test that publishing skips empty batches and records its timing
+        """
+        timer = StageTimer()
+        sent = []
+        batches = [
+            {"entries": [entry(1)], "pages": [{"offset": 1}]},
+            {"entries": [], "pages": [{"offset": 2}]},
+        ]
+
+        published = list(
+            publish_batches(
+                iter(batches),
+                lambda entries: sent.append(entries) or {"shard-0": "1"},
+                timer,
+            )
+        )
+
+        self.assertEqual(len(sent), 1)
+        self.assertEqual(
+            published[1], {"pages": [{"offset": 2}], "sequence_numbers": {}}
+        )
+        self.assertEqual(timer.report()["publish"]["items"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+""" 
+Test the query planner
+"""
+
+import unittest
+from src.planner import plan_queries
+
+
+class TestPlanner(unittest.TestCase):
+    """
+    Test the query planner
+    """
+
+    def test_plan_queries_by_month(self):
+        """
+        Test splitting a range into calendar months
+        """
+        queries = plan_queries("2021-01-15", "2021-03-10", ["PRCP", "TMAX"], "month")
+
+        self.assertEqual(
+            [(query["startdate"], query["enddate"]) for query in queries],
+            [
+                ("2021-01-15", "2021-01-31"),
+                ("2021-02-01", "2021-02-28"),
+                ("2021-03-01", "2021-03-10"),
+            ],
+        )
+        self.assertTrue(all(query["datatypeid"] == "PRCP,TMAX" for query in queries))
+
+    def test_plan_queries_splits_long_ranges(self):
+        """
+        Test that ranges longer than a year are split and datatypes sharded
+        """
+        queries = plan_queries("2020-01-01", "2021-12-31", ["PRCP", "TMAX"], "datatype")
+
+        self.assertEqual(len(queries), 6)
+        self.assertEqual(queries[0]["startdate"], "2020-01-01")
+        self.assertEqual(queries[-1]["enddate"], "2021-12-31")
+        self.assertEqual({query["datatypeid"] for query in queries}, {"PRCP", "TMAX"})
+
+    def test_plan_queries_rejects_unknown_shard(self):
+        """
+        Test that an unknown shard_by value raises
+        """
+        with self.assertRaises(ValueError):
+            plan_queries("2021-01-01", "2021-01-31", ["PRCP"], "week")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -2,10 +2,13 @@
 Test the Producer class
 """
 
+import os
+import tempfile
 import unittest
 import json
 from unittest.mock import patch, MagicMock
-from src.producer import Producer
+from src.producer import Producer, PublishError, parse_args
+from src.checkpoint import CheckpointStore
 
 
 class TestProducer(unittest.TestCase):
@@ -13,8 +16,9 @@ class TestProducer(unittest.TestCase):
     Test the Producer class
     """
 
-    @patch("src.producer.requests.get")
-    def test_get_data(self, mock_get):
+    @patch("src.producer.get_station_store")
+    @patch("src.noaa_client.requests.Session.get")
+    def test_get_data(self, mock_get, mock_station_store):
         """
         Test the get_data method
         """
@@ -97,6 +101,271 @@ class TestProducer(unittest.TestCase):
             PartitionKey="STATION1",
         )
 
+    @patch("src.producer.time.sleep")
+    @patch("src.producer.boto3.client")
+    def test_put_records(self, mock_boto3_client, mock_sleep):
+        """
+        Test the put_records method batches records and retries failed entries
+        """
+        mock_client = MagicMock()
+        mock_client.put_records.side_effect = [
+            {
+                "FailedRecordCount": 1,
+                "Records": [
+                    {"SequenceNumber": "1", "ShardId": "shardId-0"},
+                    {"ErrorCode": "ProvisionedThroughputExceededException"},
+                ],
+            },
+            {
+                "FailedRecordCount": 0,
+                "Records": [{"SequenceNumber": "2", "ShardId": "shardId-0"}],
+            },
+        ]
+        mock_boto3_client.return_value = mock_client
+
+        producer = Producer(
+            data_types=[],
+            start_date="",
+            end_date="",
+            station_name_flag=False,
+            stations={},
+        )
+        records = [
+            {"date": "2023-01-01", "datatype": "PRCP", "station": "S1", "value": 1},
+            {"date": "2023-01-02", "datatype": "PRCP", "station": "S2", "value": 2},
+        ]
+
+        producer.put_records(records)
+
+        # the second call should only retry the failed entry
+        self.assertEqual(mock_client.put_records.call_count, 2)
+        retried = mock_client.put_records.call_args_list[1].kwargs["Records"]
+        self.assertEqual(
+            retried, [{"Data": json.dumps(records[1]).encode(), "PartitionKey": "S2"}]
+        )
+        self.assertEqual(producer.batch_stats[0]["attempts"], 2)
+        self.assertEqual(producer.batch_stats[0]["failed"], 0)
+
+    @patch("src.producer.boto3.client")
+    def test_dry_run_reports_shard_distribution(self, mock_boto3_client):
+        """
+        Test that a dry run publishes nothing and counts records per shard
+        """
+        mock_client = MagicMock()
+        mock_client.list_shards.return_value = {
+            "Shards": [
+                {
+                    "ShardId": "shardId-0",
+                    "HashKeyRange": {
+                        "StartingHashKey": "0",
+                        "EndingHashKey": str(2**127 - 1),
+                    },
+                },
+                {
+                    "ShardId": "shardId-1",
+                    "HashKeyRange": {
+                        "StartingHashKey": str(2**127),
+                        "EndingHashKey": str(2**128 - 1),
+                    },
+                },
+            ]
+        }
+        mock_boto3_client.return_value = mock_client
+
+        producer = Producer(
+            data_types=[],
+            start_date="",
+            end_date="",
+            station_name_flag=False,
+            stations={},
+            partition_by="explicit-hash",
+            dry_run=True,
+        )
+        records = [
+            {"date": f"2023-01-{day:02d}", "datatype": "PRCP", "station": "S1"}
+            for day in range(1, 31)
+        ]
+        for record in records:
+            record["value"] = 1
+
+        producer.put_records(records)
+
+        mock_client.put_records.assert_not_called()
+        report = producer.shard_report()
+        self.assertEqual(set(report["shards"]), {"shardId-0", "shardId-1"})
+        self.assertEqual(
+            sum(counts["records"] for counts in report["shards"].values()), 30
+        )
+        # a single station is spread over both shards
+        self.assertTrue(all(counts["records"] for counts in report["shards"].values()))
+
+    @patch("src.noaa_client.requests.Session.get")
+    def test_iter_pages(self, mock_get):
+        """
+        Test that iter_pages fetches the remaining pages and yields them in order
+        """
+        rows = [
+            {"date": f"2023-01-0{i}", "datatype": "PRCP", "station": "S1", "value": i}
+            for i in range(1, 6)
+        ]
+
+        def page(url, params=None, timeout=None):
+            response = MagicMock()
+            response.status_code = 200
+            start = params["offset"] - 1
+            response.json.return_value = {
+                "results": rows[start : start + params["limit"]],
+                "metadata": {"resultset": {"count": len(rows)}},
+            }
+            return response
+
+        mock_get.side_effect = page
+
+        producer = Producer(
+            data_types=["PRCP"],
+            start_date="2023-01-01",
+            end_date="2023-01-05",
+            station_name_flag=False,
+            stations={},
+            max_workers=2,
+        )
+
+        pages = list(producer.iter_pages(limit=2))
+
+        self.assertEqual([offset for offset, _ in pages], [1, 3, 5])
+        values = [record["value"] for _, data in pages for record in data]
+        self.assertEqual(values, [1, 2, 3, 4, 5])
+
+    @patch("src.noaa_client.requests.Session.get")
+    @patch("src.producer.boto3.client")
+    def test_produce_resumes_from_checkpoint(self, mock_boto3_client, mock_get):
+        """
+        Test that a resumed run starts after the last published page
+        """
+        mock_client = MagicMock()
+        mock_client.put_records.return_value = {
+            "FailedRecordCount": 0,
+            "Records": [{"SequenceNumber": "5", "ShardId": "shardId-0"}],
+        }
+        mock_boto3_client.return_value = mock_client
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "results": [
+                {"date": "2023-01-01", "datatype": "PRCP", "station": "S1", "value": 1}
+            ],
+            "metadata": {"resultset": {"count": 1001}},
+        }
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = CheckpointStore(os.path.join(tmp_dir, "checkpoints.json"))
+            producer = Producer(
+                data_types=["PRCP"],
+                start_date="2023-01-01",
+                end_date="2023-01-31",
+                station_name_flag=False,
+                stations={},
+                checkpoint=checkpoint,
+                resume=True,
+            )
+            checkpoint.update(
+                dict(producer.params, startdate="2023-01-01", enddate="2023-01-31"),
+                1,
+                1000,
+            )
+
+            producer.produce()
+
+            # only the page after the checkpoint is fetched
+            self.assertEqual(mock_get.call_count, 1)
+            self.assertEqual(mock_get.call_args.kwargs["params"]["offset"], 1001)
+            self.assertTrue(checkpoint.get(producer.params)["complete"])
+
+    @patch("src.producer.put_backoff", return_value=0)
+    @patch("src.noaa_client.requests.Session.get")
+    @patch("src.producer.boto3.client")
+    def test_produce_keeps_checkpoint_on_publish_failure(
+        self, mock_boto3_client, mock_get, mock_backoff
+    ):
+        """
+        Test that records failing every attempt stop the query before its
+        checkpoint advances
+        """
+        mock_client = MagicMock()
+        mock_client.put_records.return_value = {
+            "FailedRecordCount": 1,
+            "Records": [{"ErrorCode": "ProvisionedThroughputExceededException"}],
+        }
+        mock_boto3_client.return_value = mock_client
+
+        mock_response = MagicMock()
+        mock_response.status_code = 200
+        mock_response.json.return_value = {
+            "results": [
+                {"date": "2023-01-01", "datatype": "PRCP", "station": "S1", "value": 1}
+            ],
+            "metadata": {"resultset": {"count": 1}},
+        }
+        mock_get.return_value = mock_response
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            checkpoint = CheckpointStore(os.path.join(tmp_dir, "checkpoints.json"))
+            producer = Producer(
+                data_types=["PRCP"],
+                start_date="2023-01-01",
+                end_date="2023-01-31",
+                station_name_flag=False,
+                stations={},
+                checkpoint=checkpoint,
+            )
+
+            with self.assertRaises(PublishError) as error:
+                producer.produce()
+
+            self.assertEqual(len(error.exception.entries), 1)
+            self.assertIsNone(checkpoint.get(producer.params))
+
+    def test_parse_args(self):
+        """
+        Test the command line arguments of the headless producer
+        """
+        args = parse_args(
+            [
+                "--data-types",
+                "PRCP",
+                "SNOW",
+                "--start-date",
+                "2021-10-01",
+                "--end-date",
+                "2021-10-31",
+                "--parallelism",
+                "3",
+            ]
+        )
+
+        self.assertEqual(args.data_types, ["PRCP", "SNOW"])
+        self.assertEqual(args.parallelism, 3)
+        self.assertEqual(args.locations, ["FIPS:24"])
+        self.assertEqual(
+            parse_args(["--incremental", "--location", "FIPS:51"]).locations,
+            ["FIPS:51"],
+        )
+
+        # a date range is required unless running incrementally
+        with self.assertRaises(SystemExit):
+            parse_args(["--data-types", "PRCP"])
+        self.assertTrue(parse_args(["--incremental"]).incremental)
+
+        # incremental syncs must see late observations, not cached pages
+        with self.assertRaises(SystemExit):
+            parse_args(["--incremental", "--cache", "pages"])
+
+        # the msgpack codec is refused up front without the msgpack package
+        with patch("src.codec.msgpack", None), self.assertRaises(SystemExit):
+            parse_args(["--incremental", "--codec", "msgpack"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,111 @@
+""" 
+Test the columnar record batch
+"""
+
+import unittest
+from decimal import Decimal
+from src.codec import CODECS, encode_records
+from src.partitioning import Partitioner
+from src.record_batch import RecordBatch, encode_batch
+
+ROWS = [
+    {
+        "date": "2021-10-02T00:00:00",
+        "datatype": "PRCP",
+        "station": "GHCND:S1",
+        "value": 1.5,
+    },
+    {
+        "date": "2021-10-01T00:00:00",
+        "datatype": "TMAX",
+        "station": "GHCND:S2",
+        "value": 20,
+    },
+    {
+        "date": "2021-10-03T00:00:00",
+        "datatype": "PRCP",
+        "station": "GHCND:S1",
+        "value": 0,
+    },
+]
+
+
+class TestRecordBatch(unittest.TestCase):
+    """
+    Test the RecordBatch class
+    """
+
+    def test_from_rows_names_each_station_once(self):
+        """
+        Test that the station name function is called once per station
+        """
+        calls = []
+
+        def station_name(station_id):
+            calls.append(station_id)
+            return f"Name of {station_id}"
+
+        batch = RecordBatch.from_rows(ROWS, station_name)
+
+        self.assertEqual(calls, ["GHCND:S1", "GHCND:S2"])
+        self.assertEqual(len(batch), 3)
+        self.assertEqual(
+            batch.to_records()[1],
+            {
+                "date": "2021-10-01T00:00:00",
+                "datatype": "TMAX",
+                "station": "GHCND:S2",
+                "value": 20.0,
+                "station_name": "Name of GHCND:S2",
+            },
+        )
+
+    def test_mask_and_latest_dates(self):
+        """
+        Test the datatype and date range selection and the latest dates
+        """
+        batch = RecordBatch.from_rows(ROWS)
+
+        self.assertEqual(
+            batch.latest_dates(), {"PRCP": "2021-10-03", "TMAX": "2021-10-01"}
+        )
+        selected = batch.take(batch.mask(["PRCP"], "2021-10-01", "2021-10-02"))
+        self.assertEqual([record["value"] for record in selected.to_records()], [1.5])
+
+    def test_to_frame(self):
+        """
+        Test that DynamoDB items become a frame with parsed dates and floats
+        """
+        items = [
+            {"date": "2021-10-01", "datatype": "PRCP", "value": Decimal("2.5")},
+            {"date": "2021-10-02", "datatype": "PRCP", "value": Decimal("1")},
+        ]
+
+        df = RecordBatch.from_rows(items).to_frame()
+
+        self.assertEqual(str(df["date"].dtype), "datetime64[s]")
+        self.assertEqual(df["value"].tolist(), [2.5, 1.0])
+        self.assertEqual(df["datatype"].tolist(), ["PRCP", "PRCP"])
+
+    def test_encode_batch_matches_encode_records(self):
+        """
+        Test that the batch encoder writes the payloads of encode_records
+        """
+        batch = RecordBatch.from_rows(ROWS, lambda station_id: "Station é")
+        for codec in CODECS:
+            if codec == "msgpack":
+                continue
+            for strategy in ["station", "station-salted", "datatype-date"]:
+                keys = Partitioner(strategy, 4, None).keys
+                for compress in [False, True]:
+                    with self.subTest(
+                        codec=codec, strategy=strategy, compress=compress
+                    ):
+                        self.assertEqual(
+                            encode_batch(batch, codec, compress, keys),
+                            encode_records(batch.to_records(), codec, compress, keys),
+                        )
+
+
+if __name__ == "__main__":
+    unittest.main()
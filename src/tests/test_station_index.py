@@ -0,0 +1,45 @@
+""" 
+Test the station index backfill
+"""
+
+import unittest
+from decimal import Decimal
+from src.local_tables import LocalDynamoDB
+from src.station_index import backfill_station_index
+
+
+class TestStationIndex(unittest.TestCase):
+    """
+    Test the station index backfill
+    """
+
+    def test_backfill_station_index(self):
+        """
+        Test that the stations of old data are added next to indexed ones
+        """
+        dynamodb = LocalDynamoDB()
+        for station in ("S1", "S2"):
+            dynamodb.Table("Precipitation").put_item(
+                Item={
+                    "station": station,
+                    "date": "2021-10-01T00:00:00",
+                    "datatype": "PRCP",
+                    "value": Decimal("1.5"),
+                }
+            )
+        # a station registered by the consumer after deploy
+        dynamodb.Table("StationIndex").put_item(
+            Item={"table_name": "Precipitation", "stations": {"S3"}}
+        )
+
+        counts = backfill_station_index(dynamodb)
+
+        self.assertEqual(counts, {"Precipitation": 2, "Temperature": 0})
+        index = dynamodb.Table("StationIndex").get_item(
+            Key={"table_name": "Precipitation"}
+        )
+        self.assertEqual(set(index["Item"]["stations"]), {"S1", "S2", "S3"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,106 @@
+""" 
+Test the station store
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock
+from src.station_store import StationStore
+
+
+def station_page(params):
+    """
+    Build a NOAA response for a page of 2500 numbered stations
+    """
+    ids = range(params["offset"], min(params["offset"] + params["limit"], 2501))
+    response = MagicMock(status_code=200)
+    response.json.return_value = {
+        "results": [{"id": f"GHCND:{i}", "name": f"Station {i}"} for i in ids],
+        "metadata": {"resultset": {"offset": params["offset"], "count": 2500}},
+    }
+    return response
+
+
+class TestStationStore(unittest.TestCase):
+    """
+    Test the station store
+    """
+
+    def setUp(self):
+        """
+        Create a store in a temporary directory with a mocked NOAA client
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "stations.db")
+        self.client = MagicMock()
+        self.client.get.side_effect = lambda url, params, timeout: station_page(params)
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        self.tmp_dir.cleanup()
+
+    def test_get_stations_warms_up_once(self):
+        """
+        Test that every page is fetched on a cold start and reused afterwards
+        """
+        store = StationStore(self.path, client=self.client)
+
+        stations = store.get_stations("FIPS:24")
+
+        self.assertEqual(len(stations), 2500)
+        self.assertEqual(self.client.get.call_count, 3)
+
+        # a new store on the same file is still fresh
+        reopened = StationStore(self.path, client=self.client)
+        self.assertEqual(len(reopened.get_stations("FIPS:24")), 2500)
+        self.assertEqual(reopened.get_station_name("GHCND:7"), "Station 7")
+        self.assertEqual(self.client.get.call_count, 3)
+
+    def test_get_stations_refreshes_after_ttl(self):
+        """
+        Test that stale stations are refreshed from NOAA
+        """
+        store = StationStore(self.path, ttl=0, client=self.client)
+
+        store.get_stations("FIPS:24")
+        store.get_stations("FIPS:24")
+
+        self.assertEqual(self.client.get.call_count, 6)
+
+    def test_get_location_stations(self):
+        """
+        Test that the stations of several locations are loaded in one pass and
+        kept apart
+        """
+        store = StationStore(self.path, client=self.client)
+        store.get_stations("FIPS:24")
+        self.client.get.reset_mock()
+
+        def location_page(url, params, timeout):
+            # stations belong to a single location
+            response = station_page(params)
+            for result in response.json.return_value["results"]:
+                result["id"] += f"-{params['locationid']}"
+            return response
+
+        self.client.get.side_effect = location_page
+        stations = store.get_location_stations(["FIPS:24", "FIPS:51"])
+
+        # only the missing location is fetched
+        self.assertEqual(self.client.get.call_count, 3)
+        self.assertEqual(
+            {
+                call.kwargs["params"]["locationid"]
+                for call in self.client.get.call_args_list
+            },
+            {"FIPS:51"},
+        )
+        self.assertEqual(len(stations["FIPS:24"]), 2500)
+        self.assertEqual(len(stations["FIPS:51"]), 2500)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+""" 
+Test the incremental sync
+"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+from src.checkpoint import HighWaterMarkStore
+from src.jobs import JobRegistry
+from src.sync import plan_incremental_windows, incremental_sync, IncrementalSync
+
+
+class TestSync(unittest.TestCase):
+    """
+    Test the incremental sync
+    """
+
+    def setUp(self):
+        """
+        Create a high-water mark store in a temporary directory
+        """
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.marks = HighWaterMarkStore(os.path.join(self.tmp_dir.name, "hwm.json"))
+
+    def tearDown(self):
+        """
+        Remove the temporary directory
+        """
+        self.tmp_dir.cleanup()
+
+    def test_plan_incremental_windows(self):
+        """
+        Test that each datatype starts the day after its high-water mark
+        """
+        self.marks.update("FIPS:24", {"PRCP": "2023-01-10", "TMAX": "2023-01-31"})
+
+        windows = plan_incremental_windows(
+            ["PRCP", "TMAX", "SNOW"], "FIPS:24", self.marks, "2023-01-31"
+        )
+
+        # TMAX is up to date, SNOW has no mark and gets the initial window
+        self.assertEqual(windows, {"2023-01-11": ["PRCP"], "2023-01-01": ["SNOW"]})
+
+    @patch("src.sync.Producer")
+    def test_incremental_sync_advances_marks(self, mock_producer):
+        """
+        Test that the marks advance to the latest dates produced
+        """
+        self.marks.update("FIPS:24", {"PRCP": "2023-01-10"})
+        mock_producer.return_value.latest_dates = {"PRCP": "2023-01-20"}
+        mock_producer.return_value.missing_pages = 0
+
+        window_stats = incremental_sync(["PRCP"], {}, self.marks, end_date="2023-01-31")
+
+        self.assertEqual(window_stats, [mock_producer.return_value.stats.return_value])
+        mock_producer.assert_called_once_with(
+            ["PRCP"], "2023-01-11", "2023-01-31", False, {}, location_id="FIPS:24"
+        )
+        self.assertEqual(self.marks.get("FIPS:24", "PRCP"), "2023-01-20")
+
+    @patch("src.sync.Producer")
+    def test_incremental_sync_keeps_marks_on_missing_pages(self, mock_producer):
+        """
+        Test that the marks stay put when a page of the window was skipped
+        """
+        self.marks.update("FIPS:24", {"PRCP": "2023-01-10"})
+        mock_producer.return_value.latest_dates = {"PRCP": "2023-01-20"}
+        mock_producer.return_value.missing_pages = 1
+
+        incremental_sync(["PRCP"], {}, self.marks, end_date="2023-01-31")
+
+        self.assertEqual(self.marks.get("FIPS:24", "PRCP"), "2023-01-10")
+
+    @patch("src.sync.Producer")
+    def test_incremental_sync_runs_as_job(self, mock_producer):
+        """
+        Test that the sync runs in the background and reports its progress
+        """
+        mock_producer.return_value.latest_dates = {"PRCP": "2023-01-20"}
+        mock_producer.return_value.missing_pages = 0
+
+        registry = JobRegistry(max_workers=1)
+        sync = IncrementalSync(
+            ["PRCP"], {}, self.marks, end_date="2023-01-31", location_id="FIPS:24"
+        )
+        job = registry.submit("sync FIPS:24", sync)
+        registry.shutdown()
+
+        self.assertEqual(registry.list_jobs()[0]["status"], "succeeded")
+        self.assertEqual(len(sync.window_stats), 1)
+        self.assertEqual(
+            mock_producer.call_args.kwargs["progress_callback"], job.update
+        )
+        self.assertEqual(self.marks.get("FIPS:24", "PRCP"), "2023-01-20")
+
+
+if __name__ == "__main__":
+    unittest.main()
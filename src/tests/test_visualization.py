@@ -2,12 +2,24 @@
 Test the visualization functions
 """
 
+import os
+import tempfile
 import unittest
+from decimal import Decimal
+import pandas as pd
 from unittest.mock import Mock, patch
+from concurrent.futures import ThreadPoolExecutor
+from src import visualization
+from src.station_store import StationStore
 from src.visualization import (
+    init_dynamodb_client,
     fetch_stations,
     fetch_noaa_stations,
     fetch_data_from_dynamodb,
+    fetch_stations_data,
+    summarize_rollup,
+    choose_resolution,
+    downsample,
     create_plot,
 )
 
@@ -23,11 +35,13 @@ class TestVisualization(unittest.TestCase):
         Test the fetch_stations function
         """
         mock_table = Mock()
+        mock_table.get_item.return_value = {}
         mock_table.scan.return_value = {
             "Items": [{"station": "Station1"}, {"station": "Station2"}]
         }
         mock_dynamodb_client.return_value.Table.return_value = mock_table
 
+        fetch_stations.clear()
         result = fetch_stations("Temperature")
         self.assertEqual(
             result,
@@ -36,7 +50,24 @@ class TestVisualization(unittest.TestCase):
             else ["Station1", "Station2"],
         )
 
-    @patch("src.visualization.requests.get")
+    @patch("src.visualization.init_dynamodb_client")
+    def test_fetch_stations_from_index(self, mock_dynamodb_client):
+        """
+        Test that fetch_stations reads the station index without scanning
+        """
+        mock_table = Mock()
+        mock_table.get_item.return_value = {
+            "Item": {"table_name": "Temperature", "stations": {"Station1"}}
+        }
+        mock_dynamodb_client.return_value.Table.return_value = mock_table
+
+        fetch_stations.clear()
+        result = fetch_stations("Temperature")
+
+        self.assertEqual(result, ["Station1"])
+        mock_table.scan.assert_not_called()
+
+    @patch("src.noaa_client.requests.Session.get")
     def test_fetch_noaa_stations(self, mock_get):
         """
         Test the fetch_noaa_stations function
@@ -53,7 +84,13 @@ class TestVisualization(unittest.TestCase):
         }
         mock_get.return_value = mock_response
 
-        result = fetch_noaa_stations()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            store = StationStore(os.path.join(tmp_dir, "stations.db"))
+            with patch("src.visualization.get_station_store", return_value=store):
+                fetch_noaa_stations.clear()
+                result = fetch_noaa_stations()
+            store.connection.close()
+
         self.assertEqual(result, {"Station1": "ID1", "Station2": "ID2"})
 
     @patch("src.visualization.init_dynamodb_client")
@@ -84,6 +121,91 @@ class TestVisualization(unittest.TestCase):
             ],
         )
 
+    @patch("src.visualization.init_dynamodb_client")
+    def test_fetch_data_from_dynamodb_paginates(self, mock_dynamodb_client):
+        """
+        Test that fetch_data_from_dynamodb follows LastEvaluatedKey
+        """
+        mock_table = Mock()
+        mock_table.query.side_effect = [
+            {"Items": [{"date": "2021-01-01"}], "LastEvaluatedKey": {"date": "1"}},
+            {"Items": [{"date": "2021-01-02"}]},
+        ]
+        mock_dynamodb_client.return_value.Table.return_value = mock_table
+
+        result = fetch_data_from_dynamodb(
+            "Temperature", "Station1", "2021-01-01", "2021-01-31"
+        )
+
+        self.assertEqual(result, [{"date": "2021-01-01"}, {"date": "2021-01-02"}])
+        second_call = mock_table.query.call_args_list[1].kwargs
+        self.assertEqual(second_call["ExclusiveStartKey"], {"date": "1"})
+        self.assertEqual(second_call["ProjectionExpression"], "#date, datatype, #value")
+
+    @patch("src.visualization.fetch_data_from_dynamodb")
+    def test_fetch_stations_data(self, mock_fetch):
+        """
+        Test that fetch_stations_data returns the data of every station in order
+        """
+        mock_fetch.side_effect = lambda table, location, start, end: [location]
+
+        result = fetch_stations_data("Temperature", ["Station1", "Station2"])
+
+        self.assertEqual(list(result), ["Station1", "Station2"])
+        self.assertEqual(result["Station2"], ["Station2"])
+
+    def test_summarize_rollup(self):
+        """
+        Test that monthly statistics are derived from the day values
+        """
+        item = {
+            "station": "Station1",
+            "period": "TMAX#2021-01",
+            "datatype": "TMAX",
+            "month": "2021-01",
+            "d01": Decimal("2"),
+            "d02": Decimal("6"),
+        }
+
+        rollup = summarize_rollup(item)
+
+        self.assertEqual(rollup["date"], "2021-01-01")
+        self.assertEqual((rollup["min"], rollup["max"]), (2.0, 6.0))
+        self.assertEqual((rollup["sum"], rollup["count"]), (8.0, 2))
+        self.assertEqual(rollup["value"], 4.0)
+
+    @patch("src.visualization.boto3.session.Session")
+    def test_init_dynamodb_client_per_thread(self, mock_session):
+        """
+        Test that each thread creates one session and reuses its resource
+        """
+        mock_session.side_effect = lambda: Mock()
+        visualization.thread_local.dynamodb = None
+
+        def resources():
+            return [
+                init_dynamodb_client("us-east-1", "secret", "key") for _ in range(3)
+            ]
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            other = executor.submit(resources).result()
+        own = resources()
+
+        self.assertEqual(len({id(resource) for resource in own}), 1)
+        self.assertEqual(len({id(resource) for resource in other}), 1)
+        self.assertIsNot(own[0], other[0])
+        self.assertEqual(mock_session.call_count, 2)
+
+    def test_choose_resolution(self):
+        """
+        Test that only long ranges use the monthly rollups
+        """
+        self.assertEqual(choose_resolution("2021-01-01", "2021-01-31"), "daily")
+        self.assertEqual(choose_resolution("2015-01-01", "2021-01-31"), "monthly")
+        self.assertEqual(choose_resolution(), "daily")
+        self.assertEqual(choose_resolution(resolution="monthly"), "monthly")
+        self.assertEqual(choose_resolution(resolution="daily"), "daily")
+
     def test_create_plot(self):
         """
         Test the create_plot function
@@ -104,6 +226,41 @@ class TestVisualization(unittest.TestCase):
         self.assertIn(title, fig.layout.title.text)
         self.assertEqual(fig.layout.yaxis.title.text, y_label)
 
+    def test_downsample(self):
+        """
+        Test that each datatype is reduced to its share of the point budget
+        """
+        dates = pd.date_range("2000-01-01", periods=1000, freq="D")
+        df = pd.concat(
+            [
+                pd.DataFrame({"date": dates, "value": range(1000), "datatype": "TMAX"}),
+                pd.DataFrame({"date": dates, "value": range(1000), "datatype": "TMIN"}),
+            ]
+        )
+
+        for method in ["lttb", "minmax"]:
+            result = downsample(df, max_points=100, method=method)
+            counts = result["datatype"].value_counts()
+            self.assertLessEqual(counts["TMAX"], 50)
+            self.assertLessEqual(counts["TMIN"], 50)
+            # the first and last points of each series survive
+            tmax = result[result["datatype"] == "TMAX"]
+            self.assertEqual(tmax["value"].min(), 0)
+            self.assertEqual(tmax["value"].max(), 999)
+
+    def test_create_plot_webgl(self):
+        """
+        Test that the plot can be rendered with WebGL
+        """
+        data = [
+            {"date": "2021-01-01", "value": 10, "datatype": "TOBS"},
+            {"date": "2021-01-02", "value": 15, "datatype": "TOBS"},
+        ]
+
+        fig = create_plot(data, "Test Plot", "Value", webgl=True)
+
+        self.assertEqual(fig.data[0].type, "scattergl")
+
 
 if __name__ == "__main__":
     unittest.main()
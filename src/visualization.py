@@ -6,38 +6,87 @@ This module contains functions to fetch data from DynamoDB and create visualizat
 import boto3
 import streamlit as st
 from boto3.dynamodb.conditions import Key
+import numpy as np
 import pandas as pd
 import plotly.express as px
-import requests
 import os
+import time
+import datetime
+import threading
 import logging
+from concurrent.futures import ThreadPoolExecutor
 
-from src.constants import AWS_REGION, STATION_URL, API_KEY
+from src.constants import (
+    AWS_REGION,
+    DEFAULT_QUERY_WORKERS,
+    STATION_INDEX_TABLE,
+    STATION_INDEX_TTL,
+    ROLLUP_TABLE,
+    ROLLUP_MIN_SPAN_DAYS,
+    TABLE_DATATYPES,
+    TOTAL_DATATYPES,
+    DEFAULT_POINT_BUDGET,
+    BACKEND,
+    LOCATION_IDS,
+)
+from src.station_store import get_station_store
+from src.backends import get_local_tables
+from src.metrics import metrics
+from src.record_batch import RecordBatch
 
 # configure logging
 logger = logging.getLogger()
 
 
+# DynamoDB resource of each thread, boto3 resources and the default session
+# are not thread-safe
+thread_local = threading.local()
+
+
 # Function to initialize DynamoDB client
 def init_dynamodb_client(aws_region, aws_secret_access_key, aws_access_key_id):
     """
-    Initialize the DynamoDB client
+    Initialize the DynamoDB client, or the local tables for local runs. Each
+    thread gets its own session and resource, created once and then reused.
     """
-    return boto3.resource(
-        "dynamodb",
-        region_name=aws_region,
-        aws_secret_access_key=aws_secret_access_key,
-        aws_access_key_id=aws_access_key_id,
-    )
+    if BACKEND == "local":
+        return get_local_tables()
+    if getattr(thread_local, "dynamodb", None) is None:
+        thread_local.dynamodb = boto3.session.Session().resource(
+            "dynamodb",
+            region_name=aws_region,
+            aws_secret_access_key=aws_secret_access_key,
+            aws_access_key_id=aws_access_key_id,
+        )
+    return thread_local.dynamodb
+
+
+def query_table(table, **query_kwargs):
+    """
+    Fetch one page of a DynamoDB query, recording its latency
+    """
+    with metrics.histogram(
+        "dynamodb_query_seconds", "Latency of DynamoDB query pages"
+    ).time(table=table.name):
+        return table.query(**query_kwargs)
 
 
+@st.cache_data(ttl=STATION_INDEX_TTL)
 def fetch_stations(table_name):
     """
-    Fetch all the stations from the DynamoDB table
+    Fetch all the stations of the DynamoDB table from the station index kept by
+    the consumer, falling back to a full table scan if the table isn't indexed
     """
     dynamodb = init_dynamodb_client(
         AWS_REGION, os.environ["AWS_SECRET_ACCESS_KEY"], os.environ["AWS_ACCESS_KEY_ID"]
     )
+
+    # Read the station set from the index, a single small item
+    index = dynamodb.Table(STATION_INDEX_TABLE).get_item(Key={"table_name": table_name})
+    if "Item" in index:
+        return list(index["Item"]["stations"])
+    logger.warning(f"No station index for {table_name}, scanning the table")
+
     table = dynamodb.Table(table_name)
     response = table.scan(ProjectionExpression="station")
     stations = {item["station"] for item in response["Items"]}
@@ -50,77 +99,277 @@ def fetch_stations(table_name):
     return list(stations)
 
 
-@st.cache_data
-def fetch_noaa_stations():
+@st.cache_data(ttl=STATION_INDEX_TTL)
+def fetch_noaa_stations(location_ids=LOCATION_IDS):
     """
-    Fetch all the stations from the NOAA API
+    Fetch all the stations of the locations from the station store, which
+    refreshes them from the NOAA API once they are older than its TTL
     """
-
-    # set up the base url, headers, and params
-    base_url = STATION_URL
-    headers = {"token": API_KEY}
-    params = {"locationid": f"FIPS:24", "limit": 1000}  # FIPS code for Maryland
     stations = {}
-
-    while True:
-        # make the request
-        response = requests.get(base_url, headers=headers, params=params, timeout=15)
-        if response.status_code != 200:
-            logger.error(
-                f"Error while fetching stations from NOAA API, error: {response.status_code}"
-            )
-            break
-
-        # parse the response
-        data = response.json()
-        logger.info(f"Fetched {len(data['results'])} stations from NOAA API")
-        for result in data["results"]:
-            stations[result["name"]] = result["id"]
-
-        # check if all records have been fetched
-        if "metadata" in data and "resultset" in data["metadata"]:
-            offset = data["metadata"]["resultset"].get("offset", 0)
-            count = data["metadata"]["resultset"].get("count", 0)
-            if offset + params["limit"] >= count:
-                break  # Exit loop if all records have been fetched
-
-        # update the offset
-        params["offset"] = offset + params["limit"]
-
+    for location_stations in (
+        get_station_store().get_location_stations(location_ids).values()
+    ):
+        stations.update(location_stations)
+    logger.info(f"Loaded {len(stations)} stations from the station store")
     return stations
 
 
-def fetch_data_from_dynamodb(table_name, location):
+def fetch_data_from_dynamodb(table_name, location, start_date=None, end_date=None):
     """
-    Fetch data from the DynamoDB table for the given station
+    Fetch data from the DynamoDB table for the given station, following
+    pagination. start_date and end_date (YYYY-MM-DD) restrict the query on the
+    date sort key.
     """
     logger.info(f"Fetching data for station: {location}")
 
     dynamodb = init_dynamodb_client(
         AWS_REGION, os.environ["AWS_SECRET_ACCESS_KEY"], os.environ["AWS_ACCESS_KEY_ID"]
     )
-    # Fetch data from the table
     table = dynamodb.Table(table_name)
-    response = table.query(KeyConditionExpression=Key("station").eq(location))
+
+    # Narrow the query server side on the date sort key
+    key_condition = Key("station").eq(location)
+    if start_date and end_date:
+        key_condition &= Key("date").between(start_date, f"{end_date}T23:59:59")
+    elif start_date:
+        key_condition &= Key("date").gte(start_date)
+    elif end_date:
+        key_condition &= Key("date").lte(f"{end_date}T23:59:59")
+
+    # Only read the attributes needed for plotting (date and value are reserved)
+    query_kwargs = {
+        "KeyConditionExpression": key_condition,
+        "ProjectionExpression": "#date, datatype, #value",
+        "ExpressionAttributeNames": {"#date": "date", "#value": "value"},
+    }
+
+    # Fetch data from the table, one page at a time
+    response = query_table(table, **query_kwargs)
 
     # Check if data is found
     if "Items" not in response:
         logger.error(f"Error while fetching data for station: {location}")
         return []
-    logger.info(f"Fetched {len(response['Items'])} records for station: {location}")
+    items = response["Items"]
+
+    while "LastEvaluatedKey" in response:
+        response = query_table(
+            table, ExclusiveStartKey=response["LastEvaluatedKey"], **query_kwargs
+        )
+        items.extend(response["Items"])
+    logger.info(f"Fetched {len(items)} records for station: {location}")
 
     # Return the data
-    return response["Items"]
+    return items
+
 
+def summarize_rollup(item):
+    """
+    Derive the monthly statistics from the day values (d01 to d31) of a rollup
+    item. The plotted value is the monthly total for precipitation datatypes and
+    the monthly mean otherwise.
+    """
+    values = [
+        float(value)
+        for name, value in item.items()
+        if len(name) == 3 and name[0] == "d" and name[1:].isdigit()
+    ]
+    total = sum(values)
+    mean = total / len(values) if values else 0.0
+    return {
+        "date": f"{item['month']}-01",
+        "datatype": item["datatype"],
+        "min": min(values, default=0.0),
+        "max": max(values, default=0.0),
+        "sum": total,
+        "count": len(values),
+        "mean": mean,
+        "value": total if item["datatype"] in TOTAL_DATATYPES else mean,
+    }
 
-def create_plot(data, title, y_label):
+
+def fetch_rollups_from_dynamodb(table_name, location, start_date=None, end_date=None):
     """
-    Create a plotly plot for the given data
+    Fetch the monthly rollups of the table's datatypes for the given station
     """
+    logger.info(f"Fetching monthly rollups for station: {location}")
+
+    dynamodb = init_dynamodb_client(
+        AWS_REGION, os.environ["AWS_SECRET_ACCESS_KEY"], os.environ["AWS_ACCESS_KEY_ID"]
+    )
+    table = dynamodb.Table(ROLLUP_TABLE)
+
+    rollups = []
+    for datatype in TABLE_DATATYPES[table_name]:
+        # The sort key is datatype#YYYY-MM, so a month range is a key condition
+        start = f"{datatype}#{start_date[:7] if start_date else '0000-00'}"
+        end = f"{datatype}#{end_date[:7] if end_date else '9999-99'}"
+        key_condition = Key("station").eq(location) & Key("period").between(start, end)
+
+        response = query_table(table, KeyConditionExpression=key_condition)
+        items = response.get("Items", [])
+        while "LastEvaluatedKey" in response:
+            response = query_table(
+                table,
+                KeyConditionExpression=key_condition,
+                ExclusiveStartKey=response["LastEvaluatedKey"],
+            )
+            items.extend(response["Items"])
+        rollups.extend(summarize_rollup(item) for item in items)
+
+    logger.info(f"Fetched {len(rollups)} monthly rollups for station: {location}")
+    return rollups
+
 
-    # Convert data to pandas dataframe
-    df = pd.DataFrame(data)
-    df["date"] = pd.to_datetime(df["date"])
+def choose_resolution(start_date=None, end_date=None, resolution="auto"):
+    """
+    Pick daily or monthly data for the requested range. Only ranges longer than
+    ROLLUP_MIN_SPAN_DAYS use the monthly rollups; unbounded ranges, the default
+    view, keep the daily data.
+    """
+    if resolution != "auto":
+        return resolution
+    if not start_date or not end_date:
+        return "daily"
+
+    span = datetime.date.fromisoformat(end_date) - datetime.date.fromisoformat(
+        start_date
+    )
+    return "monthly" if span.days > ROLLUP_MIN_SPAN_DAYS else "daily"
+
+
+def fetch_station_data(table_name, location, start_date, end_date, resolution):
+    """
+    Fetch the data of one station at the given resolution, falling back to the
+    daily data when the station has no rollups yet
+    """
+    if resolution == "monthly":
+        data = fetch_rollups_from_dynamodb(table_name, location, start_date, end_date)
+        if data:
+            return data
+        logger.warning(f"No rollups for station: {location}, using daily data")
+    return fetch_data_from_dynamodb(table_name, location, start_date, end_date)
+
+
+def fetch_stations_data(
+    table_name,
+    locations,
+    start_date=None,
+    end_date=None,
+    max_workers=DEFAULT_QUERY_WORKERS,
+    resolution="daily",
+):
+    """
+    Fetch data for several stations concurrently. Returns a dict of
+    {location: items} in the order of locations.
+    """
+    if not locations:
+        return {}
+
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(locations))) as executor:
+        results = executor.map(
+            lambda location: fetch_station_data(
+                table_name, location, start_date, end_date, resolution
+            ),
+            locations,
+        )
+        return dict(zip(locations, results))
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Indices of the points kept by Largest-Triangle-Three-Buckets downsampling
+    """
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    indices = np.empty(threshold, dtype=np.int64)
+    indices[0] = 0
+    indices[-1] = n - 1
+    selected = 0
+
+    for i in range(threshold - 2):
+        # current bucket and the bucket after it
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        avg_x = x[end:next_end].mean()
+        avg_y = y[end:next_end].mean()
+
+        # keep the point forming the largest triangle with its neighbours
+        areas = np.abs(
+            (x[selected] - avg_x) * (y[start:end] - y[selected])
+            - (x[selected] - x[start:end]) * (avg_y - y[selected])
+        )
+        selected = start + int(np.argmax(areas))
+        indices[i + 1] = selected
+
+    return indices
+
+
+def minmax_indices(y, threshold):
+    """
+    Indices of the minimum and maximum point of each of threshold / 2 buckets
+    """
+    n = len(y)
+    if threshold >= n or threshold < 2:
+        return np.arange(n)
+
+    indices = []
+    for bucket in np.array_split(np.arange(n), threshold // 2):
+        indices.append(bucket[np.argmin(y[bucket])])
+        indices.append(bucket[np.argmax(y[bucket])])
+    return np.unique(indices)
+
+
+def downsample(df, max_points=DEFAULT_POINT_BUDGET, method="lttb"):
+    """
+    Reduce the dataframe to about max_points points, sharing the budget evenly
+    between the datatypes so every series keeps its shape
+    """
+    if method == "none" or len(df) <= max_points:
+        return df
+
+    budget = max(max_points // df["datatype"].nunique(), 3)
+    frames = []
+    for _, series in df.groupby("datatype", sort=False):
+        series = series.sort_values("date")
+        x = series["date"].to_numpy().astype("datetime64[s]").astype("float64")
+        y = series["value"].to_numpy(dtype="float64")
+        if method == "minmax":
+            indices = minmax_indices(y, budget)
+        else:
+            indices = lttb_indices(x, y, budget)
+        frames.append(series.iloc[indices])
+
+    logger.info(f"Downsampled {len(df)} points to {sum(map(len, frames))}")
+    return pd.concat(frames)
+
+
+def create_plot(
+    data,
+    title,
+    y_label,
+    max_points=DEFAULT_POINT_BUDGET,
+    method="lttb",
+    webgl=False,
+):
+    """
+    Create a plotly plot for the given data, a RecordBatch or a list of items,
+    downsampled to max_points points. webgl renders the points with WebGL,
+    which stays responsive for large plots.
+    """
+    start = time.perf_counter()
+
+    # Convert data to pandas dataframe, dates and values parsed column-wise
+    if not isinstance(data, RecordBatch):
+        data = RecordBatch.from_rows(data)
+    df = data.to_frame()
+
+    # Keep the payload sent to the browser within the point budget
+    df = downsample(df, max_points, method)
 
     # Define colors for each datatype
     colors = {
@@ -133,7 +382,12 @@ def create_plot(data, title, y_label):
 
     # Create the plot
     fig = px.scatter(
-        df, x="date", y="value", color="datatype", color_discrete_map=colors
+        df,
+        x="date",
+        y="value",
+        color="datatype",
+        color_discrete_map=colors,
+        render_mode="webgl" if webgl else "auto",
     )
 
     # Update the plot
@@ -144,6 +398,9 @@ def create_plot(data, title, y_label):
         legend_title="datatype",
     )
     fig.update_xaxes(tickangle=45)
+    metrics.histogram("plot_build_seconds", "Time to build a plot").observe(
+        time.perf_counter() - start
+    )
 
     # Return the plot
     return fig